@@ -1,163 +1,61 @@
-from fastapi import FastAPI, Body
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, Body, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, Response
+from pydantic import BaseModel, Field, ValidationError
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
-import os, math, json
-from elasticsearch import Elasticsearch
+import os, threading
+from functools import lru_cache
+
+import metrics
+from metrics import stage
+from profiling import install_debug_routes
+import codec
+from qes import (BATCH_ADAPTER, WEIGHTS, IdentityMeta, PolicyMeta, ScoreRequest, TokenMeta, column_docs,
+                 score_columns, score_doc)
 
 app = FastAPI(title="IDEA-3 Quantum Guardian")
+app.add_middleware(metrics.MetricsMiddleware)
+install_debug_routes(app)
+
+QES_SCORED = metrics.counter("ith_qes_scored_total", "Token records scored", ["endpoint"])
 
 ES_URL = os.getenv("ELASTIC_CLOUD_URL")
 ES_API = os.getenv("ELASTIC_API_KEY")
 ES_INDEX = os.getenv("ELASTIC_INDEX_TARGET", "ith-idea3-quantum")
+QES_BULK_SIZE = int(os.getenv("QES_BULK_SIZE", "1000"))
 
-W_AGE = float(os.getenv("W_AGE", 8))
-W_ALG = float(os.getenv("W_ALG", 22))
-W_SCOPE = float(os.getenv("W_SCOPE", 28))
-W_DEVICE = float(os.getenv("W_DEVICE", 18))
-W_ROT = float(os.getenv("W_ROT", 14))
-W_POLICY = float(os.getenv("W_POLICY", 10))
-
-es = None
-if ES_URL and ES_API:
-    es = Elasticsearch(ES_URL, api_key=ES_API, request_timeout=30)
-
-# === Models ===
-class TokenMeta(BaseModel):
-    alg: str = Field(..., description="JWT alg, e.g., RS256, ES256, PS256")
-    key_bits: Optional[int] = Field(None, description="RSA modulus size in bits, if applicable")
-    curve: Optional[str] = Field(None, description="ECDSA curve, e.g., P-256")
-    issued_at: datetime
-    expires_at: datetime
-    rotation_days: Optional[int] = Field(7, description="Token/refresh rotation cadence in days")
-    device_bound: bool = Field(False, description="Is token bound to device key/TPM?")
-    scopes: List[str] = Field(default_factory=list)
-
-class IdentityMeta(BaseModel):
-    user: Optional[str] = None
-    issuer: Optional[str] = None
-    session_id: Optional[str] = None
-
-class PolicyMeta(BaseModel):
-    issuer_policy_gap: Optional[float] = Field(0.0, description="0-2 scale: 0 means strict modern policy, 2 means weak/legacy")
-
-class ScoreRequest(BaseModel):
-    identity: IdentityMeta
-    token: TokenMeta
-    policy: Optional[PolicyMeta] = PolicyMeta()
-
-# === Helpers ===
-ALG_RISK_TABLE = {
-    # Relative ordinal 1 (low) .. 5 (high). Configure with your cryptography team.
-    "RS256": lambda bits: 3 if (bits or 2048) >= 2048 else 4,
-    "RS384": lambda bits: 3,
-    "RS512": lambda bits: 3,
-    "PS256": lambda bits: 3,
-    "PS384": lambda bits: 3,
-    "PS512": lambda bits: 3,
-    "ES256": lambda curve: 2,
-    "ES384": lambda curve: 2,
-    "ES512": lambda curve: 2,
-    # Fallback for unknown/legacy
-}
-
-def algorithm_risk(token: TokenMeta) -> int:
-    alg = (token.alg or "").upper()
-    if alg.startswith("RS"):
-        return ALG_RISK_TABLE.get(alg, lambda bits: 3)(token.key_bits)
-    if alg.startswith("PS"):
-        return ALG_RISK_TABLE.get(alg, lambda bits: 3)(token.key_bits)
-    if alg.startswith("ES"):
-        return ALG_RISK_TABLE.get(alg, lambda curve: 2)(token.curve)
-    # Unknown/legacy: be conservative
-    return 4
-
-def scope_sensitivity(scopes: List[str]) -> float:
-    if not scopes:
-        return 0.5
-    s = 0.0
-    for sc in scopes:
-        sc_l = sc.lower()
-        if "admin" in sc_l or "write" in sc_l or "privileged" in sc_l:
-            s += 1.0
-        elif "read" in sc_l or "view" in sc_l:
-            s += 0.4
-        else:
-            s += 0.6
-    # normalize roughly into 0..4
-    return min(4.0, 0.8 * s)
-
-def normalize_age(issued_at: datetime, expires_at: datetime) -> float:
-    now = datetime.now(timezone.utc)
-    ttl = max(1.0, (expires_at - issued_at).total_seconds() / 86400.0)  # days
-    age = max(0.0, (now - issued_at).total_seconds() / 86400.0)
-    return min(1.0, age / ttl)  # 0..1
-
-def rotation_penalty(days: Optional[int]) -> float:
-    if days is None:
-        return 1.0
-    if days <= 7:
-        return 0.2
-    if days <= 30:
-        return 0.6
-    return 1.2
-
-def device_binding_gap(bound: bool) -> float:
-    return 0.0 if bound else 1.0
-
-def compute_qes(req: ScoreRequest) -> Dict[str, Any]:
-    f_age = normalize_age(req.token.issued_at, req.token.expires_at)
-    f_alg = float(algorithm_risk(req.token))
-    f_scope = scope_sensitivity(req.token.scopes)
-    f_device = device_binding_gap(req.token.device_bound)
-    f_rot = rotation_penalty(req.token.rotation_days)
-    f_policy = float(req.policy.issuer_policy_gap or 0.0)
-
-    score = (W_AGE * f_age + W_ALG * f_alg + W_SCOPE * f_scope +
-             W_DEVICE * f_device + W_ROT * f_rot + W_POLICY * f_policy)
+@lru_cache(maxsize=1)
+def get_es():
+    # Built on first use so a cold instance serves without importing the client.
+    if not (ES_URL and ES_API):
+        return None
+    from elasticsearch import Elasticsearch
+    return Elasticsearch(ES_URL, api_key=ES_API, request_timeout=30, **codec.es_client_kwargs())
 
-    return {
-        "qes": {
-            "score": round(score, 2),
-            "factors": {
-                "token_age_days": round(f_age, 3),
-                "algorithm_risk": round(f_alg, 3),
-                "scope_sensitivity": round(f_scope, 3),
-                "device_binding_gap": round(f_device, 3),
-                "rotation_gap": round(f_rot, 3),
-                "issuer_policy_gap": round(f_policy, 3),
-            },
-            "weights": {
-                "w_age": W_AGE, "w_alg": W_ALG, "w_scope": W_SCOPE,
-                "w_device": W_DEVICE, "w_rot": W_ROT, "w_policy": W_POLICY
-            }
-        },
-        "crypto_profile": {
-            "alg_family": req.token.alg[:2].upper(),
-            "algorithm_risk": int(f_alg),
-            "notes": [
-                "device_bound" if req.token.device_bound else "not_device_bound"
-            ]
-        }
-    }
+@app.on_event("startup")
+def _warm_in_background():
+    threading.Thread(target=get_es, name="warmup", daemon=True).start()
 
 def index_doc(doc: Dict[str, Any]) -> Optional[str]:
+    es = get_es()
     if not es:
         return None
-    res = es.index(index=ES_INDEX, document=doc)
+    with stage("index"):
+        res = es.index(index=ES_INDEX, document=doc)
     return res.get("_id")
 
 # === Endpoints ===
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/score-token")
 def score_token(req: ScoreRequest):
-    base_doc = {
-        "event": {"module": "idea3", "type": "token_crypto_risk", "time": datetime.now(timezone.utc).isoformat()},
-        "identity": req.identity.dict(),
-        "token": req.token.dict(),
-    }
-    enrich = compute_qes(req)
-    doc = {**base_doc, **enrich}
+    with stage("score"):
+        doc = score_doc(req)
     _id = index_doc(doc)
+    QES_SCORED.labels("score-token").inc()
     return {"indexed_id": _id, "doc": doc}
 
 class BatchRequest(BaseModel):
@@ -170,6 +68,43 @@ def score_batch(req: BatchRequest):
         results.append(score_token(item))
     return results
 
+def _score_columns(body: bytes, index: bool) -> bytes:
+    try:
+        with stage("validate"):
+            items = BATCH_ADAPTER.validate_json(body)["items"]
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False))
+    now = datetime.now(timezone.utc)
+    with stage("score"):
+        cols = score_columns(items, now)
+    indexed = 0
+    es = get_es() if index else None
+    if es is not None:
+        action = codec.bulk_action(ES_INDEX)
+        docs = list(column_docs(items, cols, now))
+        for i in range(0, len(docs), QES_BULK_SIZE):
+            chunk = docs[i:i + QES_BULK_SIZE]
+            with stage("index"):
+                res = es.bulk(operations=codec.ndjson(chunk, action), refresh=False)
+            res = getattr(res, "body", res)
+            indexed += len(chunk) - sum(1 for it in res.get("items", [])
+                                        if it.get("index", {}).get("status", 200) >= 300)
+    QES_SCORED.labels("score-batch-columns").inc(len(items))
+    with stage("serialize"):
+        return codec.dumps({"count": len(items), "indexed": indexed, "time": now,
+                            "weights": WEIGHTS,
+                            "columns": cols})
+
+@app.post("/score-batch/columns")
+async def score_batch_columns(request: Request, index: bool = Query(False, description="also bulk-index the documents")):
+    """
+    /score-batch for large batches: same body, validated in one pass over the
+    raw bytes, answered with one list per field in item order
+    (columns.score[i] is items[i]'s QES) instead of a document per item.
+    """
+    body = await request.body()
+    return Response(await run_in_threadpool(_score_columns, body, index), media_type="application/json")
+
 # Optional backfill (requires SOURCE_INDEX env and ES perms)
 class BackfillRequest(BaseModel):
     query: str = Field(..., description="ES query DSL or KQL string for source index")
@@ -177,6 +112,7 @@ class BackfillRequest(BaseModel):
 @app.post("/es/backfill")
 def es_backfill(payload: BackfillRequest):
     source_index = os.getenv("SOURCE_INDEX")
+    es = get_es()
     if not es or not source_index:
         return {"ok": False, "reason": "Elasticsearch not configured or SOURCE_INDEX missing"}
     # Simple KQL wrapper: you can adapt to ES|QL as needed
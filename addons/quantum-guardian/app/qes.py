@@ -0,0 +1,423 @@
+"""
+Quantum Exposure Score: request models, factor functions, the scored
+document and the columnar batch path, shared by the HTTP service (main.py)
+and offline file scoring.
+
+    python qes.py tokens-*.ndjson.gz --out scored/ --workers 8
+    python qes.py dump.parquet --bulk --workers 8          # bulk-load ES_INDEX
+    python qes.py big.ndjson --out - --chunk 20000 > scored.ndjson
+
+Input records have the /score-token body shape (identity, token, policy),
+one per line in NDJSON (optionally .gz) or one per row in Parquet (needs
+pyarrow). Lines are read in chunks of --chunk records and each chunk is
+validated, scored and encoded in a worker process; at most 2 x --workers
+chunks are in flight, so memory stays flat on arbitrarily large inputs.
+Output order matches input order. Every file is scored against the same
+``now``, taken once at start. Records that fail validation or scoring are
+counted and skipped (``--rejects`` keeps them). Throughput goes to stderr every
+--progress seconds and as a JSON summary at the end.
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import AwareDatetime, BaseModel, Field, TypeAdapter
+from typing_extensions import NotRequired, TypedDict
+
+import codec
+
+W_AGE = float(os.getenv("W_AGE", 8))
+W_ALG = float(os.getenv("W_ALG", 22))
+W_SCOPE = float(os.getenv("W_SCOPE", 28))
+W_DEVICE = float(os.getenv("W_DEVICE", 18))
+W_ROT = float(os.getenv("W_ROT", 14))
+W_POLICY = float(os.getenv("W_POLICY", 10))
+WEIGHTS = {"w_age": W_AGE, "w_alg": W_ALG, "w_scope": W_SCOPE,
+           "w_device": W_DEVICE, "w_rot": W_ROT, "w_policy": W_POLICY}
+
+# === Models ===
+class TokenMeta(BaseModel):
+    alg: str = Field(..., description="JWT alg, e.g., RS256, ES256, PS256")
+    key_bits: Optional[int] = Field(None, description="RSA modulus size in bits, if applicable")
+    curve: Optional[str] = Field(None, description="ECDSA curve, e.g., P-256")
+    # naive times cannot be compared with the UTC ``now``; they fail validation instead
+    issued_at: AwareDatetime
+    expires_at: AwareDatetime
+    rotation_days: Optional[int] = Field(7, description="Token/refresh rotation cadence in days")
+    device_bound: bool = Field(False, description="Is token bound to device key/TPM?")
+    scopes: List[str] = Field(default_factory=list)
+
+class IdentityMeta(BaseModel):
+    user: Optional[str] = None
+    issuer: Optional[str] = None
+    session_id: Optional[str] = None
+
+class PolicyMeta(BaseModel):
+    issuer_policy_gap: Optional[float] = Field(0.0, description="0-2 scale: 0 means strict modern policy, 2 means weak/legacy")
+
+class ScoreRequest(BaseModel):
+    identity: IdentityMeta
+    token: TokenMeta
+    policy: Optional[PolicyMeta] = PolicyMeta()
+
+# === Helpers ===
+ALG_RISK_TABLE = {
+    # Relative ordinal 1 (low) .. 5 (high). Configure with your cryptography team.
+    "RS256": lambda bits: 3 if (bits or 2048) >= 2048 else 4,
+    "RS384": lambda bits: 3,
+    "RS512": lambda bits: 3,
+    "PS256": lambda bits: 3,
+    "PS384": lambda bits: 3,
+    "PS512": lambda bits: 3,
+    "ES256": lambda curve: 2,
+    "ES384": lambda curve: 2,
+    "ES512": lambda curve: 2,
+    # Fallback for unknown/legacy
+}
+
+def alg_risk(alg: Optional[str], key_bits: Optional[int] = None, curve: Optional[str] = None) -> int:
+    alg = (alg or "").upper()
+    if alg.startswith("RS"):
+        return ALG_RISK_TABLE.get(alg, lambda bits: 3)(key_bits)
+    if alg.startswith("PS"):
+        return ALG_RISK_TABLE.get(alg, lambda bits: 3)(key_bits)
+    if alg.startswith("ES"):
+        return ALG_RISK_TABLE.get(alg, lambda curve: 2)(curve)
+    # Unknown/legacy: be conservative
+    return 4
+
+def algorithm_risk(token: TokenMeta) -> int:
+    return alg_risk(token.alg, token.key_bits, token.curve)
+
+def scope_sensitivity(scopes: List[str]) -> float:
+    if not scopes:
+        return 0.5
+    s = 0.0
+    for sc in scopes:
+        sc_l = sc.lower()
+        if "admin" in sc_l or "write" in sc_l or "privileged" in sc_l:
+            s += 1.0
+        elif "read" in sc_l or "view" in sc_l:
+            s += 0.4
+        else:
+            s += 0.6
+    # normalize roughly into 0..4
+    return min(4.0, 0.8 * s)
+
+def normalize_age(issued_at: datetime, expires_at: datetime, now: Optional[datetime] = None) -> float:
+    now = now or datetime.now(timezone.utc)
+    ttl = max(1.0, (expires_at - issued_at).total_seconds() / 86400.0)  # days
+    age = max(0.0, (now - issued_at).total_seconds() / 86400.0)
+    return min(1.0, age / ttl)  # 0..1
+
+def rotation_penalty(days: Optional[int]) -> float:
+    if days is None:
+        return 1.0
+    if days <= 7:
+        return 0.2
+    if days <= 30:
+        return 0.6
+    return 1.2
+
+def device_binding_gap(bound: bool) -> float:
+    return 0.0 if bound else 1.0
+
+def qes_factors(issued_at: datetime, expires_at: datetime, alg: str, key_bits: Optional[int],
+                curve: Optional[str], scopes: List[str], device_bound: bool, rotation_days: Optional[int],
+                policy_gap: Optional[float], now: Optional[datetime] = None) -> Tuple[float, ...]:
+    """(score, f_age, f_alg, f_scope, f_device, f_rot, f_policy), unrounded."""
+    f_age = normalize_age(issued_at, expires_at, now)
+    f_alg = float(alg_risk(alg, key_bits, curve))
+    f_scope = scope_sensitivity(scopes)
+    f_device = device_binding_gap(device_bound)
+    f_rot = rotation_penalty(rotation_days)
+    f_policy = float(policy_gap or 0.0)
+
+    score = (W_AGE * f_age + W_ALG * f_alg + W_SCOPE * f_scope +
+             W_DEVICE * f_device + W_ROT * f_rot + W_POLICY * f_policy)
+    return score, f_age, f_alg, f_scope, f_device, f_rot, f_policy
+
+def compute_qes(req: ScoreRequest, now: Optional[datetime] = None) -> Dict[str, Any]:
+    t = req.token
+    score, f_age, f_alg, f_scope, f_device, f_rot, f_policy = qes_factors(
+        t.issued_at, t.expires_at, t.alg, t.key_bits, t.curve, t.scopes, t.device_bound, t.rotation_days,
+        (req.policy or PolicyMeta()).issuer_policy_gap, now)
+
+    return {
+        "qes": {
+            "score": round(score, 2),
+            "factors": {
+                "token_age_days": round(f_age, 3),
+                "algorithm_risk": round(f_alg, 3),
+                "scope_sensitivity": round(f_scope, 3),
+                "device_binding_gap": round(f_device, 3),
+                "rotation_gap": round(f_rot, 3),
+                "issuer_policy_gap": round(f_policy, 3),
+            },
+            "weights": {
+                "w_age": W_AGE, "w_alg": W_ALG, "w_scope": W_SCOPE,
+                "w_device": W_DEVICE, "w_rot": W_ROT, "w_policy": W_POLICY
+            }
+        },
+        "crypto_profile": {
+            "alg_family": req.token.alg[:2].upper(),
+            "algorithm_risk": int(f_alg),
+            "notes": [
+                "device_bound" if req.token.device_bound else "not_device_bound"
+            ]
+        }
+    }
+
+def score_doc(req: ScoreRequest, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """The document indexed for one token: event header, identity, token and the QES enrichment."""
+    now = now or datetime.now(timezone.utc)
+    doc = {
+        "event": {"module": "idea3", "type": "token_crypto_risk", "time": now.isoformat()},
+        "identity": req.identity.model_dump(),
+        "token": req.token.model_dump(),
+    }
+    doc.update(compute_qes(req, now))
+    return doc
+
+# === Columnar batch scoring ===
+# The fast batch path validates the raw request body in one pass against
+# TypedDicts (no model instances, no .dict() round trips) and scores straight
+# from the validated dicts. Defaults match the models above.
+class _TokenItem(TypedDict):
+    alg: str
+    key_bits: NotRequired[Optional[int]]
+    curve: NotRequired[Optional[str]]
+    issued_at: AwareDatetime
+    expires_at: AwareDatetime
+    rotation_days: NotRequired[Optional[int]]
+    device_bound: NotRequired[bool]
+    scopes: NotRequired[List[str]]
+
+class _IdentityItem(TypedDict, total=False):
+    user: Optional[str]
+    issuer: Optional[str]
+    session_id: Optional[str]
+
+class _PolicyItem(TypedDict, total=False):
+    issuer_policy_gap: Optional[float]
+
+class _ScoreItem(TypedDict):
+    identity: _IdentityItem
+    token: _TokenItem
+    policy: NotRequired[Optional[_PolicyItem]]
+
+class _BatchBody(TypedDict):
+    items: List[_ScoreItem]
+
+BATCH_ADAPTER = TypeAdapter(_BatchBody)
+
+FACTOR_COLUMNS = ("token_age_days", "algorithm_risk", "scope_sensitivity", "device_binding_gap",
+                  "rotation_gap", "issuer_policy_gap")
+
+def score_columns(items: List[Dict[str, Any]], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Score validated batch items into parallel lists (``score``, one per factor, ``alg_family``)."""
+    now = now or datetime.now(timezone.utc)
+    score: List[float] = []
+    factors: List[List[float]] = [[] for _ in FACTOR_COLUMNS]
+    family: List[str] = []
+    for it in items:
+        t = it["token"]
+        f = qes_factors(t["issued_at"], t["expires_at"], t["alg"], t.get("key_bits"), t.get("curve"),
+                        t.get("scopes", []), t.get("device_bound", False), t.get("rotation_days", 7),
+                        (it.get("policy") or {}).get("issuer_policy_gap", 0.0), now)
+        score.append(round(f[0], 2))
+        for col, v in zip(factors, f[1:]):
+            col.append(round(v, 3))
+        family.append(t["alg"][:2].upper())
+    cols: Dict[str, Any] = {"score": score, "alg_family": family}
+    cols.update(zip(FACTOR_COLUMNS, factors))
+    return cols
+
+def column_docs(items: List[Dict[str, Any]], cols: Dict[str, Any], now: datetime) -> Iterator[Dict[str, Any]]:
+    """The score_doc() document for every item, rebuilt from ``score_columns`` output."""
+    event = {"module": "idea3", "type": "token_crypto_risk", "time": now.isoformat()}
+    for j, it in enumerate(items):
+        idn, t = it["identity"], it["token"]
+        bound = t.get("device_bound", False)
+        yield {
+            "event": event,
+            "identity": {"user": idn.get("user"), "issuer": idn.get("issuer"), "session_id": idn.get("session_id")},
+            "token": {"alg": t["alg"], "key_bits": t.get("key_bits"), "curve": t.get("curve"),
+                      "issued_at": t["issued_at"], "expires_at": t["expires_at"],
+                      "rotation_days": t.get("rotation_days", 7), "device_bound": bound,
+                      "scopes": t.get("scopes", [])},
+            "qes": {"score": cols["score"][j], "factors": {c: cols[c][j] for c in FACTOR_COLUMNS},
+                    "weights": WEIGHTS},
+            "crypto_profile": {"alg_family": cols["alg_family"][j], "algorithm_risk": int(cols["algorithm_risk"][j]),
+                               "notes": ["device_bound" if bound else "not_device_bound"]},
+        }
+
+# === Offline file scoring ===
+def _open_text(path: str):
+    if path == "-":
+        return sys.stdin.buffer
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def read_chunks(path: str, size: int) -> Iterator[List[Any]]:
+    """Records of ``path`` in lists of ``size``: raw lines for NDJSON, dicts for Parquet."""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("reading Parquet needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=size):
+            yield batch.to_pylist()
+        return
+    f = _open_text(path)
+    try:
+        chunk: List[bytes] = []
+        for line in f:
+            if line.strip():
+                chunk.append(line)
+                if len(chunk) >= size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+
+def score_chunk(records: List[Any], now: datetime, action: Optional[bytes] = None) -> Tuple[bytes, int, List[Any]]:
+    """Validate and score one chunk; returns (NDJSON body, scored count, rejected records)."""
+    out: List[bytes] = []
+    rejects: List[Any] = []
+    for rec in records:
+        try:
+            if isinstance(rec, (bytes, str)):
+                req = ScoreRequest.model_validate_json(rec)
+            else:
+                req = ScoreRequest.model_validate(rec)
+            doc = codec.dumps(score_doc(req, now)) + b"\n"
+        except Exception:  # invalid, or valid but unscorable: one record must not abort the run
+            rejects.append(rec)
+            continue
+        if action:
+            out.append(action)
+        out.append(doc)
+    return b"".join(out), len(records) - len(rejects), rejects
+
+def _bulk(es, body: bytes) -> int:
+    res = es.bulk(operations=body, refresh=False)
+    res = getattr(res, "body", res)
+    if not res.get("errors"):
+        return 0
+    return sum(1 for it in res.get("items", []) if it.get("index", {}).get("status", 200) >= 300)
+
+class _Sink:
+    """Where scored chunks go: one output file per input, stdout, or Elastic bulk."""
+
+    def __init__(self, args):
+        self.args = args
+        self.es = None
+        self.f = None
+        if args.bulk:
+            from main import get_es, ES_INDEX
+            self.es = get_es()
+            if self.es is None:
+                raise SystemExit("--bulk needs ELASTIC_CLOUD_URL and ELASTIC_API_KEY")
+            self.action = codec.bulk_action(args.index or ES_INDEX)
+        else:
+            self.action = None
+            if args.out != "-":
+                os.makedirs(args.out, exist_ok=True)
+        self.rejects = open(args.rejects, "ab") if args.rejects else None
+        self.failed = 0
+
+    def open(self, src: str) -> None:
+        if self.es is not None or self.args.out == "-":
+            self.f = sys.stdout.buffer if self.es is None else None
+            return
+        name = os.path.basename(src)
+        for ext in (".gz", ".ndjson", ".jsonl", ".json", ".parquet"):
+            if name.endswith(ext):
+                name = name[: -len(ext)]
+        path = os.path.join(self.args.out, name + ".scored.ndjson" + (".gz" if self.args.gzip else ""))
+        self.f = gzip.open(path, "wb", compresslevel=1) if self.args.gzip else open(path, "wb")
+
+    def write(self, body: bytes, rejects: List[Any]) -> None:
+        if body:
+            if self.es is not None:
+                self.failed += _bulk(self.es, body)
+            else:
+                self.f.write(body)
+        if self.rejects is not None:
+            for r in rejects:
+                self.rejects.write(r if isinstance(r, bytes) else codec.dumps(r) + b"\n")
+
+    def close_file(self) -> None:
+        if self.f is not None and self.f is not sys.stdout.buffer:
+            self.f.close()
+        self.f = None
+
+    def close(self) -> None:
+        self.close_file()
+        if self.rejects is not None:
+            self.rejects.close()
+
+def score_files(args) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    sink = _Sink(args)
+    totals = {"files": 0, "records": 0, "scored": 0, "rejected": 0, "bytes_out": 0}
+    t0 = last = time.perf_counter()
+
+    def account(res) -> None:
+        nonlocal last
+        body, ok, rejects = res
+        sink.write(body, rejects)
+        totals["scored"] += ok
+        totals["rejected"] += len(rejects)
+        totals["records"] += ok + len(rejects)
+        totals["bytes_out"] += len(body)
+        if args.progress and time.perf_counter() - last >= args.progress:
+            last = time.perf_counter()
+            print(f"{totals['records']:,} records, {totals['records'] / (last - t0):,.0f}/s",
+                  file=sys.stderr, flush=True)
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for src in args.inputs:
+            sink.open(src)
+            inflight: deque = deque()
+            for chunk in read_chunks(src, args.chunk):
+                inflight.append(pool.submit(score_chunk, chunk, now, sink.action))
+                if len(inflight) >= 2 * args.workers:
+                    account(inflight.popleft().result())
+            while inflight:
+                account(inflight.popleft().result())
+            sink.close_file()
+            totals["files"] += 1
+    sink.close()
+
+    elapsed = time.perf_counter() - t0
+    totals.update(seconds=round(elapsed, 3), records_per_s=round(totals["records"] / max(elapsed, 1e-9)),
+                  workers=args.workers, chunk=args.chunk, bulk_failed=sink.failed)
+    return totals
+
+def _main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("inputs", nargs="+", help="NDJSON (.gz) or Parquet files; - for stdin")
+    ap.add_argument("--out", default="scored", help="output directory, or - for stdout (default: scored)")
+    ap.add_argument("--gzip", action="store_true", help="gzip the output files")
+    ap.add_argument("--bulk", action="store_true", help="bulk-load into Elastic instead of writing files")
+    ap.add_argument("--index", help="target index for --bulk (default: ELASTIC_INDEX_TARGET)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk", type=int, default=5000, help="records per task (and per bulk request)")
+    ap.add_argument("--rejects", help="append records that fail validation to this file")
+    ap.add_argument("--progress", type=float, default=10.0, help="seconds between progress lines (0: off)")
+    args = ap.parse_args(argv)
+    print(codec.dumps_str(score_files(args)), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -1,24 +1,180 @@
-async def _index_one(payload: Dict[str, Any]) -> Dict[str, Any]:
-    index = payload.get("index") or DEFAULT_INDEX
-    if not index:
-        raise HTTPException(status_code=400, detail="No index specified and ELASTIC_INDEX is empty")
+"""
+ith-ingestor: a thin forwarder that indexes JSON documents into Elastic Cloud.
+
+    POST /ingest       one document; ``index`` picks the target (ELASTIC_INDEX
+                       by default), ``raw`` is indexed instead of the whole payload
+    POST /index_many   many documents of the same shape, as a JSON array or
+                       NDJSON (one per line); answers one status per document
+
+/index_many groups the documents by target index and sends them as
+``create`` items (auto ids, also accepted by data streams). Each
+``<index>/_bulk`` request carries at most BULK_CHUNK_DOCS documents or
+BULK_CHUNK_BYTES. BULK_CONCURRENCY requests are in flight at once. Requests
+rejected as a whole with 429/502/503/504, or failing in transport, are
+retried. So are the single items Elastic rejects with 429/503. A retry
+waits a random time up to BULK_BACKOFF_S * 2^attempt (capped at
+BULK_BACKOFF_MAX_S, at least Retry-After), for BULK_MAX_RETRIES attempts.
+Only items still pending are re-sent. After a transport error the first
+attempt may have landed, so documents can then be written twice.
+Everything else comes back as that document's status, and the response is
+200 like ``_bulk``, with ``errors`` set when any document failed.
+
+Request bodies may be gzip/deflate compressed (``Content-Encoding``); other
+encodings get a 415 listing the accepted ones. Documents go to Elastic
+gzipped when ES_HTTP_COMPRESS is on and they are at least
+COMPRESS_MIN_BYTES; if Elastic (or a proxy in front of it) answers 415, the
+document is re-sent plain and compression stays off.
+
+Built from this directory alone (see Dockerfile), so it does not share the
+ingestor's app.utils helpers.
+"""
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+
+ELASTIC_CLOUD_URL = os.getenv("ELASTIC_CLOUD_URL", "")
+ELASTIC_API_KEY = os.getenv("ELASTIC_API_KEY", "")
+DEFAULT_INDEX = os.getenv("ELASTIC_INDEX", "ith-events")
+
+ES_HTTP_COMPRESS = os.getenv("ES_HTTP_COMPRESS", "true").lower() == "true"
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "1"))
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+MAX_INFLATED_BYTES = int(os.getenv("MAX_INFLATED_BYTES", str(32 * 1024 * 1024)))
+
+BULK_CHUNK_DOCS = int(os.getenv("BULK_CHUNK_DOCS", "500"))
+BULK_CHUNK_BYTES = int(os.getenv("BULK_CHUNK_BYTES", str(5 * 1024 * 1024)))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "4"))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "4"))
+BULK_BACKOFF_S = float(os.getenv("BULK_BACKOFF_S", "0.5"))
+BULK_BACKOFF_MAX_S = float(os.getenv("BULK_BACKOFF_MAX_S", "10"))
+
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+_CREATE = b'{"create":{}}\n'  # index comes from the <index>/_bulk path
+
+app = FastAPI(title="ITH Ingestor")
+_client = httpx.AsyncClient(timeout=20)
+_compress = ES_HTTP_COMPRESS  # cleared by the first 415 from Elastic
+
+
+def _auth_headers() -> Dict[str, str]:
+    key = ELASTIC_API_KEY
+    if ":" in key:  # id:key pair rather than the encoded key
+        key = base64.b64encode(key.encode()).decode()
+    return {"Authorization": f"ApiKey {key}", "Content-Type": "application/json"}
+
+
+@app.on_event("shutdown")
+async def _close_client():
+    await _client.aclose()
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "index": DEFAULT_INDEX, "elastic_url_set": bool(ELASTIC_CLOUD_URL),
+            "elastic_key_set": bool(ELASTIC_API_KEY), "compress": _compress}
+
+
+# --------------------
+# Compressed bodies
+# --------------------
+def _gzip(data: bytes) -> bytes:
+    c = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 31)
+    return c.compress(data) + c.flush()
+
+
+def _encode(body: bytes) -> Tuple[bytes, Dict[str, str]]:
+    if not _compress or len(body) < COMPRESS_MIN_BYTES:
+        return body, {}
+    return _gzip(body), {"Content-Encoding": "gzip"}
+
+
+async def _post(url: str, body: bytes, content_type: str = "application/json") -> httpx.Response:
+    """POST to Elastic, gzipped when enabled; a 415 re-sends plain and turns compression off."""
+    global _compress
+    headers = {**_auth_headers(), "Content-Type": content_type}
+    data, extra = _encode(body)
+    resp = await _client.post(url, headers={**headers, **extra}, content=data)
+    if extra and resp.status_code == 415:
+        _compress = False
+        resp = await _client.post(url, headers=headers, content=body)
+    return resp
+
+
+async def _read_body(request: Request) -> bytes:
+    raw = await request.body()
+    encoding = request.headers.get("content-encoding", "").strip().lower()
+    if encoding in ("", "identity"):
+        return raw
+    if encoding not in ("gzip", "x-gzip", "deflate"):
+        raise HTTPException(status_code=415, detail=f"unsupported Content-Encoding: {encoding}",
+                            headers={"Accept-Encoding": "gzip, deflate"})
+    d = zlib.decompressobj(47)  # gzip or zlib header
+    try:
+        body = d.decompress(raw, MAX_INFLATED_BYTES + 1)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"invalid {encoding} body: {e}")
+    if len(body) > MAX_INFLATED_BYTES:
+        raise HTTPException(status_code=413, detail=f"body inflates past {MAX_INFLATED_BYTES} bytes")
+    if not d.eof:
+        raise HTTPException(status_code=400, detail=f"truncated {encoding} body")
+    return body
+
+
+# --------------------
+# Indexing
+# --------------------
+def _check_configured() -> None:
     if not ELASTIC_CLOUD_URL:
         raise HTTPException(status_code=500, detail="500: Elastic Cloud URL not configured")
     if not ELASTIC_API_KEY:
         raise HTTPException(status_code=500, detail="500: Elastic API key not configured")
 
+
+def _index_of(payload: Dict[str, Any]) -> str:
+    index = payload.get("index") or DEFAULT_INDEX
+    if not index:
+        raise ValueError("No index specified and ELASTIC_INDEX is empty")
+    if not isinstance(index, str):
+        raise ValueError("'index' must be a string")
+    return index
+
+
+def _document(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """The document to store for ``payload``; ValueError when 'raw' or 'event' is not an object."""
     # If client passes 'raw', index *that* — but preserve '@timestamp' if it was sent at the top level
-    body: Dict[str, Any] = payload.get("raw") or dict(payload)  # copy if not raw
+    raw = payload.get("raw")
+    if raw is not None and not isinstance(raw, dict):
+        raise ValueError("'raw' must be a JSON object")
+    body: Dict[str, Any] = raw or dict(payload)  # copy if not raw
+    if not isinstance(body.get("event", {}), dict):
+        raise ValueError("'event' must be a JSON object")
     if "@timestamp" in payload and "@timestamp" not in body:
         body["@timestamp"] = payload["@timestamp"]
 
     # (Optional but helpful for rules)
     body.setdefault("event", {}).setdefault("kind", "event")
+    return body
+
+
+async def _index_one(payload: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        index = _index_of(payload)
+        body = _document(payload)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _check_configured()
 
     url = f"{ELASTIC_CLOUD_URL.rstrip('/')}/{index}/_doc"
-    headers = _auth_headers()
     try:
-        resp = await _client.post(url, headers=headers, json=body)
+        resp = await _post(url, json.dumps(body, separators=(",", ":")).encode())
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"httpx_error: {e!s}")
 
@@ -29,3 +185,150 @@ async def _index_one(payload: Dict[str, Any]) -> Dict[str, Any]:
         return resp.json()
     except Exception:
         return {"status_code": resp.status_code, "text": resp.text}
+
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    try:
+        payload = json.loads(await _read_body(request))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="expected one JSON object")
+    return await _index_one(payload)
+
+
+# --------------------
+# Batch indexing
+# --------------------
+def _parse_many(data: bytes, content_type: str) -> List[Any]:
+    """Payloads from a JSON array or NDJSON; an NDJSON line that is not JSON leaves its ValueError."""
+    if data.lstrip()[:1] == b"[" and "ndjson" not in content_type:
+        docs = json.loads(data)
+        if not isinstance(docs, list):
+            raise ValueError("expected a JSON array")
+        return docs
+    out: List[Any] = []
+    for line in data.split(b"\n"):
+        if not line.strip():
+            continue
+        try:
+            out.append(json.loads(line))
+        except ValueError as e:
+            out.append(e)
+    return out
+
+
+def _chunks(lines: List[bytes]) -> List[Tuple[int, int]]:
+    """[start, end) ranges of at most BULK_CHUNK_DOCS lines and BULK_CHUNK_BYTES (one line at least)."""
+    out, start, size = [], 0, 0
+    for i, line in enumerate(lines):
+        if i > start and (i - start >= BULK_CHUNK_DOCS or size + len(line) > BULK_CHUNK_BYTES):
+            out.append((start, i))
+            start, size = i, 0
+        size += len(line)
+    if start < len(lines):
+        out.append((start, len(lines)))
+    return out
+
+
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+    # full jitter: callers throttled together do not come back together
+    delay = random.uniform(0, min(BULK_BACKOFF_MAX_S, BULK_BACKOFF_S * 2 ** attempt))
+    try:
+        return max(delay, min(float(retry_after), BULK_BACKOFF_MAX_S)) if retry_after else delay
+    except ValueError:  # HTTP-date form
+        return delay
+
+
+def _error(err: Any) -> str:
+    if isinstance(err, dict):
+        return f"{err.get('type', 'error')}: {err.get('reason', '')}"[:500]
+    return str(err)[:500]
+
+
+async def _bulk_chunk(index: str, lines: List[bytes], slots: List[int], results: List[Optional[Dict[str, Any]]],
+                      sem: asyncio.Semaphore) -> None:
+    """Send one chunk and retry what is retryable; fills ``results[slots[i]]`` for every line."""
+    url = f"{ELASTIC_CLOUD_URL.rstrip('/')}/{index}/_bulk"
+    pending = list(range(len(lines)))
+    retry_after = None
+    for attempt in range(BULK_MAX_RETRIES + 1):
+        if attempt:
+            await asyncio.sleep(_backoff(attempt - 1, retry_after))
+            retry_after = None
+        async with sem:
+            try:
+                resp = await _post(url, b"".join(lines[i] for i in pending), "application/x-ndjson")
+            except httpx.HTTPError as e:
+                for i in pending:
+                    results[slots[i]] = {"index": index, "status": 502, "error": f"httpx_error: {e!s}"[:500]}
+                continue
+        if resp.status_code >= 400:
+            for i in pending:
+                results[slots[i]] = {"index": index, "status": resp.status_code,
+                                     "error": f"elastic_error: {resp.text[:500]}"}
+            if resp.status_code in RETRYABLE_STATUSES:
+                retry_after = resp.headers.get("retry-after")
+                continue
+            return
+        try:
+            body = resp.json()
+        except ValueError:  # cut-off reply behind a proxy: nothing says which items were stored
+            body = None
+        if not isinstance(body, dict):
+            for i in pending:
+                results[slots[i]] = {"index": index, "status": 502, "error": "unreadable _bulk response"}
+            continue
+        items = body.get("items") or []
+        again = []
+        for i, item in zip(pending, items):
+            r = next(iter(item.values()), {})
+            status = int(r.get("status", 500))
+            if status < 300:
+                results[slots[i]] = {"index": r.get("_index", index), "status": status, "_id": r.get("_id")}
+                continue
+            results[slots[i]] = {"index": index, "status": status, "error": _error(r.get("error"))}
+            if status in RETRYABLE_STATUSES:
+                again.append(i)
+        for i in pending[len(items):]:
+            results[slots[i]] = {"index": index, "status": 500, "error": "missing from the _bulk response"}
+        pending = again
+        if not pending:
+            return
+
+
+@app.post("/index_many")
+async def index_many(request: Request):
+    _check_configured()
+    t0 = time.perf_counter()
+    try:
+        payloads = _parse_many(await _read_body(request), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"invalid JSON: {e}")
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(payloads)
+    groups: Dict[str, Tuple[List[bytes], List[int]]] = {}
+    for slot, payload in enumerate(payloads):
+        if isinstance(payload, ValueError):
+            results[slot] = {"status": 400, "error": f"invalid JSON: {payload}"}
+            continue
+        if not isinstance(payload, dict):
+            results[slot] = {"status": 400, "error": "expected a JSON object"}
+            continue
+        try:
+            index = _index_of(payload)
+            line = _CREATE + json.dumps(_document(payload), separators=(",", ":")).encode() + b"\n"
+        except ValueError as e:
+            results[slot] = {"status": 400, "error": str(e)}
+            continue
+        lines, slots = groups.setdefault(index, ([], []))
+        lines.append(line)
+        slots.append(slot)
+
+    sem = asyncio.Semaphore(BULK_CONCURRENCY)
+    await asyncio.gather(*(_bulk_chunk(index, lines[a:b], slots[a:b], results, sem)
+                           for index, (lines, slots) in groups.items() for a, b in _chunks(lines)))
+    indexed = sum(1 for r in results if r["status"] < 300)
+    return {"took_ms": round((time.perf_counter() - t0) * 1000), "docs": len(results), "indexed": indexed,
+            "failed": len(results) - indexed, "errors": indexed != len(results), "items": results}
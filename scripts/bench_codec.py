@@ -0,0 +1,79 @@
+"""
+Throughput of the JSON codec on realistic event sizes: request parsing,
+_bulk body building and prompt serialization, stdlib json versus
+app.utils.codec (orjson when installed, stdlib fallback otherwise).
+
+    python scripts/bench_codec.py
+    python scripts/bench_codec.py --batch 1000 --budget 4000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "ingestor"))
+
+from app.utils import codec  # noqa: E402
+
+
+def make_event(raw_fields: int, rnd: random.Random):
+    """An ingested login event with a producer payload of ``raw_fields`` keys."""
+    return {
+        "@timestamp": "2025-01-01T12:00:00Z",
+        "user": {"name": "alice", "id": "u-1842"},
+        "event": {"action": "login", "outcome": "failure", "category": "authentication", "mfa": False,
+                  "risk_score": 0.7, "explanation": "impossible_travel;asn_change"},
+        "source": {"ip": "203.0.113.9", "asn": 64500, "geo": {"lat": 40.71, "lon": -74.0, "country": "US"},
+                   "reputation": {"ip": ["tor_exit"], "asn": []}},
+        "user_agent": {"family": "Chrome", "original": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/126.0"},
+        "raw_event": {f"attr_{i}": {"value": "x" * rnd.randint(8, 64), "seq": i, "tags": ["idp", "okta"]}
+                      for i in range(raw_fields)},
+    }
+
+
+def rate(fn, seconds=0.5):
+    n, t0 = 0, time.perf_counter()
+    while True:
+        fn()
+        n += 1
+        el = time.perf_counter() - t0
+        if el >= seconds:
+            return n / el
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--batch", type=int, default=500, help="docs per _bulk body")
+    ap.add_argument("--budget", type=int, default=4000, help="prompt budget in characters")
+    args = ap.parse_args()
+    rnd = random.Random(7)
+    print(f"codec backend: {codec.BACKEND}")
+    print(f"{'event':>8} {'op':<22} {'stdlib':>12} {'codec':>12} {'speedup':>8}")
+    for raw_fields in (4, 40, 400):
+        ev = make_event(raw_fields, rnd)
+        body = json.dumps(ev).encode()
+        label = f"{len(body) / 1024:.1f}KB"
+        batch = [ev] * args.batch
+        cases = [
+            ("parse (ev/s)", lambda: json.loads(body), lambda: codec.loads(body), 1),
+            ("encode (ev/s)", lambda: json.dumps(ev, ensure_ascii=False, default=str).encode(),
+             lambda: codec.dumps(ev), 1),
+            (f"_bulk x{args.batch} (ev/s)",
+             lambda: ("\n".join(json.dumps(op, ensure_ascii=False, default=str) for d in batch
+                                for op in ({"index": {"_index": "ith-events"}}, d)) + "\n").encode(),
+             lambda: b"".join(codec.bulk_action("ith-events") + codec.dumps(d) + b"\n" for d in batch),
+             args.batch),
+            (f"prompt[:{args.budget}] (ev/s)", lambda: json.dumps(ev, default=str)[:args.budget],
+             lambda: codec.dumps_bounded(ev, args.budget), 1),
+        ]
+        for name, old, new, per_call in cases:
+            r_old, r_new = rate(old) * per_call, rate(new) * per_call
+            print(f"{label:>8} {name:<22} {r_old:12,.0f} {r_new:12,.0f} {r_new / r_old:7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Request-body compression (services/ingestor/app/utils/compress.py): bytes on
+the wire and CPU per 10k events for each hop that carries event JSON.
+
+    ingest, 1/req      event-gen style, one event per POST /ingest
+    ingest, batched    JSON arrays of --ingest-batch events per POST /ingest
+    elastic _bulk      NDJSON create bodies of --bulk-batch events (BulkHTTP,
+                       spool drainer, elasticsearch-py with http_compress)
+    elastic _doc       one scored document per request (write_elastic,
+                       ith-ingestor _index_one)
+
+For each hop and codec it prints the body bytes per 10k events, the ratio,
+and the CPU ms to compress and to inflate them (process time, best of
+--repeat). Bodies under --min-bytes (COMPRESS_MIN_BYTES) are sent as they
+are, as the senders do; --min-bytes 0 shows what single events would gain. zstd rows appear only when the ``zstandard`` package is
+installed, and they apply to the ingest hop only, since Elastic accepts
+gzip request bodies but not zstd. A correctness pass runs every body
+through DecompressMiddleware's decoder and checks it matches.
+
+    python scripts/bench_compression.py
+    python scripts/bench_compression.py --events 50000 --levels 1 6
+    python scripts/bench_compression.py --min-bytes 0
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "ingestor"))
+
+from app.utils import codec  # noqa: E402
+from app.utils.compress import COMPRESS_MIN_BYTES, decode, gzip_bytes, zstandard  # noqa: E402
+from app.utils.es_bulk import bulk_body  # noqa: E402
+
+PER = 10_000
+T0 = datetime(2025, 9, 1, tzinfo=timezone.utc).timestamp()
+CITIES = [("US", "New York", 40.7, -74.0), ("GB", "London", 51.5, -0.1), ("JP", "Tokyo", 35.7, 139.7),
+          ("AU", "Sydney", -33.9, 151.2), ("FR", "Paris", 48.9, 2.35)]
+REASONS = ["none"] * 20 + ["asn_change", "impossible_travel", "brute_force;credential_stuffing", "tor_exit"]
+
+
+def raw_event(i, rnd):
+    """What a sender posts to /ingest."""
+    u = rnd.randrange(5000)
+    cc, city, lat, lon = CITIES[u % len(CITIES)]
+    return {
+        "@timestamp": datetime.fromtimestamp(T0 + i * 0.37, timezone.utc).isoformat().replace("+00:00", "Z"),
+        "product": "ith", "pipeline": "identity-threat-hunter",
+        "user": {"id": f"u{u}", "name": f"user{u}@corp.example"},
+        "event": {"action": "login", "category": "authentication",
+                  "outcome": "failure" if rnd.random() < 0.05 else "success", "mfa": rnd.random() < 0.8},
+        "source": {"ip": f"10.{u % 200}.{rnd.randrange(250)}.{rnd.randrange(250)}", "asn": 64500 + u % 9,
+                   "geo": {"country_iso_code": cc, "city_name": city, "lat": round(lat + rnd.uniform(-.2, .2), 4),
+                           "lon": round(lon + rnd.uniform(-.2, .2), 4)}},
+        "device_fingerprint": f"{rnd.getrandbits(64):016x}",
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      f"Chrome/12{rnd.randrange(10)}.0.0.0 Safari/537.36",
+    }
+
+
+def scored_doc(ev, rnd):
+    """What the ingestor writes to Elastic for it."""
+    reasons = rnd.choice(REASONS)
+    doc = dict(ev)
+    doc["event"] = dict(ev["event"], kind="event", risk_score=0.0 if reasons == "none" else round(rnd.random(), 2),
+                        reasons=reasons, tier="low" if reasons == "none" else "high")
+    doc["tags"] = ["ith", "scored"] + ([] if reasons == "none" else ["risky"])
+    if reasons != "none":
+        doc["event"]["explanation"] = (f"{reasons.replace(';', ' and ')} for {ev['user']['id']} from "
+                                       f"{ev['source']['ip']} ({ev['source']['geo']['city_name']}); "
+                                       "step-up MFA recommended.")
+    return doc
+
+
+def codecs(levels, with_zstd):
+    out = [("none", None, None)]
+    for lv in levels:
+        out.append((f"gzip-{lv}", lambda b, lv=lv: gzip_bytes(b, lv), "gzip"))
+    if with_zstd and zstandard is not None:
+        for lv in (1, 3):
+            cctx = zstandard.ZstdCompressor(level=lv)
+            out.append((f"zstd-{lv}", cctx.compress, "zstd"))
+    return out
+
+
+def measure(bodies, enc, encoding, repeat, floor):
+    """(wire bytes, compress CPU s, inflate CPU s) for one pass over ``bodies``."""
+    if enc is None:
+        return sum(map(len, bodies)), 0.0, 0.0
+    best_c = best_d = float("inf")
+    for _ in range(repeat):
+        t0 = time.process_time()
+        wire = [enc(b) if len(b) >= floor else b for b in bodies]
+        best_c = min(best_c, time.process_time() - t0)
+    pairs = [(w, b) for w, b in zip(wire, bodies) if w is not b]
+    for _ in range(repeat):
+        t0 = time.process_time()
+        for w, _b in pairs:
+            decode(w, encoding)
+        best_d = min(best_d, time.process_time() - t0)
+    for w, b in pairs:
+        assert decode(w, encoding) == b
+    return sum(map(len, wire)), best_c, best_d
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--events", type=int, default=20_000)
+    ap.add_argument("--ingest-batch", type=int, default=100, help="events per batched /ingest POST")
+    ap.add_argument("--bulk-batch", type=int, default=500, help="events per _bulk request (SPOOL_BATCH)")
+    ap.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9], help="gzip levels")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--min-bytes", type=int, default=COMPRESS_MIN_BYTES, help="smallest body compressed")
+    args = ap.parse_args()
+    rnd = random.Random(49)
+    events = [raw_event(i, rnd) for i in range(args.events)]
+    docs = [scored_doc(e, rnd) for e in events]
+    hops = [
+        ("ingest, 1/req", [codec.dumps(e) for e in events], True),
+        (f"ingest, {args.ingest_batch}/req",
+         [codec.dumps(events[i:i + args.ingest_batch]) for i in range(0, len(events), args.ingest_batch)], True),
+        (f"elastic _bulk {args.bulk_batch}",
+         [bulk_body([("ith-events", d) for d in docs[i:i + args.bulk_batch]], "create")
+          for i in range(0, len(docs), args.bulk_batch)], False),
+        ("elastic _doc", [codec.dumps(d) for d in docs], False),
+    ]
+    scale = PER / len(events)
+    print(f"{len(events):,} events, figures per {PER:,} events; bodies under {args.min_bytes} B "
+          f"are sent plain; zstd {'available' if zstandard is not None else 'not installed'}")
+    print(f"  {'hop':<20} {'codec':<8} {'requests':>8} {'wire KB':>10} {'ratio':>6} {'saved KB':>10} "
+          f"{'compress ms':>12} {'inflate ms':>11}")
+    for hop, bodies, zstd_ok in hops:
+        raw = sum(map(len, bodies))
+        avg = raw / len(bodies)
+        for name, enc, encoding in codecs(args.levels, zstd_ok):
+            wire, c_s, d_s = measure(bodies, enc, encoding, args.repeat, args.min_bytes)
+            print(f"  {hop:<20} {name:<8} {len(bodies) * scale:>8,.0f} {wire * scale / 1024:>10,.1f} "
+                  f"{raw / wire:>5.2f}x {(raw - wire) * scale / 1024:>10,.1f} {c_s * scale * 1e3:>12.1f} "
+                  f"{d_s * scale * 1e3:>11.1f}")
+        print(f"  {'':<20} {'':<8} average body {avg:,.0f} B")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
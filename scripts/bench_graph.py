@@ -0,0 +1,124 @@
+"""
+User / IP / device graph (services/ingestor/app/utils/graph.py) at a few
+million edges: observe cost, degree and neighbour queries by degree, bytes
+per live edge against dicts of dicts (tracemalloc, node name strings included), and a brute-force
+check that expiry keeps exactly the edges seen within the window.
+
+    python scripts/bench_graph.py
+    python scripts/bench_graph.py --events 8000000 --users 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "ingestor"))
+
+from app.utils.graph import EntityGraph  # noqa: E402
+
+T0 = 1_760_000_000
+
+
+def stream(n, users, rnd, span):
+    """Mostly stable user -> few IPs / devices; a few hub devices (kiosks, shared jump hosts)."""
+    hubs = [f"dev-hub-{i}" for i in range(20)]
+    for i in range(n):
+        u = rnd.randrange(users)
+        ts = T0 + i * span / n
+        ip = f"10.{u % 251}.{(u >> 8) % 251}.{rnd.randrange(4)}"
+        dev = hubs[rnd.randrange(len(hubs))] if rnd.random() < 0.002 else f"dev-{u}-{rnd.randrange(3)}"
+        yield ts, f"user-{u:07d}", ip, dev
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--events", type=int, default=3_000_000)
+    ap.add_argument("--users", type=int, default=400_000)
+    ap.add_argument("--window", type=float, default=3600.0)
+    args = ap.parse_args()
+    rnd = random.Random(5)
+    span = 4 * args.window
+    events = list(stream(args.events, args.users, rnd, span))
+
+    g = EntityGraph(args.window)
+    t0 = time.perf_counter()
+    for ts, u, ip, dev in events:
+        g.observe(ts, u, ip, dev)
+    el = time.perf_counter() - t0
+    st = g.status()
+    print(f"{args.events:,} logins over {span / 3600:.0f} h, {args.window:.0f} s window")
+    print(f"  observe      {el / args.events * 1e6:.2f} us/event incl. expiry; live: {st['edges']:,} edges, "
+          f"{st['users']:,} users, {st['ips']:,} ips, {st['devices']:,} devices")
+
+    # expiry against brute force over the last window of the stream
+    cutoff = g.now - g.window
+    tol = g.tick
+    truth = {}
+    for ts, u, ip, dev in events:
+        if ts >= cutoff - tol:
+            truth[(u, "ip", ip)] = max(truth.get((u, "ip", ip), 0), int(ts))
+            truth[(u, "device", dev)] = max(truth.get((u, "device", dev), 0), int(ts))
+    must = {k for k, t in truth.items() if t >= cutoff}
+    have = set()
+    for u in {k[0] for k in truth}:
+        for kind in ("ip", "device"):
+            have.update((u, kind, x) for x in g.neighbors("user", u, kind, since=0))
+    missing = must - have
+    stale = {k for k in have if k not in truth}
+    print(f"  expiry       {len(must):,} edges seen in the window all present: {not missing}; "
+          f"none older than window + one tick ({tol} s): {not stale}; held past the window: {len(have) - len(must):,}")
+
+    # memory: rebuild one window's worth of edges under tracemalloc
+    last = [e for e in events if e[0] >= cutoff]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    g2 = EntityGraph(args.window)
+    for ts, u, ip, dev in last:
+        g2.observe(ts, u, ip, dev)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del g2
+
+    def naive():  # the obvious layout: {user: {ip: last_seen}} both ways, per kind
+        fwd, back = {"ip": {}, "device": {}}, {"ip": {}, "device": {}}
+        for ts, u, ip, dev in last:
+            for kind, x in (("ip", ip), ("device", dev)):
+                fwd[kind].setdefault(u, {})[x] = int(ts)
+                back[kind].setdefault(x, {})[u] = int(ts)
+        return fwd, back
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ref = naive()
+    naive_used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del ref
+    print(f"  memory       {used / len(must):.0f} bytes per live edge ({used / 2**20:.0f} MiB) vs "
+          f"{naive_used / len(must):.0f} for dicts of dicts ({naive_used / used:.1f}x)")
+
+    # query cost by degree
+    devs = sorted(({d for _, _, _, d in last}), key=lambda d: g.degree("device", d))
+    for label, d in (("leaf", devs[0]), ("median", devs[len(devs) // 2]), ("hub", devs[-1])):
+        deg = g.degree("device", d)
+        reps = 20_000
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            g.degree("device", d)
+        t_deg = (time.perf_counter() - t0) / reps
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            g.neighbors("device", d)
+        t_nb = (time.perf_counter() - t0) / reps
+        print(f"  {label:<7} device degree {deg:>5}: degree() {t_deg * 1e6:.2f} us, neighbors() {t_nb * 1e6:.1f} us")
+    hub_user = g.neighbors("device", devs[-1])[0]
+    t0 = time.perf_counter()
+    co = g.co_users(hub_user)
+    print(f"  co_users     {len(co):,} users via a hub device in {(time.perf_counter() - t0) * 1e6:.0f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
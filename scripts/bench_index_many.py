@@ -0,0 +1,215 @@
+"""
+ith-ingestor ``/index_many`` (ith-ingestor/main.py) against a stand-in
+Elastic started in-process on localhost. Each stand-in request takes
+--latency-ms. A share of ``_bulk`` requests is rejected whole with
+429/503, a share is answered with a cut-off 200 body (as a proxy dropping
+the connection mid-reply would), and a share of the remaining items is
+rejected one by one with 429.
+
+It posts --docs documents over --indices target indices, as NDJSON with a
+few broken lines and malformed documents mixed in, and checks:
+
+  - every valid document is stored at least once, in the index it named,
+    and exactly once apart from chunks whose reply was cut off (those are
+    re-sent whole, as Elastic's reply does not say what it stored);
+  - the per-document statuses line up with the input (201 for stored
+    ones, 400 in the broken lines' and malformed documents' slots);
+  - no more than BULK_CONCURRENCY bulk requests were in flight at once;
+  - a document Elastic keeps refusing ends with its last status once the
+    retries run out.
+
+It then compares throughput with the loop callers used to run, one
+``/ingest`` per document.
+
+    python scripts/bench_index_many.py
+    python scripts/bench_index_many.py --docs 50000 --concurrency 8 --reject 0.2
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# valid JSON, but not a document: each gets a 400 in its own slot
+MALFORMED = ({"raw": "x"}, {"event": "x"}, {"index": ["a"]}, {"raw": {"event": 3}})
+
+
+class StandIn:
+    def __init__(self, latency, reject, item_reject, garble, seed=50):
+        self.latency = latency
+        self.reject = reject
+        self.garble = garble
+        self.garbled = set()  # n of documents stored by a request whose reply was cut off
+        self.item_reject = item_reject
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stored = {}  # index -> list of docs
+        self.requests = 0
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def bulk(self, index, body):
+        with self.lock:
+            if self.rnd.random() < self.reject:
+                return self.rnd.choice((429, 503)), {"error": {"type": "es_rejected_execution_exception"}}
+            lines = body.split(b"\n")
+            items = []
+            for i in range(0, len(lines) - 1, 2):
+                doc = json.loads(lines[i + 1])
+                if doc.get("poison") or self.rnd.random() < self.item_reject:
+                    items.append({"create": {"_index": index, "status": 429,
+                                             "error": {"type": "es_rejected_execution_exception",
+                                                       "reason": "rejected execution of coordinating operation"}}})
+                    continue
+                docs = self.stored.setdefault(index, [])
+                docs.append(doc)
+                items.append({"create": {"_index": index, "_id": f"{index}-{len(docs)}", "status": 201}})
+            out = {"errors": any(it["create"]["status"] >= 300 for it in items), "items": items}
+            if self.rnd.random() < self.garble:
+                self.garbled.update(json.loads(lines[i + 1])["n"] for i in range(0, len(lines) - 1, 2))
+                return 200, json.dumps(out)[:40]
+            return 200, out
+
+    def doc(self, index, body):
+        with self.lock:
+            docs = self.stored.setdefault(index, [])
+            docs.append(json.loads(body))
+            return 201, {"_index": index, "_id": f"{index}-{len(docs)}", "result": "created"}
+
+
+def make_handler(es: StandIn):
+    class H(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, as Elastic Cloud
+
+        def log_message(self, *a):
+            pass
+
+        def do_POST(self):
+            with es.lock:
+                es.requests += 1
+                es.inflight += 1
+                es.max_inflight = max(es.max_inflight, es.inflight)
+            try:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                time.sleep(es.latency)
+                m = re.fullmatch(r"/([^/]+)/(_bulk|_doc)", self.path.split("?")[0])
+                if m is None:
+                    status, out = 404, {"error": "not found"}
+                elif m.group(2) == "_bulk":
+                    status, out = es.bulk(m.group(1), body)
+                else:
+                    status, out = es.doc(m.group(1), body)
+            finally:
+                with es.lock:
+                    es.inflight -= 1
+            data = (out if isinstance(out, str) else json.dumps(out)).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return H
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=20_000)
+    ap.add_argument("--indices", type=int, default=3)
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="stand-in time per request")
+    ap.add_argument("--reject", type=float, default=0.1, help="share of _bulk requests rejected whole (429/503)")
+    ap.add_argument("--item-reject", type=float, default=0.02, help="share of items rejected with 429")
+    ap.add_argument("--garble", type=float, default=0.02, help="share of _bulk replies cut off mid-body")
+    ap.add_argument("--chunk", type=int, default=500, help="BULK_CHUNK_DOCS")
+    ap.add_argument("--concurrency", type=int, default=4, help="BULK_CONCURRENCY")
+    ap.add_argument("--single", type=int, default=300, help="documents sent one /ingest each, for comparison")
+    args = ap.parse_args()
+
+    es = StandIn(args.latency_ms / 1000, args.reject, args.item_reject, args.garble)
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(es))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    os.environ.update({
+        "ELASTIC_CLOUD_URL": f"http://127.0.0.1:{srv.server_address[1]}", "ELASTIC_API_KEY": "id:secret",
+        "ELASTIC_INDEX": "ith-events", "BULK_CHUNK_DOCS": str(args.chunk),
+        "BULK_CONCURRENCY": str(args.concurrency), "BULK_BACKOFF_S": "0.05", "BULK_BACKOFF_MAX_S": "1",
+        "BULK_MAX_RETRIES": "6",
+    })
+    sys.path.insert(0, os.path.join(ROOT, "ith-ingestor"))
+    import main as ith  # noqa: E402  (reads the env above at import)
+    from fastapi.testclient import TestClient
+
+    rnd = random.Random(7)
+    names = [f"ith-many-{k}" for k in range(args.indices)]
+    lines, expect = [], []
+    for n in range(args.docs):
+        if n % 997 == 13:
+            lines.append(b'{"user": "broken", ')
+            expect.append((None, 400))
+        if n % 997 == 500:
+            lines.append(json.dumps(MALFORMED[n % len(MALFORMED)]).encode())
+            expect.append((None, 400))
+        doc = {"@timestamp": "2025-09-01T00:00:00Z", "n": n, "user": {"id": f"u{rnd.randrange(999)}"},
+               "event": {"action": "login", "outcome": "success"}, "source": {"ip": f"10.0.{n % 250}.1"}}
+        if n % 3:  # the rest go to ELASTIC_INDEX
+            doc["index"] = names[n % args.indices]
+        lines.append(json.dumps(doc).encode())
+        expect.append((doc.get("index", "ith-events"), 201))
+    body = b"\n".join(lines) + b"\n"
+    print(f"stand-in Elastic, {args.latency_ms:.0f} ms per request, {args.reject:.0%} of bulk requests and "
+          f"{args.item_reject:.0%} of items rejected; {args.docs:,} docs to {args.indices + 1} indices, "
+          f"chunks of {args.chunk}, concurrency {args.concurrency}")
+
+    with TestClient(ith.app) as c:
+        t0 = time.perf_counter()
+        r = c.post("/index_many", content=gzip.compress(body),
+                   headers={"Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"})
+        many_s = time.perf_counter() - t0
+        res = r.json()
+        bulk_requests, max_inflight = es.requests, es.max_inflight
+
+        items = res["items"]
+        aligned = len(items) == len(expect) and all(
+            it["status"] == st and (idx is None or it["index"] == idx) for it, (idx, st) in zip(items, expect))
+        stored = {k: sorted(d["n"] for d in v) for k, v in es.stored.items()}
+        want = {}
+        for n in range(args.docs):
+            want.setdefault(names[n % args.indices] if n % 3 else "ith-events", []).append(n)
+        dupes = {n for v in stored.values() for n, c in Counter(v).items() if c > 1}
+        once = {k: sorted(set(v)) for k, v in stored.items()} == want and dupes <= es.garbled
+        print(f"  /index_many  {res['indexed']:,} indexed, {res['failed']:,} failed in {many_s:.2f} s "
+              f"({args.docs / many_s:,.0f} docs/s, {bulk_requests} _bulk requests incl. retries)")
+        print(f"  checks       stored once (again only after a cut-off reply, {len(es.garbled):,} docs): {once}; "
+              f"statuses aligned with input: {aligned}; "
+              f"max in flight {max_inflight} <= {args.concurrency}: {max_inflight <= args.concurrency}")
+
+        poison = c.post("/index_many", content=json.dumps([{"n": -1, "poison": True}, {"n": -2}]),
+                        headers={"Content-Type": "application/json"}).json()["items"]
+        gave_up = poison[0]["status"] == 429 and poison[1]["status"] == 201
+        print(f"  retries      always-rejected doc ends with {poison[0]['status']} after {ith.BULK_MAX_RETRIES} "
+              f"retries, its neighbour {poison[1]['status']}: {gave_up}")
+
+        es.reject = es.item_reject = es.garble = 0.0
+        single = [d for d in (json.loads(x) for x in lines[:args.single + 1] if not x.startswith(b'{"user": "broken"'))
+                  if d not in MALFORMED]
+        t0 = time.perf_counter()
+        for doc in single:
+            c.post("/ingest", json=doc)
+        single_s = time.perf_counter() - t0
+    srv.shutdown()
+    print(f"  /ingest loop {len(single):,} docs in {single_s:.2f} s ({len(single) / single_s:,.0f} docs/s); "
+          f"/index_many is {args.docs / many_s / (len(single) / single_s):,.0f}x faster")
+    return 0 if once and aligned and max_inflight <= args.concurrency and gave_up else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
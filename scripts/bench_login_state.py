@@ -0,0 +1,99 @@
+"""
+Per-user last-login state for compute_risk: the previous dict of dicts
+({"ts": datetime, "lat": float, "lon": float, "asn": ..., "mfa": bool} per
+user) versus app.utils.loginstate.LoginState. Reports bytes per user
+(tracemalloc, user id strings included in both), get+put cost, TTL
+compaction, and snapshot save/load.
+
+    python scripts/bench_login_state.py
+    python scripts/bench_login_state.py --users 5000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "ingestor"))
+
+from app.utils.loginstate import LoginState  # noqa: E402
+
+
+def rows(n, seed=3):
+    rnd = random.Random(seed)
+    base = 1_760_000_000.0
+    for i in range(n):
+        yield (f"user-{i:08d}@corp.example", base + rnd.uniform(0, 86400 * 40), rnd.uniform(-60, 60),
+               rnd.uniform(-150, 150), 64500 + rnd.randrange(500), rnd.random() < 0.7)
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=1_000_000)
+    args = ap.parse_args()
+    n = args.users
+
+    def build_dicts():
+        d = {}
+        for uid, ts, lat, lon, asn, mfa in rows(n):
+            d[uid] = {"ts": datetime.fromtimestamp(ts, timezone.utc), "lat": lat, "lon": lon, "asn": asn, "mfa": mfa}
+        return d
+
+    def build_state():
+        s = LoginState(ttl_s=30 * 86400)
+        for uid, ts, lat, lon, asn, mfa in rows(n):
+            s.put(uid, ts, lat, lon, asn, mfa)
+        return s
+
+    old, old_bytes = measure(build_dicts)
+    del old
+    state, new_bytes = measure(build_state)
+    print(f"{n:,} users")
+    print(f"  bytes/user   dict of dicts {old_bytes / n:6.0f}   LoginState {new_bytes / n:6.0f}   "
+          f"({old_bytes / new_bytes:.1f}x less)")
+
+    ids = [f"user-{random.randrange(n):08d}@corp.example" for _ in range(200_000)]
+    t0 = time.perf_counter()
+    for uid in ids:
+        p = state.get(uid)
+        state.put(uid, p.ts + 60, p.lat, p.lon, p.asn, p.mfa)
+    print(f"  get+put      {(time.perf_counter() - t0) / len(ids) * 1e6:.2f} us")
+
+    tmp = tempfile.mkdtemp(prefix="ith-login-")
+    path = os.path.join(tmp, "logins.bin")
+    t0 = time.perf_counter()
+    state.save(path)
+    t_save = time.perf_counter() - t0
+    restored = LoginState(ttl_s=10 ** 9)
+    t0 = time.perf_counter()
+    restored.load(path)
+    t_load = time.perf_counter() - t0
+    uid = ids[0]
+    assert restored.get(uid) == state.get(uid)
+    print(f"  snapshot     {os.path.getsize(path) / n:.0f} bytes/user on disk, save {t_save:.2f} s, load {t_load:.2f} s")
+
+    now = 1_760_000_000.0 + 86400 * 40
+    t0 = time.perf_counter()
+    dropped = state.compact(now=now)
+    print(f"  compact      {dropped:,} of {n:,} expired (30 d TTL) in {time.perf_counter() - t0:.2f} s; "
+          f"freed slots reused by the next {dropped:,} new users")
+    os.unlink(path)
+    os.rmdir(tmp)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
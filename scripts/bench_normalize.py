@@ -0,0 +1,148 @@
+"""
+Per-event CPU spent resolving event fields across the pipeline: the chained
+``.get`` lookups every consumer used to repeat (app ingest + rule inference
+with its per-request rule map, compute_risk, the digital twin's update and
+score) versus one ``normalize()`` pass whose slotted Event they all read.
+
+    python scripts/bench_normalize.py              # best of 5 x 100k events per layout
+    python scripts/bench_normalize.py -n 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "ingestor"))
+
+from app.utils.normalize import normalize  # noqa: E402
+
+LAYOUTS = {
+    "dotted": {
+        "@timestamp": "2025-01-01T12:00:00Z", "user.name": "alice", "user.id": "u1",
+        "event.action": "login", "event.type": "start", "event.outcome": "success",
+        "event.category": "authentication", "source.ip": "203.0.113.9", "source.asn": 64500,
+        "destination.ip": "10.0.0.5", "geo.src": "US", "geo.prev": "DE", "ith.scenario": "Impossible Travel",
+    },
+    "nested": {
+        "@timestamp": "2025-01-01T12:00:00Z", "user": {"name": "alice", "id": "u1"},
+        "event": {"action": "login", "type": "start", "outcome": "success", "category": "authentication", "mfa": True},
+        "source": {"ip": "203.0.113.9", "asn": 64500, "geo": {"lat": 40.7, "lon": -74.0, "country": "US"}},
+        "destination": {"ip": "10.0.0.5"}, "geo": {"src": "US", "prev": "DE"},
+        "user_agent": {"family": "Chrome", "original": "Mozilla/5.0 " * 8},
+    },
+    "legacy": {
+        "@timestamp": "2025-01-01T12:00:00Z", "user": {"id": "u1"},
+        "event": {"action": "login", "outcome": "failure", "mfa": False},
+        "src": {"ip": "203.0.113.9", "asn": 64500, "geo": {"lat": 40.7, "lon": -74.0, "country": "US"}},
+        "user_agent": {"family": "Firefox"}, "labels": {f"k{i}": i for i in range(10)},
+    },
+}
+
+
+_RM = {"ITH - AI Enriched Login": ("login", "start")}
+
+
+def legacy_stages(e):
+    """Field reads each consumer made before: app ingest, compute_risk, twin update + score."""
+    # app/main.py: infer_rule_name_initial + ingest()
+    for k in ("rule_name", "rule.name", "raw.rule.name", "detection", "ui_rule", "ith.rule"):
+        e.get(k)
+    e.get("ith.scenario") or e.get("scenario")
+    e.get("event.action") or e.get("action")
+    e.get("event.type") or e.get("type")
+    user_name = e.get("user.name") or e.get("user", {}).get("name")
+    act = e.get("event.action") or e.get("event", {}).get("action")
+    typ = e.get("event.type") or e.get("event", {}).get("type")
+    rm = {
+        "ITH - Honey Identity Probe": ("honeypot_access", "access"),
+        "ITH - Credential Stuffing": ("password_guess", "denied"),
+        "ITH - MFA Bypass Attempt": ("mfa_bypass", "failure"),
+        "ITH - AI Enriched Login": ("login", "start"),
+        "ITH - Impossible Travel": ("impossible_travel", "info"),
+        "ITH - Suspicious Token Use": ("token_anomaly", "info"),
+        "ITH - Geo Velocity Spike": ("geo_velocity", "info"),
+        "ITH - Privilege Escalation": ("privilege_escalation", "info"),
+        "ITH - Shared Account Usage": ("shared_account", "info"),
+        "ITH - Suspicious Process Execution": ("suspicious_process", "info"),
+        "ITH - Lateral Movement": ("lateral_movement", "info"),
+    }
+    rm.get("ITH - AI Enriched Login")
+    e.get("source.ip") or e.get("source", {}).get("ip")
+    e.get("destination.ip") or e.get("destination", {}).get("ip")
+    e.get("geo.src") or e.get("geo", {}).get("src")
+    e.get("geo.prev") or e.get("geo", {}).get("prev")
+    e.get("source.asn") or e.get("asn")
+    e.get("ith.scenario")
+    e.get("event.category", "authentication")
+    e.get("event.outcome", "unknown")
+    # ingestor/main.py: user id + compute_risk
+    (e.get("user") or {}).get("id") or (e.get("user") or {}).get("name")
+    e.get("@timestamp")
+    event = e.get("event", {})
+    src = e.get("source", {}) or e.get("src", {})
+    if event.get("action") == "login":
+        (src.get("geo") or {}).get("lat")
+        (src.get("geo") or {}).get("lon")
+        src.get("asn")
+        src.get("ip")
+        event.get("mfa", False)
+        event.get("outcome")
+    event.get("action") == "role_change" and event.get("new_role")
+    # digital-twin: build_profiles / enrich_recent, update + score
+    for _ in range(2):
+        e.get("user", {}).get("id")
+        e.get("src", {}).get("geo", {}).get("lat")
+        e.get("src", {}).get("geo", {}).get("lon")
+        e.get("src", {}).get("asn")
+        e.get("user_agent", {}).get("family")
+        bool(e.get("event", {}).get("mfa", False))
+    e.get("src", {}).get("geo", {}).get("country")
+    e.get("@timestamp")
+    e.get("event", {}).get("outcome")
+    return user_name, act, typ
+
+
+def normalized_stages(e):
+    """The same consumers reading one Event."""
+    n = normalize(e)
+    for k in ("rule_name", "rule.name", "raw.rule.name", "detection", "ui_rule", "ith.rule"):
+        e.get(k)
+    n.rule_name, n.scenario, n.event_action, n.event_type
+    user_name, act, typ = n.user_name, n.event_action, n.event_type
+    _RM.get("ITH - AI Enriched Login")
+    n.source_ip, n.destination_ip, n.geo_src, n.geo_prev, n.source_asn, n.scenario
+    n.get("event_category", "authentication"), n.get("event_outcome", "unknown")
+    n.user_key, n.timestamp
+    if n.event_action == "login":
+        n.source_lat, n.source_lon, n.source_asn, n.source_ip, n.mfa, n.event_outcome
+    n.event_action == "role_change" and n.event_new_role
+    for _ in range(2):
+        n.user_id, n.source_lat, n.source_lon, n.source_asn, n.user_agent_family, n.mfa
+    n.source_country, n.timestamp, n.event_outcome
+    return user_name, act, typ
+
+
+def bench(fn, ev, n, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.process_time()
+        for _ in range(n):
+            fn(ev)
+        best = min(best, time.process_time() - t0)
+    return best / n * 1e6
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=100_000, help="events per layout per repeat (best of 5)")
+    args = ap.parse_args()
+    print(f"{'layout':8} {'chained .get':>14} {'normalize()':>12} {'Event only':>12}   (CPU us/event)")
+    for name, ev in LAYOUTS.items():
+        old, new = bench(legacy_stages, ev, args.n), bench(normalized_stages, ev, args.n)
+        print(f"{name:8} {old:14.2f} {new:12.2f} {bench(normalize, ev, args.n):12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+/build_profiles transfer size, Python CPU and agreement: "replay" (every
+event's _source pulled and folded in one by one) versus "agg" (one
+composite-aggregation bucket per user merged into the profile).
+
+Elastic is simulated: the per-user buckets are computed locally in the
+shape the composite aggregation returns, and that work is not counted,
+because in agg mode it runs inside Elastic.
+
+    python scripts/bench_profile_build.py
+    python scripts/bench_profile_build.py --users 2000 --events 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "digital-twin"))
+
+import main as twin  # noqa: E402
+from normalize import normalize  # noqa: E402
+
+COUNTRIES = ["US", "DE", "IN", "BR", "GB", "FR", "JP", "CA"]
+UAS = ["Chrome", "Firefox", "Safari", "Edge", "okhttp"]
+
+
+def make_events(users, per_user, rnd):
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    out = []
+    for u in range(users):
+        home = rnd.choice(COUNTRIES)
+        lat, lon = rnd.uniform(-50, 60), rnd.uniform(-120, 140)
+        for i in range(per_user):
+            roam = rnd.random() < 0.1
+            out.append({
+                "@timestamp": (t0 + timedelta(minutes=rnd.randint(0, 1440 * 7))).isoformat().replace("+00:00", "Z"),
+                "user": {"id": f"u{u}", "name": f"user{u}"},
+                "event": {"action": "login", "outcome": "failure" if rnd.random() < 0.08 else "success",
+                          "mfa": rnd.random() < 0.7, "risk_score": 0.0, "explanation": "none"},
+                "src": {"ip": f"10.{u % 250}.{i % 250}.7", "asn": 64500 + (rnd.randint(0, 9) if roam else u % 3),
+                        "geo": {"lat": lat + rnd.uniform(-1, 1), "lon": lon + rnd.uniform(-1, 1),
+                                "country": rnd.choice(COUNTRIES) if roam else home}},
+                "user_agent": {"family": rnd.choice(UAS) if roam else UAS[u % 2]},
+            })
+    out.sort(key=lambda e: e["@timestamp"])
+    return out
+
+
+def simulated_buckets(events):
+    """What the composite aggregation returns per user (computed 'in Elastic')."""
+    acc = {}
+    for e in events:
+        n = normalize(e)
+        a = acc.setdefault(n.user_id, {"n": 0, "country": {}, "asn": {}, "ua": {}, "hour": {}, "weekday": {},
+                                       "lat": [], "lon": [], "mfa": 0, "fail": 0})
+        a["n"] += 1
+        for k, v in (("country", n.source_country), ("asn", n.source_asn), ("ua", n.user_agent_family)):
+            if v is not None:
+                a[k][str(v)] = a[k].get(str(v), 0) + 1
+        dt = datetime.fromisoformat(n.timestamp.replace("Z", ""))
+        a["hour"][dt.hour] = a["hour"].get(dt.hour, 0) + 1
+        a["weekday"][dt.weekday()] = a["weekday"].get(dt.weekday(), 0) + 1
+        if n.source_lat is not None:
+            a["lat"].append(n.source_lat)
+            a["lon"].append(n.source_lon)
+        a["mfa"] += n.mfa
+        a["fail"] += n.event_outcome == "failure"
+
+    def terms(d):
+        return {"buckets": [{"key": k, "doc_count": c} for k, c in sorted(d.items(), key=lambda kv: -kv[1])]}
+
+    return [{
+        "key": {"uid": uid}, "doc_count": a["n"],
+        "country": terms(a["country"]), "asn": terms(a["asn"]), "ua": terms(a["ua"]),
+        "hour": terms(a["hour"]), "weekday": terms(a["weekday"]),
+        "geo_n": {"value": len(a["lat"])},
+        "lat": {"value": sum(a["lat"]) / len(a["lat"]) if a["lat"] else None},
+        "lon": {"value": sum(a["lon"]) / len(a["lon"]) if a["lon"] else None},
+        "mfa": {"value": a["mfa"] / a["n"]}, "fail": {"value": a["fail"] / a["n"]},
+    } for uid, a in acc.items()]
+
+
+def top(d):
+    return max(d, key=d.get) if d else None
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--events", type=int, default=100, help="events per user")
+    args = ap.parse_args()
+    rnd = random.Random(3)
+    events = make_events(args.users, args.events, rnd)
+    hits = {"hits": {"hits": [{"_index": "ith-events", "_id": str(i), "_source": e} for i, e in enumerate(events)]}}
+    replay_bytes = len(json.dumps(hits))
+
+    t0 = time.process_time()
+    decoded = json.loads(json.dumps(hits))  # client-side decode of the search response
+    replay = {}
+    for h in decoded["hits"]["hits"]:
+        n = normalize(h["_source"])
+        replay[n.user_id] = twin.update_profile_from_event(replay.get(n.user_id) or twin.fresh_profile(n.user_id), n)
+    replay_cpu = time.process_time() - t0
+
+    buckets = simulated_buckets(events)
+    resp = {"aggregations": {"users": {"buckets": buckets, "after_key": None}}}
+    agg_bytes = len(json.dumps(resp))
+    t0 = time.process_time()
+    decoded = json.loads(json.dumps(resp))
+    agg = {}
+    for b in decoded["aggregations"]["users"]["buckets"]:
+        s = twin.summary_from_bucket(b)
+        agg[s["user_id"]] = twin.merge_summary(twin.fresh_profile(s["user_id"]), s)
+    agg_cpu = time.process_time() - t0
+
+    print(f"{len(events):,} events, {args.users:,} users")
+    print(f"{'mode':8} {'transfer':>12} {'python CPU':>12}")
+    print(f"{'replay':8} {replay_bytes / 1e6:10.2f}MB {replay_cpu * 1000:10.0f}ms")
+    print(f"{'agg':8} {agg_bytes / 1e6:10.2f}MB {agg_cpu * 1000:10.0f}ms")
+    print(f"reduction: transfer {replay_bytes / agg_bytes:.0f}x, CPU {replay_cpu / max(agg_cpu, 1e-9):.0f}x")
+
+    same_hist = sum(replay[u]["time"] == agg[u]["time"] for u in replay)
+    same_top = sum(top(replay[u]["geo"]["country_counts"]) == top(agg[u]["geo"]["country_counts"]) and
+                   top(replay[u]["network"]["asn_counts"]) == top(agg[u]["network"]["asn_counts"]) and
+                   top(replay[u]["device"]["ua_family_counts"]) == top(agg[u]["device"]["ua_family_counts"])
+                   for u in replay)
+    km = [twin.haversine_km(replay[u]["geo"]["centroid"]["lat"], replay[u]["geo"]["centroid"]["lon"],
+                            agg[u]["geo"]["centroid"]["lat"], agg[u]["geo"]["centroid"]["lon"]) for u in replay]
+    mfa = [abs(replay[u]["auth"]["mfa_ratio"] - agg[u]["auth"]["mfa_ratio"]) for u in replay]
+    print(f"agreement: histograms identical {same_hist}/{len(replay)}, top country/asn/ua {same_top}/{len(replay)}, "
+          f"centroid diff median {sorted(km)[len(km) // 2]:.1f} km, mfa_ratio diff median "
+          f"{sorted(mfa)[len(mfa) // 2]:.3f}")
+    score_diff = []
+    for e in events[-500:]:
+        n = normalize(e)
+        score_diff.append(abs(twin.score_against_profile(n, replay[n.user_id]) -
+                              twin.score_against_profile(n, agg[n.user_id])))
+    print(f"profile_dev diff on 500 events: mean {sum(score_diff) / len(score_diff):.3f}, "
+          f"max {max(score_diff):.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Profile snapshot (services/digital-twin/snapshot.py) versus NDJSON dumps of
+the same profiles: file size, time to make profiles available, point lookups,
+a delta on top of the base, and forked workers sharing one mapping.
+
+    python scripts/bench_profile_snapshot.py
+    python scripts/bench_profile_snapshot.py --profiles 1000000
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "digital-twin"))
+
+import snapshot  # noqa: E402
+
+COUNTRIES = ["US", "DE", "IN", "BR", "GB", "FR", "JP", "CA", "NL", "SG"]
+UAS = ["Chrome", "Firefox", "Safari", "Edge", "okhttp"]
+
+
+def make_profile(i: int, rnd: random.Random):
+    def counts(keys, k):
+        picked = rnd.sample(keys, k)
+        w = [rnd.random() for _ in picked]
+        return {str(x): v / sum(w) for x, v in zip(picked, w)}
+    return {
+        "user_id": f"user-{i:08d}", "profile_version": 1,
+        "updated_at": "2025-01-01T00:00:00+00:00",
+        "geo": {"centroid": {"lat": rnd.uniform(-50, 60), "lon": rnd.uniform(-120, 140)},
+                "radius_km_p95": 50.0, "country_counts": counts(COUNTRIES, rnd.randint(1, 3))},
+        "network": {"asn_counts": counts(list(range(64500, 64600)), rnd.randint(1, 5)), "asn_churn_rate": 0.0},
+        "device": {"ua_family_counts": counts(UAS, rnd.randint(1, 2)), "os_family_counts": {},
+                   "fp_hash_counts": {}},
+        "time": {"hour_hist_24": [rnd.randint(1, 40) for _ in range(24)],
+                 "weekday_hist_7": [rnd.randint(1, 60) for _ in range(7)]},
+        "auth": {"mfa_ratio": rnd.random(), "fail_ratio": rnd.random() / 10},
+    }
+
+
+def _worker(path, ids, q):
+    t0 = time.perf_counter()
+    s = snapshot.ProfileSnapshot(path)
+    for uid in ids:
+        s.get(uid)
+    q.put(time.perf_counter() - t0)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--profiles", type=int, default=200_000)
+    ap.add_argument("--lookups", type=int, default=50_000)
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+    rnd = random.Random(5)
+    tmp = tempfile.mkdtemp(prefix="ith-snap-")
+    base, delta, ndjson = (os.path.join(tmp, n) for n in ("base.prf", "delta.prf", "profiles.ndjson"))
+
+    profiles = [make_profile(i, rnd) for i in range(args.profiles)]
+    with open(ndjson, "w") as f:
+        for p in profiles:
+            f.write(json.dumps(p) + "\n")
+    t0 = time.perf_counter()
+    snapshot.write_snapshot(base, profiles, {"kind": "full"})
+    t_write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with open(ndjson) as f:
+        loaded = {p["user_id"]: p for p in map(json.loads, f)}
+    t_json = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    snap = snapshot.ProfileSnapshot(base)
+    t_open = time.perf_counter() - t0
+
+    ids = [f"user-{rnd.randrange(args.profiles):08d}" for _ in range(args.lookups)]
+    t0 = time.perf_counter()
+    for uid in ids:
+        snap.get(uid)
+    t_get = (time.perf_counter() - t0) / len(ids)
+    assert snap.get(ids[0])["time"] == loaded[ids[0]]["time"]
+
+    changed = [dict(profiles[i], updated_at="2025-01-02T00:00:00+00:00", auth={"mfa_ratio": 1.0, "fail_ratio": 0.0})
+               for i in rnd.sample(range(args.profiles), max(1, args.profiles // 100))]
+    t0 = time.perf_counter()
+    snapshot.write_snapshot(delta, changed, {"kind": "delta"})
+    t_delta = time.perf_counter() - t0
+    chain = snapshot.SnapshotChain([base, delta])
+    assert chain.get(changed[0]["user_id"])["auth"]["mfa_ratio"] == 1.0
+    t0 = time.perf_counter()
+    for uid in ids:
+        chain.get(uid)
+    t_chain = (time.perf_counter() - t0) / len(ids)
+
+    ctx = mp.get_context("fork")
+    q = ctx.Queue()
+    t0 = time.perf_counter()
+    procs = [ctx.Process(target=_worker, args=(base, ids, q)) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    per = [q.get() for _ in procs]
+    for p in procs:
+        p.join()
+    t_fork = time.perf_counter() - t0
+
+    mb = 1 << 20
+    print(f"{args.profiles:,} profiles")
+    print(f"  size         ndjson {os.path.getsize(ndjson) / mb:7.1f} MB   snapshot {os.path.getsize(base) / mb:7.1f} MB")
+    print(f"  available    json.loads all {t_json * 1000:8.0f} ms   snapshot open {t_open * 1000:8.2f} ms")
+    print(f"  write        full {t_write:5.2f} s   delta ({len(changed):,} changed) {t_delta * 1000:6.0f} ms "
+          f"{os.path.getsize(delta) / mb:5.2f} MB")
+    print(f"  get()        base {t_get * 1e6:6.1f} us   base+delta chain {t_chain * 1e6:6.1f} us")
+    print(f"  {args.workers} forked workers x {len(ids):,} gets on one mapping: {t_fork:.2f} s wall "
+          f"(slowest worker {max(per):.2f} s incl. open)")
+    chain.close()
+    snap.close()
+    for n in (base, delta, ndjson):
+        os.unlink(n)
+    os.rmdir(tmp)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Prompt size and build cost: the raw-event prompts both ingestors used to
+send (app: full event JSON; root: event JSON cut at 4000 chars) versus
+app.utils.prompt.build_prompt, against a stub model that only records what
+it is sent. Also checks that key order does not change the prompt bytes
+(prefix caching).
+
+    python scripts/bench_prompt.py
+    python scripts/bench_prompt.py --max-tokens 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "ingestor"))
+
+from app.utils.prompt import (  # noqa: E402
+    SUMMARY_INSTRUCTIONS, TRIAGE_INSTRUCTIONS, build_prompt, estimate_tokens,
+)
+
+RULE = "ITH - Impossible Travel"
+
+
+class StubModel:
+    """Records prompts instead of calling Vertex."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        return '{"summary":"stub","confidence":0.5,"scenario":"stub"}'
+
+
+def make_event(raw_fields: int, rnd: random.Random):
+    return {
+        "@timestamp": "2025-01-01T12:00:00Z",
+        "user": {"name": "alice", "id": "u-1842"},
+        "event": {"action": "login", "type": "start", "outcome": "failure", "category": "authentication",
+                  "mfa": False, "risk_score": 0.7, "explanation": "impossible_travel;asn_change"},
+        "source": {"ip": "203.0.113.9", "asn": 64500, "geo": {"lat": 40.7128, "lon": -74.006, "country": "US"},
+                   "reputation": {"ip": ["tor_exit"], "asn": []}},
+        "user_agent": {"family": "Chrome", "original": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/126.0"},
+        "raw_event": {f"attr_{i}": {"value": "x" * rnd.randint(8, 64), "seq": i, "tags": ["idp", "okta"]}
+                      for i in range(raw_fields)},
+    }
+
+
+def old_triage(e):
+    return (
+        "You are a cybersecurity analyst. Produce STRICT JSON only (no code fences) with keys: "
+        "title, description, severity, confidence, category, findings (array of {title,detail,indicator}), "
+        "recommended_actions (array). "
+        f"rule_name: {RULE}\n"
+        f"event_json: {json.dumps(e)}"
+    )
+
+
+def old_summary(e):
+    event_copy = {k: v for k, v in e.items() if k != "@timestamp"}
+    return (
+        "You are a SOC analyst. Summarize the risk in one short sentence and name a scenario. "
+        "Return JSON with keys: summary (string), confidence (0-1), scenario (string). "
+        f"Event: {json.dumps(event_copy, default=str)[:4000]}"
+    )
+
+
+def shuffled(obj, rnd):
+    if isinstance(obj, dict):
+        items = list(obj.items())
+        rnd.shuffle(items)
+        return {k: shuffled(v, rnd) for k, v in items}
+    return obj
+
+
+def build_us(fn, n=2000):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--max-tokens", type=int, default=None, help="budget (default PROMPT_MAX_TOKENS)")
+    args = ap.parse_args()
+    rnd = random.Random(7)
+    print(f"{'event':>8} {'prompt':<8} {'old tok':>8} {'new tok':>8} {'saved':>7} {'old us':>8} {'new us':>8}")
+    for raw_fields in (0, 4, 40, 400):
+        ev = make_event(raw_fields, rnd)
+        label = f"{len(json.dumps(ev)) / 1024:.1f}KB"
+        cases = (
+            ("triage", lambda: old_triage(ev),
+             lambda: build_prompt(TRIAGE_INSTRUCTIONS, ev, args.max_tokens, rule_name=RULE)),
+            ("summary", lambda: old_summary(ev),
+             lambda: build_prompt(SUMMARY_INSTRUCTIONS, ev, args.max_tokens)),
+        )
+        for name, old, new in cases:
+            old_model, new_model = StubModel(), StubModel()
+            old_model.generate_content(old())
+            new_model.generate_content(new())
+            t_old, t_new = estimate_tokens(old_model.prompts[0]), estimate_tokens(new_model.prompts[0])
+            print(f"{label:>8} {name:<8} {t_old:8d} {t_new:8d} {1 - t_new / t_old:6.0%} "
+                  f"{build_us(old):8.1f} {build_us(new):8.1f}")
+        stable = {build_prompt(TRIAGE_INSTRUCTIONS, shuffled(ev, rnd), args.max_tokens, rule_name=RULE)
+                  for _ in range(20)}
+        if len(stable) != 1:
+            print(f"{label:>8} UNSTABLE: {len(stable)} distinct prompts for reordered keys")
+            return 1
+    print("\nsample (triage):\n" + build_prompt(TRIAGE_INSTRUCTIONS, make_event(4, rnd), args.max_tokens,
+                                               rule_name=RULE))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
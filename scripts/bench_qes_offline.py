@@ -0,0 +1,95 @@
+"""
+Quantum Guardian QES throughput: the HTTP path (POST /score-batch through
+the ASGI app, Elastic unset so nothing is indexed) versus offline file
+scoring (addons/quantum-guardian/app/qes.py) with 1..N worker processes.
+Also checks that both paths produce the same QES for every record.
+
+    python scripts/bench_qes_offline.py
+    python scripts/bench_qes_offline.py --records 1000000 --workers 1,4,8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "addons", "quantum-guardian", "app"))
+for k in ("ELASTIC_CLOUD_URL", "ELASTIC_API_KEY"):
+    os.environ.pop(k, None)
+
+import qes  # noqa: E402
+
+ALGS = [("RS256", 2048, None), ("RS256", 1024, None), ("PS256", 3072, None), ("ES256", None, "P-256"),
+        ("HS256", None, None)]
+SCOPES = ["admin", "write:all", "read:reports", "view:dash", "openid", "privileged:ops"]
+
+
+def make_record(i, rnd, now):
+    alg, bits, curve = rnd.choice(ALGS)
+    issued = now - timedelta(hours=rnd.randint(0, 240))
+    return {
+        "identity": {"user": f"user{i}@example.com", "issuer": "okta", "session_id": f"s{i}"},
+        "token": {"alg": alg, "key_bits": bits, "curve": curve, "issued_at": issued.isoformat(),
+                  "expires_at": (issued + timedelta(hours=rnd.choice([1, 12, 24, 720]))).isoformat(),
+                  "rotation_days": rnd.choice([1, 7, 30, 90, None]), "device_bound": rnd.random() < 0.3,
+                  "scopes": rnd.sample(SCOPES, rnd.randint(0, 3))},
+        "policy": {"issuer_policy_gap": round(rnd.uniform(0, 2), 2)},
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--records", type=int, default=200_000)
+    ap.add_argument("--http-records", type=int, default=20_000, help="records sent through /score-batch")
+    ap.add_argument("--batch", type=int, default=500, help="items per /score-batch request")
+    ap.add_argument("--workers", default=f"1,{os.cpu_count() or 1}")
+    args = ap.parse_args()
+    rnd = random.Random(11)
+    now = datetime.now(timezone.utc)
+    records = [make_record(i, rnd, now) for i in range(args.records)]
+    tmp = tempfile.mkdtemp(prefix="ith-qes-")
+    src = os.path.join(tmp, "tokens.ndjson")
+    with open(src, "w") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+    print(f"{args.records:,} records, {os.path.getsize(src) / 1e6:.1f} MB NDJSON, {os.cpu_count()} CPUs")
+
+    from fastapi.testclient import TestClient
+    import main as svc
+    client = TestClient(svc.app)
+    http = records[:args.http_records]
+    http_scores = []
+    t0 = time.perf_counter()
+    for i in range(0, len(http), args.batch):
+        resp = client.post("/score-batch", json={"items": http[i:i + args.batch]})
+        http_scores.extend(r["doc"]["qes"]["score"] for r in resp.json())
+    t_http = time.perf_counter() - t0
+    print(f"  {'http /score-batch':<22} {len(http) / t_http:10,.0f} records/s")
+
+    out = os.path.join(tmp, "out")
+    for w in sorted({int(x) for x in args.workers.split(",")}):
+        ns = argparse.Namespace(inputs=[src], out=out, gzip=False, bulk=False, index=None, workers=w,
+                                chunk=5000, rejects=None, progress=0)
+        res = qes.score_files(ns)
+        print(f"  {f'offline, {w} worker(s)':<22} {res['records_per_s']:10,.0f} records/s  "
+              f"({res['scored']:,} scored in {res['seconds']:.2f} s)")
+
+    scored = os.path.join(out, "tokens.scored.ndjson")
+    with open(scored) as f:
+        offline_scores = [json.loads(next(f))["qes"]["score"] for _ in range(len(http_scores))]
+    # event time differs by the seconds between the two runs; allow the age factor to move
+    diff = max(abs(a - b) for a, b in zip(http_scores, offline_scores))
+    print(f"  max |qes.score| difference http vs offline over {len(http_scores):,} records: {diff:.2f}")
+    os.unlink(scored)
+    os.rmdir(out)
+    os.unlink(src)
+    os.rmdir(tmp)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
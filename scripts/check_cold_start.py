@@ -0,0 +1,100 @@
+"""
+Cold-start import budget check for the Python services.
+
+Imports each service's entry module under ``python -X importtime`` and fails
+when the cumulative import time exceeds its budget in cold_start_budget.json.
+Budgets are multiples (``budget_x``) of ``import fastapi`` timed the same way
+on the same machine, which every service pays anyway; a fixed number of
+milliseconds would pass or fail with the speed of the CI runner. Heavy SDKs
+(elasticsearch, vertexai, requests) must be imported lazily and warmed after
+the port is bound, so they should never show up here.
+
+    python scripts/check_cold_start.py             # all services
+    python scripts/check_cold_start.py ingestor    # one service
+    python scripts/check_cold_start.py --runs 5 --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cold_start_budget.json")
+BASELINE = "fastapi"
+
+
+def import_profile(cwd: str, module: str) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """
+    (total_ms, [(module, cumulative_ms)] for imports made directly by the
+    entry module and site, [every module imported]) for one cold interpreter.
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=cwd, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed in {cwd}:\n{proc.stderr[-2000:]}")
+    total, direct, seen = 0.0, [], []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        ms = int(cumulative) / 1000.0
+        seen.append(name.strip())
+        if depth == 0:
+            total += ms
+        elif depth == 1:
+            direct.append((name.strip(), ms))
+    return total, direct, seen
+
+
+def fastest(cwd: str, module: str, runs: int) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """import_profile() of the fastest of ``runs`` cold interpreters."""
+    best = None
+    for _ in range(max(1, runs)):
+        run = import_profile(cwd, module)
+        if best is None or run[0] < best[0]:
+            best = run
+    return best
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("services", nargs="*", help="subset of services from the budget file")
+    ap.add_argument("--runs", type=int, default=3, help="runs per service; the fastest is compared")
+    ap.add_argument("--top", type=int, default=8, help="heaviest top-level imports to print")
+    args = ap.parse_args()
+
+    with open(BUDGETS) as f:
+        budgets: Dict[str, Dict] = json.load(f)
+    base = fastest(ROOT, BASELINE, args.runs)[0]
+    print(f"     {'import ' + BASELINE:<18} {base:8.1f} ms  (baseline)")
+    failed = []
+    for name, spec in budgets.items():
+        if args.services and name not in args.services:
+            continue
+        total, top, seen = fastest(os.path.join(ROOT, spec["cwd"]), spec["module"], args.runs)
+        budget = spec["budget_x"] * base
+        ok = total <= budget
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<18} {total:8.1f} ms  "
+              f"({total / base:.2f}x baseline, budget {spec['budget_x']:g}x = {budget:.0f} ms)")
+        for mod, ms in sorted(top, key=lambda t: -t[1])[:args.top]:
+            print(f"       {ms:8.1f} ms  {mod}")
+        for banned in spec.get("forbid", []):
+            if any(mod == banned or mod.startswith(banned + ".") for mod in seen):
+                print(f"       forbidden eager import: {banned}")
+                ok = False
+        if not ok:
+            failed.append(name)
+    if failed:
+        print(f"cold-start budget exceeded: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
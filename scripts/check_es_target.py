@@ -0,0 +1,259 @@
+"""
+Write-target check (services/ingestor/app/utils/es_target.py) against a
+stand-in Elastic endpoint started in-process on localhost. The stand-in
+implements just enough of index templates, data streams, write aliases,
+``_rollover`` with max_docs and ``_bulk`` create/index semantics.
+
+For each ES_WRITE_MODE it bootstraps twice (idempotent) and streams batches
+through the ingestor's bulk writer (BulkHTTP, op=create) to the one name,
+with conditional rollovers in between. It then checks that every document
+landed exactly once, spread over several backing indices, and that a
+second bootstrap changed nothing, and that the template leaves
+``<name>-enriched`` (the digital twin's copy-mode index, written with
+``index``) a plain index. It also shows why writers use create: a data
+stream rejects plain ``index`` items.
+
+    python scripts/check_es_target.py
+    python scripts/check_es_target.py --docs 50000 --max-docs 4000
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "ingestor"))
+
+from app.utils.es_bulk import BulkHTTP  # noqa: E402
+from app.utils.es_target import WriteTarget  # noqa: E402
+
+
+class StandIn:
+    """In-memory cluster state: indices (doc counts), aliases, data streams, templates."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.templates = {}
+        self.indices = {}      # name -> list of docs
+        self.aliases = {}      # alias -> [indices], write index last
+        self.streams = {}      # data stream -> [backing indices], write index last
+        self.auto_created = []
+        self.gzipped = 0
+
+    def _template_for(self, name):
+        best = None
+        for t in self.templates.values():
+            if any(re.fullmatch(p.replace("*", ".*"), name) for p in t["index_patterns"]):
+                if best is None or t.get("priority", 0) > best.get("priority", 0):
+                    best = t
+        return best
+
+    def resolve(self, name, op):
+        """(concrete write index, error) for a write to ``name``."""
+        if name in self.streams:
+            if op != "create":
+                return None, (400, "illegal_argument_exception: only write ops with an op_type of create are "
+                                   "allowed in data streams")
+            return self.streams[name][-1], None
+        if name in self.aliases:
+            return self.aliases[name][-1], None
+        if name not in self.indices:
+            t = self._template_for(name)
+            if t is not None and "data_stream" in t:
+                self.create_stream(name)
+                return self.resolve(name, op)
+            self.indices[name] = []
+            self.auto_created.append(name)
+        return name, None
+
+    def create_stream(self, name):
+        backing = f".ds-{name}-000001"
+        self.indices[backing] = []
+        self.streams[name] = [backing]
+
+    def rollover(self, name, conditions):
+        chain = self.streams.get(name) or self.aliases.get(name)
+        if chain is None:
+            return 404, {"error": "index_not_found_exception"}
+        old = chain[-1]
+        met = len(self.indices[old]) >= conditions.get("max_docs", float("inf"))
+        new = re.sub(r"\d{6}$", lambda m: f"{int(m.group()) + 1:06d}", old)
+        if met:
+            self.indices[new] = []
+            chain.append(new)
+        return 200, {"acknowledged": met, "rolled_over": met, "old_index": old, "new_index": new,
+                     "conditions": {f"[{k}: {v}]": met for k, v in conditions.items()}}
+
+    def count(self, name):
+        chain = self.streams.get(name) or self.aliases.get(name) or [name]
+        return sum(len(self.indices.get(i, [])) for i in chain), chain
+
+
+def make_handler(es: StandIn):
+    class H(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def _body(self):
+            n = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(n) if n else b""
+            if self.headers.get("Content-Encoding") == "gzip":  # BulkHTTP gzips large bodies
+                es.gzipped += 1
+                body = gzip.decompress(body)
+            return body
+
+        def _send(self, status, obj):
+            data = json.dumps(obj).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("X-Elastic-Product", "Elasticsearch")  # elasticsearch-py checks this
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_PUT(self):
+            path = urlsplit(self.path).path
+            if path == "/_bulk" or path.endswith("/_doc"):  # elasticsearch-py sends these as PUT too
+                return self.do_POST()
+            body = self._body()
+            with es.lock:
+                m = re.fullmatch(r"/_index_template/([^/]+)", path)
+                if m:
+                    es.templates[m.group(1)] = json.loads(body)
+                    return self._send(200, {"acknowledged": True})
+                m = re.fullmatch(r"/_data_stream/([^/]+)", path)
+                if m:
+                    name = m.group(1)
+                    if name in es.streams or name in es.indices:
+                        return self._send(400, {"error": {"type": "resource_already_exists_exception"}})
+                    t = es._template_for(name)
+                    if t is None or "data_stream" not in t:
+                        return self._send(400, {"error": {"type": "illegal_argument_exception",
+                                                          "reason": "no matching index template with data stream"}})
+                    es.create_stream(name)
+                    return self._send(200, {"acknowledged": True})
+                name = path.strip("/")
+                if name in es.indices:
+                    return self._send(400, {"error": {"type": "resource_already_exists_exception"}})
+                es.indices[name] = []
+                for alias, spec in (json.loads(body or b"{}").get("aliases") or {}).items():
+                    if alias in es.indices:
+                        return self._send(400, {"error": {"type": "invalid_alias_name_exception"}})
+                    es.aliases.setdefault(alias, []).append(name)
+                return self._send(200, {"acknowledged": True, "index": name})
+
+        def do_GET(self):
+            path = urlsplit(self.path).path
+            with es.lock:
+                m = re.fullmatch(r"/_alias/([^/]+)", path)
+                if m:
+                    chain = es.aliases.get(m.group(1))
+                    if not chain:
+                        return self._send(404, {"error": "alias missing", "status": 404})
+                    return self._send(200, {i: {"aliases": {m.group(1): {"is_write_index": i == chain[-1]}}}
+                                            for i in chain})
+                m = re.fullmatch(r"/([^/]+)/_count", path)
+                if m:
+                    return self._send(200, {"count": es.count(m.group(1))[0]})
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            u = urlsplit(self.path)
+            body = self._body()
+            with es.lock:
+                m = re.fullmatch(r"/([^/]+)/_rollover", u.path)
+                if m:
+                    return self._send(*es.rollover(m.group(1), (json.loads(body or b"{}")).get("conditions", {})))
+                if u.path == "/_bulk":
+                    lines = body.split(b"\n")
+                    items, errors = [], False
+                    for i in range(0, len(lines) - 1, 2):
+                        action = json.loads(lines[i])
+                        (op, meta), = action.items()
+                        target, err = es.resolve(meta["_index"], op)
+                        if err:
+                            errors = True
+                            items.append({op: {"_index": meta["_index"], "status": err[0], "error": err[1]}})
+                            continue
+                        es.indices[target].append(lines[i + 1])
+                        items.append({op: {"_index": target, "status": 201, "result": "created"}})
+                    return self._send(200, {"errors": errors, "items": items})
+                m = re.fullmatch(r"/([^/]+)/_doc", u.path)
+                if m:
+                    op = "create" if "op_type=create" in (u.query or "") or m.group(1) in es.streams else "index"
+                    target, err = es.resolve(m.group(1), op)
+                    if err:
+                        return self._send(err[0], {"error": err[1]})
+                    es.indices[target].append(body)
+                    return self._send(201, {"_index": target, "result": "created"})
+            self._send(404, {"error": "not found"})
+
+    return H
+
+
+def run_mode(url, es, mode, args):
+    name = f"ith-events-{mode}"
+    t = WriteTarget(url, "id:secret", name, mode=mode, max_docs=str(args.max_docs), check_s=3600)
+    first = t.bootstrap()
+    with es.lock:
+        before = (dict(es.streams), {k: list(v) for k, v in es.aliases.items()}, set(es.indices))
+    again = t.bootstrap()
+    with es.lock:
+        unchanged = before == (dict(es.streams), {k: list(v) for k, v in es.aliases.items()}, set(es.indices))
+    writer = BulkHTTP(url, "id:secret", op=t.op)
+    sent = ok = 0
+    for b in range(0, args.docs, args.batch):
+        items = [(name, {"@timestamp": "2025-09-01T00:00:00Z", "n": i}) for i in range(b, min(b + args.batch, args.docs))]
+        statuses = writer.ship(items)
+        sent += len(items)
+        ok += sum(1 for s in statuses if s < 300)
+        if (b // args.batch) % args.check_every == 0:
+            t.rollover()
+    writer.close()
+    twin = BulkHTTP(url, "id:secret", op="index")
+    enriched = twin.ship([(f"{name}-enriched", {"@timestamp": "2025-09-01T00:00:00Z", "n": 0})])[0]
+    twin.close()
+    with es.lock:
+        total, chain = es.count(name)
+        auto = [i for i in es.auto_created if i.startswith(name) and i != f"{name}-enriched"]
+        plain = f"{name}-enriched" in es.indices and f"{name}-enriched" not in es.streams
+    good = (ok == sent == total == args.docs and unchanged and (mode == "index" or len(chain) > 1)
+            and enriched < 300 and plain)
+    print(f"  {mode:<10} bootstrap {first}; again {again.get('data_stream', again.get('alias', '-'))}, "
+          f"unchanged {unchanged}")
+    print(f"  {'':<10} {ok:,}/{sent:,} created, {total:,} stored across {len(chain)} backing indices "
+          f"({t.rollovers} rollovers){'; auto-created ' + ','.join(auto) if auto else ''}; "
+          f"{name}-enriched upsert {enriched}, plain index {plain}: {'OK' if good else 'FAIL'}")
+    return good
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=20_000)
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--max-docs", type=int, default=3_000, help="rollover condition")
+    ap.add_argument("--check-every", type=int, default=4, help="batches between rollover checks")
+    args = ap.parse_args()
+    es = StandIn()
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(es))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{srv.server_address[1]}"
+    print(f"stand-in Elastic at {url}; {args.docs:,} docs per mode, rollover at {args.max_docs:,} docs")
+    ok = all([run_mode(url, es, mode, args) for mode in ("datastream", "alias", "index")])
+
+    w = BulkHTTP(url, "id:secret", op="index")
+    st = w.ship([("ith-events-datastream", {"@timestamp": "2025-09-01T00:00:00Z"})])
+    w.close()
+    print(f"  op=index into the data stream -> {st[0]} (why writers use create)")
+    print(f"  {es.gzipped:,} requests arrived gzipped")
+    srv.shutdown()
+    return 0 if ok and st[0] == 400 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Runs the digital twin's profile aggregation (services/digital-twin/main.py,
+PROFILE_BUILD_MODE=agg) against a real Elastic cluster. It uses a scratch
+index that holds every layout the ingest paths write:
+
+    nested       source.geo.country / source.asn / user_agent.family / event.outcome
+    legacy       src.geo.country (keyword via ith-template) / src.asn
+    top level    asn only, with no geo, user agent or outcome
+    strings      asn and mfa sent as strings (dynamically mapped text + .keyword)
+
+Text fields cannot be read through ``doc[...]``, so a runtime script that
+touches one fails the whole composite aggregation. The check fails if the
+search errors, or if the per-user event counts, countries, ASNs, user agents
+and failure ratios differ from what the documents hold. The scratch index
+is named ``ith-events-aggcheck-<pid>`` so ith-template applies, and it is
+deleted at the end.
+
+    ELASTIC_CLOUD_URL=... ELASTIC_API_KEY=... python scripts/check_profile_agg.py
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "services", "digital-twin"))
+
+import main as twin  # noqa: E402
+
+
+def documents(now):
+    ts = lambda m: (now - timedelta(minutes=m)).isoformat().replace("+00:00", "Z")  # noqa: E731
+    return [
+        {"@timestamp": ts(1), "user": {"id": "nested"}, "source": {"geo": {"country": "DE", "lat": 52.5, "lon": 13.4},
+                                                                   "asn": 3320},
+         "user_agent": {"family": "Firefox"}, "event": {"outcome": "failure", "mfa": True}},
+        {"@timestamp": ts(2), "user": {"id": "nested"}, "source": {"geo": {"country": "DE"}, "asn": 3320},
+         "user_agent": {"family": "Firefox"}, "event": {"outcome": "success", "mfa": True}},
+        {"@timestamp": ts(3), "user": {"id": "legacy"}, "src": {"geo": {"country": "US", "lat": 40.7, "lon": -74.0}},
+         "asn": 7922},
+        {"@timestamp": ts(4), "user": {"id": "bare"}, "asn": 64500},
+        {"@timestamp": ts(5), "user": {"id": "strings"}, "source": {"asn": "16509"},
+         "event": {"mfa": "true", "outcome": "failure"}},
+    ]
+
+
+EXPECT = {
+    "nested": {"n": 2, "country": {"DE": 2}, "asn": {"3320": 2}, "ua": {"Firefox": 2}, "fail": 0.5},
+    "legacy": {"n": 1, "country": {"US": 1}, "asn": {"7922": 1}, "ua": {}, "fail": 0.0},
+    "bare": {"n": 1, "country": {}, "asn": {"64500": 1}, "ua": {}, "fail": 0.0},
+    "strings": {"n": 1, "country": {}, "asn": {"16509": 1}, "ua": {}, "fail": 1.0},
+}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--index", default=f"ith-events-aggcheck-{os.getpid()}")
+    ap.add_argument("--keep", action="store_true", help="leave the scratch index in place")
+    args = ap.parse_args()
+    if not twin.ES_URL or not twin.ES_API_KEY:
+        print("set ELASTIC_CLOUD_URL and ELASTIC_API_KEY; this check needs a real cluster")
+        return 2
+    es = twin.get_es()
+    for doc in documents(datetime.now(timezone.utc)):
+        es.index(index=args.index, document=doc)
+    es.indices.refresh(index=args.index)
+    ok = True
+    try:
+        usable = twin.aggregatable_fields(args.index)
+        res = es.search(index=args.index, body=twin.profile_agg_body(60, runtime=twin.agg_runtime(usable)))
+        got = {s["user_id"]: s for s in map(twin.summary_from_bucket, res["aggregations"]["users"]["buckets"])}
+        print(f"aggregatable candidates: {sorted(usable)}")
+        for uid, want in EXPECT.items():
+            s = got.get(uid)
+            same = s is not None and all(
+                (abs(s[k] - v) < 1e-9 if k == "fail" else s[k] == v) for k, v in want.items())
+            ok &= same
+            print(f"  {uid:<8} {'OK' if same else 'FAIL'}  {s and {k: s[k] for k in want}}")
+    except Exception as e:  # a script touching a text field fails the whole search
+        print(f"  aggregation failed: {e}")
+        ok = False
+    finally:
+        if not args.keep:
+            es.indices.delete(index=args.index, ignore_unavailable=True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Copies the shared helper modules from the ingestor into the other Python
+services. Every Cloud Run service builds from its own directory, so each one
+carries its own copy; the ingestor's ``app/utils`` holds the source.
+
+    python scripts/sync_vendored.py            # rewrite the copies
+    python scripts/sync_vendored.py --check    # exit 1 if any copy differs (CI)
+
+Copies are compared byte for byte, line endings included.
+"""
+import argparse
+import os
+import sys
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join("services", "ingestor", "app", "utils")
+
+# module -> directories holding a copy
+VENDORED: Dict[str, List[str]] = {
+    "codec.py": ["services/alert-webhook/app/utils", "services/digital-twin", "addons/quantum-guardian/app",
+                 "services/analyst-notes"],
+    "metrics.py": ["services/alert-webhook/app/utils", "services/digital-twin", "addons/quantum-guardian/app"],
+    "profiling.py": ["services/alert-webhook/app/utils", "services/digital-twin", "addons/quantum-guardian/app"],
+    "normalize.py": ["services/digital-twin"],
+}
+
+
+def read(path: str) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--check", action="store_true", help="report copies that differ instead of rewriting them")
+    args = ap.parse_args()
+    stale = []
+    for name, dirs in VENDORED.items():
+        src = read(os.path.join(ROOT, SOURCE, name))
+        for d in dirs:
+            dst = os.path.join(ROOT, d, name)
+            if read(dst) == src:
+                continue
+            stale.append(os.path.relpath(dst, ROOT))
+            if not args.check:
+                with open(dst, "wb") as f:
+                    f.write(src)
+    for path in stale:
+        print(f"{'differs' if args.check else 'updated'}: {path}")
+    if args.check and stale:
+        print(f"edit {SOURCE}/ and run python scripts/sync_vendored.py")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,14 @@
-import os, json, logging
+import os, logging
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import httpx
 
+from app.utils import metrics
+from app.utils.metrics import stage
+from app.utils.profiling import install_debug_routes
+from app.utils.severity import map_severity
+from app.utils import codec
+
 # Optional Slack integration
 SLACK_WEBHOOK_URL = os.environ.get("SLACK_WEBHOOK_URL", "")
 
@@ -11,12 +17,44 @@ logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("ith-alert")
 
 app = FastAPI(title="ITH Alert Webhook")
+app.add_middleware(metrics.MetricsMiddleware)
+install_debug_routes(app)
+
+ALERTS = metrics.counter("ith_alerts_received_total", "Alert payloads received", ["severity"])
+SLACK_SENT = metrics.counter("ith_slack_forwards_total", "Slack forwards by outcome", ["outcome"])
+
+# One pooled client for Slack: each forward is ~1.5 KB, a fresh TLS handshake
+# per alert costs more than the message. Slack incoming webhooks do not take
+# compressed request bodies; responses are gzip-negotiated by httpx.
+_slack = None
+
+def slack_client() -> httpx.AsyncClient:
+    global _slack
+    if _slack is None:
+        _slack = httpx.AsyncClient(timeout=10)
+    return _slack
+
+@app.on_event("shutdown")
+async def _close_slack():
+    if _slack is not None:
+        await _slack.aclose()
 
 @app.get("/healthz")
 def healthz():
     """Simple health check endpoint for Cloud Run."""
     return {"status": "ok"}
 
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def _severity(payload) -> str:
+    """Metric label for an alert; P3 for payloads map_severity cannot read (ECS array category, non-dict event)."""
+    try:
+        return map_severity(payload)
+    except Exception:
+        return "P3"
+
 @app.post("/alert")
 async def alert(req: Request):
     """
@@ -28,23 +66,28 @@ async def alert(req: Request):
     log.info("POST /alert raw body: %s", text)
 
     # Try parse JSON, fallback safely
-    if text.strip():
-        try:
-            payload = json.loads(text)
-        except Exception as e:
-            log.warning("Non-JSON or malformed body: %s", e)
-            payload = {"_raw": text}
-    else:
-        payload = {}
+    with stage("parse"):
+        if text.strip():
+            try:
+                payload = codec.loads(raw)
+            except Exception as e:
+                log.warning("Non-JSON or malformed body: %s", e)
+                payload = {"_raw": text}
+        else:
+            payload = {}
+    ALERTS.labels(_severity(payload)).inc()
 
     # Optional Slack forward (safe)
     if SLACK_WEBHOOK_URL:
-        msg = f"ITH Alert:\n```{json.dumps(payload)[:1500]}```"
+        msg = f"ITH Alert:\n```{codec.dumps_bounded(payload, 1500)}```"
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                await client.post(SLACK_WEBHOOK_URL, json={"text": msg})
+            with stage("slack"):
+                await slack_client().post(SLACK_WEBHOOK_URL, content=codec.dumps({"text": msg}),
+                                          headers={"Content-Type": "application/json"})
+            SLACK_SENT.labels("ok").inc()
         except Exception as e:
             log.warning("Slack send failed: %s", e)
+            SLACK_SENT.labels("error").inc()
 
     # Always return 200 OK
     return JSONResponse({"status": "ok"}, status_code=200)
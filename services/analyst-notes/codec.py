@@ -0,0 +1,211 @@
+"""
+JSON codec used on the hot paths (request bodies, Elastic payloads, prompts).
+
+Uses orjson when it is installed and falls back to the stdlib otherwise; both
+backends emit compact UTF-8 JSON and render datetimes as ISO-8601, so output
+is interchangeable. Anything else non-serializable is passed through ``str``.
+
+    dumps(obj) -> bytes               loads(bytes | str) -> obj
+    dumps_str(obj) -> str             await read_json(request)
+    dumps_bounded(obj, 4000) -> str   first 4000 chars of dumps_str(obj), but
+                                      stops encoding once the budget is full
+    bulk_action("ith-events")         cached ``{"index":{...}}\\n`` line
+    es_client_kwargs()                orjson serializer and gzip request bodies
+                                      (ES_HTTP_COMPRESS) for ``Elasticsearch()``
+
+Edit this file under services/ingestor/app/utils/ only;
+scripts/sync_vendored.py copies it into the other services.
+"""
+import datetime as _dt
+import json
+import os
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+# gzip request bodies sent to Elastic (responses are negotiated via Accept-Encoding)
+ES_HTTP_COMPRESS = os.getenv("ES_HTTP_COMPRESS", "true").lower() == "true"
+
+
+def _default(o: Any) -> Any:
+    if isinstance(o, (_dt.datetime, _dt.date, _dt.time)):
+        return o.isoformat()
+    if isinstance(o, (set, frozenset, tuple)):
+        return list(o)
+    if isinstance(o, bytes):
+        return o.decode("utf-8", "replace")
+    return str(o)
+
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_OPTS)
+
+    def dumps_str(obj: Any) -> str:
+        return orjson.dumps(obj, default=_default, option=_OPTS).decode("utf-8")
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=_default)
+
+    def dumps(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode("utf-8")
+
+    def dumps_str(obj: Any) -> str:
+        return _encoder.encode(obj)
+
+    def loads(data):
+        return json.loads(data)
+
+
+async def read_json(request) -> Any:
+    """``await request.json()`` through this codec (Starlette/FastAPI Request)."""
+    return loads(await request.body())
+
+
+# --------------------
+# Size-bounded encoding for prompts
+# --------------------
+class _Full(Exception):
+    pass
+
+
+class _Sink:
+    __slots__ = ("parts", "left")
+
+    def __init__(self, limit: int):
+        self.parts: List[str] = []
+        self.left = limit
+
+    def put(self, s: str) -> None:
+        if len(s) >= self.left:
+            self.parts.append(s[:self.left])
+            self.left = 0
+            raise _Full
+        self.parts.append(s)
+        self.left -= len(s)
+
+
+# A container is encoded in one native call (and truncated by the sink if it
+# overflows) when it and its direct children hold at most _WHOLE_MAX items
+# and no string longer than the remaining budget. Bigger ones are walked in
+# chunks of _WALK_OVER items so encoding can stop at the budget.
+_WHOLE_MAX = 64
+_WALK_OVER = 16
+_CONTAINERS = (dict, list, tuple)
+
+
+def _narrow(v, left: int) -> bool:
+    width = len(v)
+    if width > _WHOLE_MAX:
+        return False
+    for x in (v.values() if isinstance(v, dict) else v):
+        if x.__class__ is str:
+            if len(x) >= left:
+                return False
+        elif x.__class__ in _CONTAINERS:
+            width += len(x)
+            if width > _WHOLE_MAX:
+                return False
+    return True
+
+
+def _emit(obj: Any, sink: _Sink) -> None:
+    # Walk in chunks of _WALK_OVER items: a chunk with no long string and no
+    # wide container value is one native call (its brackets stripped);
+    # otherwise go item by item.
+    is_dict = isinstance(obj, dict)
+    it = iter(obj.items() if is_dict else obj)
+    sink.put("{" if is_dict else "[")
+    first = True
+    while True:
+        chunk = list(islice(it, _WALK_OVER))
+        if not chunk:
+            break
+        left = sink.left
+        if all(len(v) < left if v.__class__ is str else
+               (len(v) <= _WALK_OVER if v.__class__ in _CONTAINERS else True)
+               for v in ((v for _, v in chunk) if is_dict else chunk)):
+            body = dumps_str(dict(chunk) if is_dict else chunk)[1:-1]
+            sink.put(body if first else "," + body)
+            first = False
+            continue
+        for item in chunk:
+            if not first:
+                sink.put(",")
+            first = False
+            if is_dict:
+                k, item = item
+                sink.put(dumps_str(k if isinstance(k, str) else str(k)) + ":")
+            _emit_value(item, sink)
+    sink.put("}" if is_dict else "]")
+
+
+def _emit_value(v: Any, sink: _Sink) -> None:
+    if isinstance(v, str):
+        # The encoded prefix of a string is the encoding of its prefix.
+        sink.put(dumps_str(v[:sink.left] if len(v) >= sink.left else v))
+    elif isinstance(v, (dict, list, tuple)):
+        if _narrow(v, sink.left):
+            sink.put(dumps_str(v))
+        else:
+            _emit(v, sink)
+    else:
+        sink.put(dumps_str(v))
+
+
+def dumps_bounded(obj: Any, limit: int) -> str:
+    """
+    ``dumps_str(obj)[:limit]`` without serializing what would be cut off:
+    encoding stops as soon as ``limit`` characters have been produced.
+    """
+    if limit <= 0:
+        return ""
+    sink = _Sink(limit)
+    try:
+        _emit_value(obj, sink)
+    except _Full:
+        pass
+    return "".join(sink.parts)
+
+
+# --------------------
+# Elastic _bulk helpers
+# --------------------
+@lru_cache(maxsize=256)
+def bulk_action(index: str, op: str = "index") -> bytes:
+    """Pre-encoded ``{"<op>":{"_index":...}}\\n`` line for id-less bulk items."""
+    return dumps({op: {"_index": index}}) + b"\n"
+
+
+def bulk_action_with_id(index: str, doc_id: str, op: str = "index") -> bytes:
+    return dumps({op: {"_index": index, "_id": doc_id}}) + b"\n"
+
+
+def es_client_kwargs() -> Dict[str, Any]:
+    """Extra ``Elasticsearch(...)`` kwargs: gzip bodies, and JSON through orjson when available."""
+    kw: Dict[str, Any] = {"http_compress": True} if ES_HTTP_COMPRESS else {}
+    if orjson is None:
+        return kw
+    try:
+        from elasticsearch.serializer import OrjsonSerializer
+    except ImportError:
+        return kw
+    kw["serializer"] = OrjsonSerializer()
+    return kw
+
+
+def ndjson(lines: List[Any], action: Optional[bytes] = None) -> bytes:
+    """NDJSON body; with ``action`` every document is preceded by that line."""
+    if action is None:
+        return b"".join(dumps(x) + b"\n" for x in lines)
+    return b"".join(action + dumps(x) + b"\n" for x in lines)
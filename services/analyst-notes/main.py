@@ -1,11 +1,13 @@
 import os
-import json
+import logging
+import threading
+from functools import lru_cache
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import vertexai
-from vertexai.generative_models import GenerativeModel
 
-PROJECT_ID = os.environ["GCP_PROJECT"]
+import codec
+
+PROJECT_ID = os.environ.get("GCP_PROJECT")
 LOCATION = os.environ.get("GCP_LOCATION", "us-central1")
 MODEL_NAME = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
 
@@ -14,15 +16,33 @@ app = FastAPI(title="ITH Analyst Notes")
 class AlertIn(BaseModel):
     alert: dict  # Elastic/Kibana alert JSON
 
-@app.on_event("startup")
-def _init_vertex():
+log = logging.getLogger("ith-analyst-notes")
+
+@lru_cache(maxsize=1)
+def _model():
+    # The Vertex SDK takes seconds to import; load it on first use or on the
+    # warm-up thread, never before the port is bound.
+    if not PROJECT_ID:
+        raise RuntimeError("GCP_PROJECT not set")
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
     vertexai.init(project=PROJECT_ID, location=LOCATION)
+    return GenerativeModel(MODEL_NAME)
+
+@app.on_event("startup")
+def _warm_vertex():
+    def _warm():
+        try:
+            _model()
+        except Exception as e:
+            log.warning("Vertex warm-up failed: %s", e)
+    threading.Thread(target=_warm, name="warmup", daemon=True).start()
 
 def _prompt(alert: dict) -> str:
     # Keep the prompt concise; the model returns a 1–2 sentence analyst note.
     return (
         "Explain this Elastic Security identity alert to a SOC analyst in two sentences. "
-        "Be concise and actionable. Alert JSON:\n" + json.dumps(alert)[:6000]
+        "Be concise and actionable. Alert JSON:\n" + codec.dumps_bounded(alert, 6000)
     )
 
 @app.get("/")
@@ -36,8 +56,7 @@ def healthz():
 @app.post("/explain")
 def explain(body: AlertIn):
     try:
-        model = GenerativeModel(MODEL_NAME)
-        resp = model.generate_content(_prompt(body.alert))
+        resp = _model().generate_content(_prompt(body.alert))
         note = (resp.text or "").strip()
         return {"analyst_note": note[:500]}
     except Exception as e:
@@ -1,11 +1,20 @@
 ﻿from datetime import datetime, timedelta, timezone
 from math import radians, sin, cos, asin, sqrt
 from typing import Dict, Any, List, Optional
+import hashlib
 import os
 
 from fastapi import FastAPI, Query, HTTPException
+from fastapi.responses import PlainTextResponse
 from functools import lru_cache
-from elasticsearch import Elasticsearch
+import threading
+
+import metrics
+from metrics import stage
+from profiling import install_debug_routes
+from normalize import Event, normalize
+import codec
+import snapshot
 
 # ---------- Config ----------
 ES_URL = os.getenv("ELASTIC_CLOUD_URL")
@@ -13,9 +22,27 @@ ES_API_KEY = os.getenv("ELASTIC_API_KEY")
 EVENTS_INDEX = os.getenv("EVENTS_INDEX", "ith-events")
 PROFILE_INDEX = os.getenv("PROFILE_INDEX", "ith-users-profile")
 ENRICHED_INDEX = os.getenv("ENRICHED_INDEX", "ith-events-enriched")
+# true: partial-update the source event in place; false: upsert into
+# ENRICHED_INDEX under a deterministic id (one copy per source event)
+ENRICH_IN_PLACE = os.getenv("ENRICH_IN_PLACE", "true").lower() == "true"
+ENRICH_BULK_SIZE = int(os.getenv("ENRICH_BULK_SIZE", "500"))
+ENRICH_PAGE = 2000  # events scored per /enrich_recent call
+# /build_profiles default: "replay" events in Python, or "agg" (composite
+# aggregation per user.id, PROFILE_AGG_PAGE users per page)
+PROFILE_BUILD_MODE = os.getenv("PROFILE_BUILD_MODE", "replay")
+PROFILE_AGG_PAGE = int(os.getenv("PROFILE_AGG_PAGE", "500"))
+# Columnar profile snapshots (snapshot.py): files live in SNAPSHOT_DIR;
+# PROFILE_SNAPSHOT ("base.prf,delta.prf" in that dir) makes /enrich_recent
+# score from the snapshot instead of reading profiles from Elastic.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "/tmp/ith-snapshots")
+PROFILE_SNAPSHOT = os.getenv("PROFILE_SNAPSHOT", "")
+# how often to check whether the snapshot files were re-exported or compacted
+PROFILE_SNAPSHOT_CHECK_S = float(os.getenv("PROFILE_SNAPSHOT_CHECK_S", "30"))
 ALPHA = float(os.getenv("PROFILE_ALPHA", "0.1"))
 
 app = FastAPI(title="ITH Digital Twin Service")
+app.add_middleware(metrics.MetricsMiddleware)
+install_debug_routes(app)
 
 # ---------- Utilities ----------
 def haversine_km(lat1, lon1, lat2, lon2):
@@ -41,7 +68,8 @@ def incr_count(d: Dict[str,float], key: str, alpha: float = ALPHA):
 def get_es():
     if not ES_URL or not ES_API_KEY:
         raise HTTPException(status_code=500, detail="Elastic env vars not set")
-    return Elasticsearch(ES_URL, api_key=ES_API_KEY)
+    from elasticsearch import Elasticsearch  # deferred off the cold-start path
+    return Elasticsearch(ES_URL, api_key=ES_API_KEY, **codec.es_client_kwargs())
 
 # ---------- Profile helpers ----------
 def fresh_profile(user_id: str) -> Dict[str,Any]:
@@ -57,22 +85,32 @@ def fresh_profile(user_id: str) -> Dict[str,Any]:
     }
 
 def get_profile(user_id: str) -> Optional[Dict[str,Any]]:
-    res = get_es().get(index=PROFILE_INDEX, id=user_id, ignore=[404])
+    with stage("profile_fetch"):
+        res = get_es().get(index=PROFILE_INDEX, id=user_id, ignore=[404])
     if res and res.get("found"):
         return res["_source"]
     return None
 
+def get_profiles(user_ids: List[str]) -> Dict[str, Dict[str,Any]]:
+    """One mget for all users in a run instead of a GET per event."""
+    if not user_ids:
+        return {}
+    with stage("profile_fetch"):
+        res = get_es().mget(index=PROFILE_INDEX, ids=list(user_ids))
+    return {d["_id"]: d["_source"] for d in res.get("docs", []) if d.get("found")}
+
 def put_profile(user_id: str, profile: Dict[str,Any]):
     profile["updated_at"] = datetime.now(timezone.utc).isoformat()
-    get_es().index(index=PROFILE_INDEX, id=user_id, document=profile, refresh=False)
+    with stage("profile_write"):
+        get_es().index(index=PROFILE_INDEX, id=user_id, document=profile, refresh=False)
 
-def update_profile_from_event(profile: Dict[str,Any], evt: Dict[str,Any]) -> Dict[str,Any]:
+def update_profile_from_event(profile: Dict[str,Any], evt: Event) -> Dict[str,Any]:
+    evt = normalize(evt)
     if not profile:
-        profile = fresh_profile(evt["user"]["id"])
+        profile = fresh_profile(evt.user_id)
 
     # Geo centroid + country
-    lat = evt.get("src",{}).get("geo",{}).get("lat")
-    lon = evt.get("src",{}).get("geo",{}).get("lon")
+    lat, lon = evt.source_lat, evt.source_lon
     if isinstance(lat,(int,float)) and isinstance(lon,(int,float)):
         c = profile["geo"].get("centroid")
         if c:
@@ -80,18 +118,18 @@ def update_profile_from_event(profile: Dict[str,Any], evt: Dict[str,Any]) -> Dic
             profile["geo"]["centroid"]["lon"] = ema(c["lon"], float(lon))
         else:
             profile["geo"]["centroid"] = {"lat": float(lat), "lon": float(lon)}
-    country = evt.get("src",{}).get("geo",{}).get("country")
+    country = evt.source_country
     if country:
         incr_count(profile["geo"]["country_counts"], str(country))
 
     # ASN popularity
-    asn = evt.get("src",{}).get("asn")
+    asn = evt.source_asn
     if asn is not None:
         incr_count(profile["network"]["asn_counts"], str(asn))
 
     # Time histograms
-    ts = evt.get("@timestamp")
-    if ts:
+    ts = evt.timestamp
+    if isinstance(ts, str):
         try:
             dt = datetime.fromisoformat(ts.replace("Z","")).replace(tzinfo=timezone.utc)
             profile["time"]["hour_hist_24"][dt.hour] += 1
@@ -100,26 +138,26 @@ def update_profile_from_event(profile: Dict[str,Any], evt: Dict[str,Any]) -> Dic
             pass
 
     # Device UA
-    ua_family = evt.get("user_agent",{}).get("family")
+    ua_family = evt.user_agent_family
     if ua_family:
         incr_count(profile["device"]["ua_family_counts"], str(ua_family))
 
     # Auth posture
-    mfa = bool(evt.get("event",{}).get("mfa", False))
-    outcome = evt.get("event",{}).get("outcome")
+    mfa = evt.mfa
+    outcome = evt.event_outcome
     profile["auth"]["mfa_ratio"] = ema(profile["auth"]["mfa_ratio"], 1.0 if mfa else 0.0)
     profile["auth"]["fail_ratio"] = ema(profile["auth"]["fail_ratio"], 1.0 if outcome=="failure" else 0.0)
     return profile
 
-def score_against_profile(evt: Dict[str,Any], profile: Optional[Dict[str,Any]]) -> float:
+def score_against_profile(evt: Event, profile: Optional[Dict[str,Any]]) -> float:
     if not profile:
         return 0.4  # neutral-ish risk if no profile yet
 
-    lat = evt.get("src",{}).get("geo",{}).get("lat")
-    lon = evt.get("src",{}).get("geo",{}).get("lon")
-    asn = evt.get("src",{}).get("asn")
-    ua_family = evt.get("user_agent",{}).get("family")
-    mfa = bool(evt.get("event",{}).get("mfa", False))
+    evt = normalize(evt)
+    lat, lon = evt.source_lat, evt.source_lon
+    asn = evt.source_asn
+    ua_family = evt.user_agent_family
+    mfa = evt.mfa
 
     # Geo deviation
     centroid = profile.get("geo",{}).get("centroid")
@@ -143,7 +181,7 @@ def score_against_profile(evt: Dict[str,Any], profile: Optional[Dict[str,Any]])
 
     # Time-of-day deviation
     try:
-        hour = datetime.fromisoformat(evt["@timestamp"].replace("Z","")).hour
+        hour = datetime.fromisoformat(evt.timestamp.replace("Z","")).hour
     except Exception:
         hour = 12
     hour_hist = profile.get("time",{}).get("hour_hist_24", [1]*24)
@@ -165,14 +203,348 @@ def score_against_profile(evt: Dict[str,Any], profile: Optional[Dict[str,Any]])
 def search_events_since(minutes: int) -> List[Dict[str,Any]]:
     gte = (datetime.now(timezone.utc) - timedelta(minutes=minutes)).isoformat()
     body = {"size":2000,"sort":[{"@timestamp":{"order":"asc"}}],"query":{"range":{"@timestamp":{"gte":gte}}}}
-    res = get_es().search(index=EVENTS_INDEX, body=body)
+    with stage("events_search"):
+        res = get_es().search(index=EVENTS_INDEX, body=body)
     return [hit["_source"] for hit in res.get("hits",{}).get("hits", [])]
 
+def search_unenriched_since(minutes: int, limit: int = ENRICH_PAGE) -> List[Dict[str,Any]]:
+    """
+    Up to ``limit`` hits (with _index/_id), oldest first, in the window that
+    have no event.profile_dev yet. In copy mode the source events never get
+    profile_dev, so hits that already have their ENRICHED_INDEX copy are
+    skipped. The search pages on (point in time, search_after) until it has
+    ``limit`` uncopied hits or reaches the end of the window, so a window
+    holding more than ``limit`` copied events still gets to the newer ones.
+    """
+    gte = (datetime.now(timezone.utc) - timedelta(minutes=minutes)).isoformat()
+    query = {"bool":{"filter":[{"range":{"@timestamp":{"gte":gte}}}],
+                     "must_not":[{"exists":{"field":"event.profile_dev"}}]}}
+    es = get_es()
+    if ENRICH_IN_PLACE:
+        body = {"size":limit,"sort":[{"@timestamp":{"order":"asc"}}],"query":query}
+        with stage("events_search"):
+            res = es.search(index=EVENTS_INDEX, body=body)
+        return res.get("hits",{}).get("hits", [])
+
+    out: List[Dict[str,Any]] = []
+    pit = es.open_point_in_time(index=EVENTS_INDEX, keep_alive="1m")["id"]
+    after = None
+    try:
+        while len(out) < limit:
+            body = {"size":limit,"sort":[{"@timestamp":{"order":"asc"}},{"_shard_doc":"asc"}],"query":query,
+                    "pit":{"id":pit,"keep_alive":"1m"}}
+            if after:
+                body["search_after"] = after
+            with stage("events_search"):
+                res = es.search(body=body)
+            pit = res.get("pit_id", pit)
+            hits = res.get("hits",{}).get("hits", [])
+            if not hits:
+                break
+            done = already_copied(hits)
+            out.extend(h for h in hits if (h["_index"], h["_id"]) not in done)
+            if len(hits) < limit:
+                break
+            after = hits[-1]["sort"]
+    finally:
+        try:
+            es.close_point_in_time(id=pit)
+        except Exception:
+            pass  # expires after keep_alive anyway
+    return out[:limit]
+
+def enriched_id(index: str, doc_id: str) -> str:
+    """Deterministic ENRICHED_INDEX id for a source event."""
+    return hashlib.sha1(f"{index}/{doc_id}".encode("utf-8")).hexdigest()
+
+def already_copied(hits: List[Dict[str,Any]]) -> set:
+    """Source hits whose ENRICHED_INDEX copy exists (copy mode), as (index, id)."""
+    ids = {enriched_id(h["_index"], h["_id"]): (h["_index"], h["_id"]) for h in hits}
+    if not ids:
+        return set()
+    with stage("events_search"):
+        res = get_es().mget(index=ENRICHED_INDEX, ids=list(ids), source=False)
+    return {ids[d["_id"]] for d in res.get("docs", []) if d.get("found")}
+
+def enrichment_op(hit: Dict[str,Any], fields: Dict[str,Any]) -> bytes:
+    """Bulk update carrying only the changed event.* fields."""
+    if ENRICH_IN_PLACE:
+        action = codec.bulk_action_with_id(hit["_index"], hit["_id"], op="update")
+        return action + codec.dumps({"doc": {"event": fields}}) + b"\n"
+    src = hit["_source"]
+    upsert = dict(src, event=dict(src.get("event") or {}, **fields))
+    action = codec.bulk_action_with_id(ENRICHED_INDEX, enriched_id(hit["_index"], hit["_id"]), op="update")
+    return action + codec.dumps({"doc": {"event": fields}, "upsert": upsert}) + b"\n"
+
+def bulk_write(ops: List[bytes]) -> int:
+    """Send update ops in ENRICH_BULK_SIZE chunks; returns the number of failed items."""
+    failed = 0
+    for i in range(0, len(ops), ENRICH_BULK_SIZE):
+        with stage("index"):
+            res = get_es().bulk(operations=b"".join(ops[i:i + ENRICH_BULK_SIZE]), refresh=False)
+        res = getattr(res, "body", res)
+        if res.get("errors"):
+            failed += sum(1 for it in res.get("items", []) if it.get("update", {}).get("status", 200) >= 300)
+    return failed
+
+# ---------- Aggregated profile build ----------
+# Runtime fields coalesce the nested (source.*), legacy (src.*) and top-level
+# layouts the way normalize.FIELDS does. Only fields with doc values may be
+# listed: doc[f] on a text field throws (no fielddata) and fails the whole
+# aggregation, even for documents that would have matched an earlier field.
+# Dynamically mapped strings are therefore read through their ".keyword"
+# sub-field, and agg_runtime() drops any candidate that field_caps reports
+# as not aggregatable in some index behind EVENTS_INDEX.
+_COALESCE = """
+for (def f : params.fields) {
+  if (doc.containsKey(f) && doc[f].size() > 0) { emit(%s); return; }
+}
+"""
+
+def _coalesce(kind: str, fields: List[str]) -> Dict[str,Any]:
+    value = "String.valueOf(doc[f].value)" if kind == "keyword" else "((Number) doc[f].value).doubleValue()"
+    return {"type": kind, "script": {"source": _COALESCE % value, "params": {"fields": fields}}}
+
+def _flag(test: str, fields: List[str]) -> Dict[str,Any]:
+    src = ("for (def f : params.fields) { if (doc.containsKey(f) && doc[f].size() > 0) {"
+           " def v = doc[f].value; emit(%s ? 1L : 0L); return; } } emit(0L);" % test)
+    return {"type": "long", "script": {"source": src, "params": {"fields": fields}}}
+
+_TS = "if (doc['@timestamp'].size() > 0) emit(doc['@timestamp'].value.%s);"
+# runtime field -> (kind, candidate fields in priority order); the flag
+# kinds carry their Painless test
+_AGG_FIELDS = {
+    "ith_country": ("keyword", ["source.geo.country.keyword", "src.geo.country", "src.geo.country.keyword"]),
+    "ith_asn": ("keyword", ["source.asn", "source.asn.keyword", "src.asn", "src.asn.keyword", "asn"]),
+    "ith_ua": ("keyword", ["user_agent.family.keyword"]),
+    "ith_lat": ("double", ["source.geo.lat", "src.geo.lat"]),
+    "ith_lon": ("double", ["source.geo.lon", "src.geo.lon"]),
+    "ith_mfa": ("v == true || v == 'true' || v == '1'", ["event.mfa", "event.mfa.keyword"]),
+    "ith_fail": ("v == 'failure'", ["event.outcome.keyword"]),
+}
+
+def agg_runtime(usable: Optional[set] = None) -> Dict[str,Any]:
+    """Runtime mappings for the profile aggregation; ``usable`` limits the candidate fields."""
+    out: Dict[str,Any] = {}
+    for name, (kind, fields) in _AGG_FIELDS.items():
+        if usable is not None:
+            fields = [f for f in fields if f in usable]
+        out[name] = _coalesce(kind, fields) if kind in ("keyword", "double") else _flag(kind, fields)
+    out["ith_hour"] = {"type": "long", "script": {"source": _TS % "getHour()"}}
+    out["ith_weekday"] = {"type": "long", "script": {"source": _TS % "getDayOfWeekEnum().getValue() - 1"}}
+    return out
+
+_AGG_RUNTIME = agg_runtime()
+
+def aggregatable_fields(index: str = EVENTS_INDEX) -> set:
+    """Candidate fields with doc values in every index behind ``index`` that maps them."""
+    names = sorted({f for _, fields in _AGG_FIELDS.values() for f in fields})
+    with stage("events_search"):
+        res = get_es().field_caps(index=index, fields=",".join(names), ignore_unavailable=True)
+    caps = getattr(res, "body", res).get("fields", {})
+    return {f for f, types in caps.items() if types and all(t.get("aggregatable") for t in types.values())}
+_AGG_SUBS = {
+    "country": {"terms": {"field": "ith_country", "size": 50}},
+    "asn": {"terms": {"field": "ith_asn", "size": 50}},
+    "ua": {"terms": {"field": "ith_ua", "size": 20}},
+    "hour": {"terms": {"field": "ith_hour", "size": 24}},
+    "weekday": {"terms": {"field": "ith_weekday", "size": 7}},
+    "geo_n": {"value_count": {"field": "ith_lat"}},
+    "lat": {"avg": {"field": "ith_lat"}},
+    "lon": {"avg": {"field": "ith_lon"}},
+    "mfa": {"avg": {"field": "ith_mfa"}},
+    "fail": {"avg": {"field": "ith_fail"}},
+}
+
+def profile_agg_body(minutes: int, after: Optional[Dict[str,Any]] = None,
+                     runtime: Optional[Dict[str,Any]] = None) -> Dict[str,Any]:
+    gte = (datetime.now(timezone.utc) - timedelta(minutes=minutes)).isoformat()
+    composite = {"size": PROFILE_AGG_PAGE, "sources": [{"uid": {"terms": {"field": "user.id"}}}]}
+    if after:
+        composite["after"] = after
+    return {"size": 0, "query": {"range": {"@timestamp": {"gte": gte}}},
+            "runtime_mappings": runtime or _AGG_RUNTIME,
+            "aggs": {"users": {"composite": composite, "aggs": _AGG_SUBS}}}
+
+def summary_from_bucket(b: Dict[str,Any]) -> Dict[str,Any]:
+    """Per-user summary from one composite bucket."""
+    def terms(name):
+        return {str(x["key"]): x["doc_count"] for x in b.get(name, {}).get("buckets", [])}
+    def value(name):
+        return (b.get(name) or {}).get("value")
+    return {
+        "user_id": str(b["key"]["uid"]), "n": b["doc_count"],
+        "country": terms("country"), "asn": terms("asn"), "ua": terms("ua"),
+        "hour": {int(k): c for k, c in terms("hour").items()},
+        "weekday": {int(k): c for k, c in terms("weekday").items()},
+        "geo_n": int(value("geo_n") or 0), "lat": value("lat"), "lon": value("lon"),
+        "mfa": value("mfa") or 0.0, "fail": value("fail") or 0.0,
+    }
+
+def _decay(n: int, alpha: float = ALPHA) -> float:
+    # weight left on the old value after n EMA steps
+    return (1 - alpha) ** n
+
+def _blend_counts(d: Dict[str,float], counts: Dict[str,int], alpha: float = ALPHA):
+    total = sum(counts.values())
+    if not total:
+        return
+    keep = _decay(total, alpha)
+    for k in list(d.keys()):
+        d[k] *= keep
+    for k, c in counts.items():
+        d[k] = d.get(k, 0.0) + (1 - keep) * c / total
+    for k in [k for k, v in d.items() if v < 1e-3]:
+        d.pop(k, None)
+
+def merge_summary(profile: Dict[str,Any], s: Dict[str,Any]) -> Dict[str,Any]:
+    """
+    Fold a per-user summary into the profile. Histograms add exactly; EMA
+    fields are blended as if the window's events arrived in one step, i.e.
+    the new data gets weight 1 - (1 - ALPHA) ** n. This matches replay in
+    aggregate but ignores the order of events inside the window.
+    """
+    if not s["n"]:
+        return profile
+    _blend_counts(profile["geo"]["country_counts"], s["country"])
+    _blend_counts(profile["network"]["asn_counts"], s["asn"])
+    _blend_counts(profile["device"]["ua_family_counts"], s["ua"])
+    for h, c in s["hour"].items():
+        profile["time"]["hour_hist_24"][h] += c
+    for d, c in s["weekday"].items():
+        profile["time"]["weekday_hist_7"][d] += c
+    if s["geo_n"] and s["lat"] is not None and s["lon"] is not None:
+        c = profile["geo"].get("centroid")
+        if c:
+            keep = _decay(s["geo_n"])
+            c["lat"] = keep * c["lat"] + (1 - keep) * s["lat"]
+            c["lon"] = keep * c["lon"] + (1 - keep) * s["lon"]
+        else:
+            profile["geo"]["centroid"] = {"lat": float(s["lat"]), "lon": float(s["lon"])}
+    keep = _decay(s["n"])
+    auth = profile["auth"]
+    auth["mfa_ratio"] = keep * auth["mfa_ratio"] + (1 - keep) * s["mfa"]
+    auth["fail_ratio"] = keep * auth["fail_ratio"] + (1 - keep) * s["fail"]
+    return profile
+
+def put_profiles(profiles: Dict[str, Dict[str,Any]], touch: bool = True) -> int:
+    """Bulk-index profiles by user id; returns the number of failed items."""
+    now = datetime.now(timezone.utc).isoformat()
+    ops = []
+    for uid, prof in profiles.items():
+        if touch:
+            prof["updated_at"] = now
+        ops.append(codec.bulk_action_with_id(PROFILE_INDEX, uid) + codec.dumps(prof) + b"\n")
+    if not ops:
+        return 0
+    with stage("profile_write"):
+        res = get_es().bulk(operations=b"".join(ops), refresh=False)
+    res = getattr(res, "body", res)
+    if not res.get("errors"):
+        return 0
+    return sum(1 for it in res.get("items", []) if it.get("index", {}).get("status", 200) >= 300)
+
+def build_profiles_agg(minutes: int) -> Dict[str,Any]:
+    """Page through per-user aggregations; one mget + one bulk per page."""
+    updated = failed = pages = events = 0
+    after = None
+    runtime = agg_runtime(aggregatable_fields())
+    while True:
+        with stage("events_search"):
+            res = get_es().search(index=EVENTS_INDEX, body=profile_agg_body(minutes, after, runtime))
+        agg = res.get("aggregations", {}).get("users", {})
+        buckets = agg.get("buckets", [])
+        if not buckets:
+            break
+        pages += 1
+        summaries = [summary_from_bucket(b) for b in buckets]
+        existing = get_profiles([s["user_id"] for s in summaries])
+        out = {}
+        with stage("profile_update"):
+            for sm in summaries:
+                uid = sm["user_id"]
+                out[uid] = merge_summary(existing.get(uid) or fresh_profile(uid), sm)
+                events += sm["n"]
+        failed += put_profiles(out)
+        updated += len(out)
+        after = agg.get("after_key")
+        if not after:
+            break
+    return {"profiles_updated": updated - failed, "failed": failed, "events": events, "pages": pages, "mode": "agg"}
+
+# ---------- Snapshots ----------
+def iter_profiles(since: Optional[float] = None, page: int = 1000):
+    """All profiles (or those updated after epoch ``since``), paged by user_id."""
+    query = {"match_all": {}}
+    if since is not None:
+        query = {"range": {"updated_at": {"gt": datetime.fromtimestamp(since, timezone.utc).isoformat()}}}
+    after = None
+    while True:
+        body = {"size": page, "sort": [{"user_id": "asc"}], "query": query}
+        if after:
+            body["search_after"] = after
+        with stage("profile_fetch"):
+            res = get_es().search(index=PROFILE_INDEX, body=body)
+        hits = res.get("hits", {}).get("hits", [])
+        if not hits:
+            return
+        for h in hits:
+            yield h["_source"]
+        after = hits[-1]["sort"]
+
+def snapshot_path(name: str) -> str:
+    """``name`` inside SNAPSHOT_DIR (no directories from callers)."""
+    base = os.path.basename(name or "")
+    if not base or base.startswith("."):
+        raise HTTPException(status_code=400, detail="invalid snapshot name")
+    return os.path.join(SNAPSHOT_DIR, base)
+
+def export_snapshot(out: str, base: Optional[str] = None) -> Dict[str,Any]:
+    """Full export, or with ``base`` (a chain spec) a delta of profiles updated after it."""
+    since = None
+    if base:
+        chain = snapshot.open_chain(base)
+        since = chain.max_updated
+        chain.close()
+    meta = {"kind": "delta" if base else "full", "index": PROFILE_INDEX, "base": base, "since": since}
+    n = snapshot.write_snapshot(out, iter_profiles(since), meta)
+    return {"path": out, "count": n, "kind": meta["kind"], "bytes": os.path.getsize(out)}
+
+_scoring: Optional[snapshot.WatchedChain] = None
+
+def _scoring_snapshot():
+    """The PROFILE_SNAPSHOT chain, re-opened when its files are replaced on disk."""
+    global _scoring
+    if _scoring is None:
+        spec = ",".join(snapshot_path(p) for p in PROFILE_SNAPSHOT.split(",") if p.strip())
+        _scoring = snapshot.WatchedChain(spec, PROFILE_SNAPSHOT_CHECK_S)
+    return _scoring.get()
+
+def scoring_profiles(user_ids: List[str]) -> Dict[str, Dict[str,Any]]:
+    """Profiles to score against: the mapped snapshot when configured, else Elastic."""
+    if PROFILE_SNAPSHOT:
+        with stage("profile_fetch"):
+            return _scoring_snapshot().get_many(user_ids)
+    return get_profiles(user_ids)
+
 # ---------- Routes ----------
+@app.on_event("startup")
+def _warm_in_background():
+    def _warm():
+        try:
+            get_es()
+        except Exception:
+            pass
+    threading.Thread(target=_warm, name="warmup", daemon=True).start()
+
 @app.get("/")
 def root():
     return {"ok": True, "service": "digital-twin"}
 
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/healthz")
 def healthz():
     return {"status": "ok"}
@@ -182,38 +554,78 @@ def healthz_slash():
     return {"status": "ok"}
 
 @app.post("/build_profiles")
-def build_profiles(minutes: int = Query(default=1440, ge=5, le=43200)):
+def build_profiles(minutes: int = Query(default=1440, ge=5, le=43200),
+                   mode: str = Query(default=PROFILE_BUILD_MODE)):
+    if mode == "agg":
+        return build_profiles_agg(minutes)
+    if mode != "replay":
+        raise HTTPException(status_code=400, detail="mode must be 'replay' or 'agg'")
     evts = search_events_since(minutes)
-    by_user: Dict[str,List[Dict[str,Any]]] = {}
+    by_user: Dict[str,List[Event]] = {}
     for e in evts:
-        uid = e.get("user",{}).get("id")
-        if not uid:
+        n = normalize(e)
+        if not n.user_id:
             continue
-        by_user.setdefault(uid, []).append(e)
+        by_user.setdefault(n.user_id, []).append(n)
 
     updated = 0
     for uid, items in by_user.items():
         prof = get_profile(uid) or fresh_profile(uid)
-        for evt in items:
-            prof = update_profile_from_event(prof, evt)
+        with stage("profile_update"):
+            for evt in items:
+                prof = update_profile_from_event(prof, evt)
         put_profile(uid, prof)
         updated += 1
     return {"profiles_updated": updated}
 
 @app.post("/enrich_recent")
 def enrich_recent(minutes: int = Query(default=60, ge=5, le=1440)):
-    evts = search_events_since(minutes)
-    written = 0
-    for e in evts:
-        uid = e.get("user",{}).get("id")
-        if not uid:
-            continue
-        prof = get_profile(uid)
-        pdev = score_against_profile(e, prof)
-        e.setdefault("event",{})["profile_dev"] = pdev
-        rs = float(e.get("event",{}).get("risk_score", 0.0))
+    """
+    Score not-yet-enriched events against their profiles and write back only
+    event.profile_dev, the blended event.risk_score and the ingest-time
+    event.risk_score_base. Re-running over an overlapping window skips
+    events that already carry profile_dev (or, with ENRICH_IN_PLACE=false,
+    already have their ENRICHED_INDEX copy).
+    """
+    hits = search_unenriched_since(minutes)
+    events = [(h, normalize(h["_source"])) for h in hits]
+    events = [(h, n) for h, n in events if n.user_id]
+    profiles = scoring_profiles(sorted({n.user_id for _, n in events}))
+    ops = []
+    for hit, n in events:
+        with stage("profile_score"):
+            pdev = score_against_profile(n, profiles.get(n.user_id))
+        ev = hit["_source"].get("event") or {}
+        rs = float(ev.get("risk_score_base", ev.get("risk_score", 0.0)) or 0.0)
         blended = 1 - (1 - rs)*(1 - float(pdev))
-        e["event"]["risk_score"] = max(0.0, min(1.0, blended))
-        get_es().index(index=ENRICHED_INDEX, document=e, refresh=False)
-        written += 1
-    return {"events_enriched": written}
+        ops.append(enrichment_op(hit, {"profile_dev": pdev, "risk_score": max(0.0, min(1.0, blended)),
+                                       "risk_score_base": rs}))
+    failed = bulk_write(ops) if ops else 0
+    return {"events_enriched": len(ops) - failed, "failed": failed,
+            "target": "in_place" if ENRICH_IN_PLACE else ENRICHED_INDEX}
+
+@app.post("/snapshot/export")
+def snapshot_export(name: str = Query(...), base: Optional[str] = Query(default=None)):
+    """Write PROFILE_INDEX to SNAPSHOT_DIR/<name>; with base=<a.prf,b.prf> only the delta since them."""
+    base_spec = ",".join(snapshot_path(b) for b in base.split(",") if b.strip()) if base else None
+    return export_snapshot(snapshot_path(name), base=base_spec)
+
+@app.post("/snapshot/import")
+def snapshot_import(names: str = Query(..., description="base.prf[,delta.prf...] in SNAPSHOT_DIR")):
+    """Warm-start PROFILE_INDEX from a snapshot chain (newest file wins per user)."""
+    chain = snapshot.open_chain(",".join(snapshot_path(n) for n in names.split(",") if n.strip()))
+    if chain is None:
+        raise HTTPException(status_code=400, detail="no snapshot names given")
+    written = failed = 0
+    batch: Dict[str, Dict[str,Any]] = {}
+    for prof in chain:
+        batch[prof["user_id"]] = prof
+        if len(batch) >= ENRICH_BULK_SIZE:
+            failed += put_profiles(batch, touch=False)
+            written += len(batch)
+            batch = {}
+    if batch:
+        failed += put_profiles(batch, touch=False)
+        written += len(batch)
+    chain.close()
+    return {"profiles_imported": written - failed, "failed": failed}
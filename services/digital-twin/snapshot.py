@@ -0,0 +1,418 @@
+"""
+Columnar, memory-mapped snapshots of the profile index.
+
+    python snapshot.py export /data/profiles.prf                        # all of PROFILE_INDEX
+    python snapshot.py export /data/d1.prf --base /data/profiles.prf    # delta: updated since base
+    python snapshot.py compact /data/full.prf /data/profiles.prf /data/d1.prf
+    python snapshot.py info /data/profiles.prf
+    python snapshot.py score /data/profiles.prf,/data/d1.prf events.ndjson
+
+Layout: ``ITHPRF01`` | u32 header length | JSON header | 8-aligned columns.
+Every column is a native-order array of N rows (N*width for vectors), with
+rows sorted by user id:
+
+    uid_off   I[N+1]   uid_blob  utf-8 user ids (binary-searched)
+    updated   d[N]     epoch seconds        version  I[N]
+    centroid  f[N*2]   NaN when unknown     radius   f[N]
+    hour      I[N*24]  weekday   I[N*7]     mfa, fail, churn  f[N]
+    <map>_off I[N+1]   row i's entries are <map>_key/_val[off[i]:off[i+1]]
+    <map>_key I[nnz]   index into the string table
+    <map>_val f[nnz]   for map in country, asn, ua, os, fp
+    str_off   I[M+1]   str_blob  category strings shared by all maps
+
+Count maps keep at most their SNAPSHOT_TOP_K largest entries. The EMA
+already drops entries below 1e-3, so only the long tail is cut.
+
+Opening a snapshot maps the file and casts memoryviews over it; nothing is
+decoded up front, so a few million profiles open in milliseconds and every
+worker on the host shares the same page cache. A delta holds only the
+profiles updated after its base; SnapshotChain looks users up newest file
+first. Files are replaced atomically.
+"""
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+log = logging.getLogger("ith-twin.snapshot")
+
+MAGIC = b"ITHPRF01"
+SNAPSHOT_TOP_K = int(os.getenv("SNAPSHOT_TOP_K", "16"))
+
+_HEAD = struct.Struct("<8sI")
+_NAN = float("nan")
+# column prefix -> path of the count map inside a profile
+_MAPS = (("country", ("geo", "country_counts")), ("asn", ("network", "asn_counts")),
+         ("ua", ("device", "ua_family_counts")), ("os", ("device", "os_family_counts")),
+         ("fp", ("device", "fp_hash_counts")))
+
+
+def _epoch(ts: Any) -> float:
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    try:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+        return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+    except ValueError:
+        return _NAN
+
+
+def _num(v: Any, default: float = _NAN) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return default
+
+
+# --------------------
+# Writing
+# --------------------
+def write_snapshot(path: str, profiles: Iterable[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None,
+                   top_k: int = SNAPSHOT_TOP_K) -> int:
+    """Write ``profiles`` (later duplicates win) to ``path`` atomically; returns the row count."""
+    by_uid: Dict[bytes, Dict[str, Any]] = {}
+    for p in profiles:
+        if p and p.get("user_id") is not None:
+            by_uid[str(p["user_id"]).encode("utf-8")] = p
+    uids = sorted(by_uid)
+    n = len(uids)
+
+    cols: Dict[str, Any] = {
+        "uid_off": array("I", [0]), "updated": array("d"), "version": array("I"),
+        "centroid": array("f"), "radius": array("f"), "hour": array("I"), "weekday": array("I"),
+        "mfa": array("f"), "fail": array("f"), "churn": array("f"),
+    }
+    for name, _ in _MAPS:
+        cols[name + "_off"] = array("I", [0])
+        cols[name + "_key"] = array("I")
+        cols[name + "_val"] = array("f")
+    strings: Dict[str, int] = {}
+    uid_blob = bytearray()
+    max_updated = _NAN
+
+    for uid in uids:
+        p = by_uid[uid]
+        uid_blob += uid
+        cols["uid_off"].append(len(uid_blob))
+        up = _epoch(p.get("updated_at"))
+        cols["updated"].append(up)
+        if not math.isnan(up) and not (up <= max_updated):
+            max_updated = up
+        cols["version"].append(int(_num(p.get("profile_version"), 1)))
+        geo = p.get("geo") or {}
+        c = geo.get("centroid") or {}
+        cols["centroid"].extend((_num(c.get("lat")), _num(c.get("lon"))))
+        cols["radius"].append(_num(geo.get("radius_km_p95"), 50.0))
+        t = p.get("time") or {}
+        hour = list(t.get("hour_hist_24") or [1] * 24)[:24]
+        weekday = list(t.get("weekday_hist_7") or [1] * 7)[:7]
+        cols["hour"].extend(int(x) for x in hour + [0] * (24 - len(hour)))
+        cols["weekday"].extend(int(x) for x in weekday + [0] * (7 - len(weekday)))
+        auth = p.get("auth") or {}
+        cols["mfa"].append(_num(auth.get("mfa_ratio"), 0.0))
+        cols["fail"].append(_num(auth.get("fail_ratio"), 0.0))
+        cols["churn"].append(_num((p.get("network") or {}).get("asn_churn_rate"), 0.0))
+        for name, (a, b) in _MAPS:
+            counts = (p.get(a) or {}).get(b) or {}
+            top = sorted(counts.items(), key=lambda kv: (-_num(kv[1], 0.0), kv[0]))[:top_k]
+            keys, vals = cols[name + "_key"], cols[name + "_val"]
+            for k, v in top:
+                keys.append(strings.setdefault(str(k), len(strings)))
+                vals.append(_num(v, 0.0))
+            cols[name + "_off"].append(len(keys))
+
+    str_off, str_blob = array("I", [0]), bytearray()
+    for s in strings:  # dict order == index order
+        str_blob += s.encode("utf-8")
+        str_off.append(len(str_blob))
+    blobs = {"uid_blob": bytes(uid_blob), "str_blob": bytes(str_blob), "str_off": str_off}
+    blobs.update(cols)
+
+    header_meta = dict(meta or {})
+    header_meta.update(count=n, top_k=top_k, strings=len(strings),
+                       max_updated=None if math.isnan(max_updated) else max_updated,
+                       written_at=datetime.now(timezone.utc).isoformat())
+    _write_columns(path, blobs, header_meta)
+    return n
+
+
+def _write_columns(path: str, blobs: Dict[str, Any], meta: Dict[str, Any]) -> None:
+    names = list(blobs)
+    raw = {k: (v.tobytes() if isinstance(v, array) else v) for k, v in blobs.items()}
+
+    def header_for(base: int) -> bytes:
+        table, off = {}, base
+        for k in names:
+            code = blobs[k].typecode if isinstance(blobs[k], array) else "B"
+            table[k] = {"offset": off, "nbytes": len(raw[k]), "type": code}
+            off = (off + len(raw[k]) + 7) & ~7
+        return json.dumps({"meta": meta, "byteorder": sys.byteorder, "columns": table}, sort_keys=True).encode()
+
+    base = 0
+    while True:  # offsets depend on the header length
+        hdr = header_for(base)
+        want = (_HEAD.size + len(hdr) + 7) & ~7
+        if want == base:
+            break
+        base = want
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEAD.pack(MAGIC, len(hdr)))
+            f.write(hdr)
+            f.write(b"\0" * (base - _HEAD.size - len(hdr)))
+            for k in names:
+                f.write(raw[k])
+                f.write(b"\0" * (-len(raw[k]) % 8))
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+# --------------------
+# Reading
+# --------------------
+class ProfileSnapshot:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        got, hlen = _HEAD.unpack_from(self._mm, 0)
+        if got != MAGIC:
+            raise ValueError(f"{path}: bad magic {got!r}, expected {MAGIC!r}")
+        header = json.loads(self._mm[_HEAD.size:_HEAD.size + hlen])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path}: written on a {header['byteorder']}-endian host")
+        self.meta: Dict[str, Any] = header["meta"]
+        view = memoryview(self._mm)
+        self._views = []
+        self._c: Dict[str, Any] = {}
+        for name, col in header["columns"].items():
+            v = view[col["offset"]:col["offset"] + col["nbytes"]]
+            if col["type"] != "B":
+                v = v.cast(col["type"])
+            self._views.append(v)
+            self._c[name] = v
+        self._views.append(view)
+        self.n = len(self._c["uid_off"]) - 1
+        self._uid_base = header["columns"]["uid_blob"]["offset"]
+        self._str_cache: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self.n
+
+    def close(self) -> None:
+        for v in self._views:
+            v.release()
+        self._views.clear()
+        self._mm.close()
+
+    def user_id(self, i: int) -> str:
+        off = self._c["uid_off"]
+        return bytes(self._c["uid_blob"][off[i]:off[i + 1]]).decode("utf-8")
+
+    def index_of(self, user_id: str) -> Optional[int]:
+        key, off, mm, base = str(user_id).encode("utf-8"), self._c["uid_off"], self._mm, self._uid_base
+        lo, hi = 0, self.n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mm[base + off[mid]:base + off[mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.n and mm[base + off[lo]:base + off[lo + 1]] == key:
+            return lo
+        return None
+
+    def _str(self, i: int) -> str:
+        s = self._str_cache.get(i)
+        if s is None:
+            off = self._c["str_off"]
+            s = self._str_cache[i] = bytes(self._c["str_blob"][off[i]:off[i + 1]]).decode("utf-8")
+        return s
+
+    def _counts(self, name: str, i: int) -> Dict[str, float]:
+        off, keys, vals = self._c[name + "_off"], self._c[name + "_key"], self._c[name + "_val"]
+        return {self._str(keys[j]): vals[j] for j in range(off[i], off[i + 1])}
+
+    def profile_at(self, i: int) -> Dict[str, Any]:
+        """Row ``i`` in the profile-index document schema."""
+        c = self._c
+        lat, lon = c["centroid"][2 * i], c["centroid"][2 * i + 1]
+        up = c["updated"][i]
+        counts = {name: self._counts(name, i) for name, _ in _MAPS}
+        return {
+            "user_id": self.user_id(i),
+            "profile_version": c["version"][i],
+            "updated_at": None if math.isnan(up) else datetime.fromtimestamp(up, timezone.utc).isoformat(),
+            "geo": {"centroid": None if math.isnan(lat) else {"lat": lat, "lon": lon},
+                    "radius_km_p95": c["radius"][i], "country_counts": counts["country"]},
+            "network": {"asn_counts": counts["asn"], "asn_churn_rate": c["churn"][i]},
+            "device": {"ua_family_counts": counts["ua"], "os_family_counts": counts["os"],
+                       "fp_hash_counts": counts["fp"]},
+            "time": {"hour_hist_24": c["hour"][24 * i:24 * i + 24].tolist(),
+                     "weekday_hist_7": c["weekday"][7 * i:7 * i + 7].tolist()},
+            "auth": {"mfa_ratio": c["mfa"][i], "fail_ratio": c["fail"][i]},
+        }
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        i = self.index_of(user_id)
+        return None if i is None else self.profile_at(i)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self.n):
+            yield self.profile_at(i)
+
+
+class SnapshotChain:
+    """A base snapshot plus deltas; the newest file holding a user wins."""
+
+    def __init__(self, paths: Sequence[str]):
+        self.snapshots: List[ProfileSnapshot] = [ProfileSnapshot(p) for p in paths]
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        for s in reversed(self.snapshots):
+            p = s.get(user_id)
+            if p is not None:
+                return p
+        return None
+
+    def get_many(self, user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for uid in user_ids:
+            p = self.get(uid)
+            if p is not None:
+                out[uid] = p
+        return out
+
+    @property
+    def max_updated(self) -> Optional[float]:
+        vals = [s.meta.get("max_updated") for s in self.snapshots if s.meta.get("max_updated") is not None]
+        return max(vals) if vals else None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Every user once, from the newest file holding it."""
+        for depth, s in enumerate(self.snapshots):
+            newer = self.snapshots[depth + 1:]
+            for i in range(s.n):
+                uid = s.user_id(i)
+                if not any(t.index_of(uid) is not None for t in newer):
+                    yield s.profile_at(i)
+
+    def close(self) -> None:
+        for s in self.snapshots:
+            s.close()
+
+
+def open_chain(spec: str) -> Optional[SnapshotChain]:
+    """SnapshotChain from ``base.prf,delta1.prf,...``; None when empty."""
+    paths = [p.strip() for p in (spec or "").split(",") if p.strip()]
+    return SnapshotChain(paths) if paths else None
+
+
+class WatchedChain:
+    """
+    Holder that re-opens the chain when one of its files has been replaced on
+    disk (a new export or compaction). The stat check runs at most every
+    ``check_interval`` seconds. If the new files do not open, the chain
+    already mapped keeps serving until the next check.
+    """
+
+    def __init__(self, spec: str, check_interval: float = 30.0):
+        self.paths = [p.strip() for p in (spec or "").split(",") if p.strip()]
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._chain: Optional[SnapshotChain] = None
+        self._stamp: Optional[tuple] = None
+        self._next_check = 0.0
+
+    def get(self) -> Optional[SnapshotChain]:
+        if not self.paths:
+            return None
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload()
+        return self._chain
+
+    def _reload(self) -> None:
+        try:
+            stamp = tuple((st.st_ino, st.st_mtime_ns, st.st_size) for st in map(os.stat, self.paths))
+            if stamp == self._stamp:
+                return
+            chain = SnapshotChain(self.paths)
+        except (OSError, ValueError, KeyError, struct.error) as ex:
+            if self._chain is None:
+                raise
+            log.warning("snapshot chain %s: keeping the mapped files: %s", ",".join(self.paths), ex)
+            return
+        # The previous chain is left for the GC so in-flight lookups stay valid.
+        self._chain, self._stamp = chain, stamp
+
+
+# --------------------
+# CLI
+# --------------------
+def _main(argv: List[str]) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="snapshot.py", description="Profile snapshots")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="export PROFILE_INDEX (or a delta since --base)")
+    ex.add_argument("out")
+    ex.add_argument("--base", help="comma-separated chain; export profiles updated after it")
+    cp = sub.add_parser("compact", help="merge a base and its deltas into one snapshot")
+    cp.add_argument("out")
+    cp.add_argument("inputs", nargs="+")
+    sub.add_parser("info").add_argument("path")
+    sc = sub.add_parser("score", help="score NDJSON events against a snapshot chain, offline")
+    sc.add_argument("chain")
+    sc.add_argument("events")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        import main  # needs Elastic credentials in the environment
+        print(json.dumps(main.export_snapshot(args.out, base=args.base)))
+    elif args.cmd == "compact":
+        chain = SnapshotChain(args.inputs)
+        n = write_snapshot(args.out, iter(chain), {"kind": "full", "compacted_from": args.inputs})
+        print(json.dumps({"path": args.out, "count": n}))
+    elif args.cmd == "info":
+        s = ProfileSnapshot(args.path)
+        print(json.dumps(dict(s.meta, path=args.path, bytes=os.path.getsize(args.path)), indent=2))
+    elif args.cmd == "score":
+        import main
+        from normalize import normalize
+        chain = open_chain(args.chain)
+        with open(args.events, "rb") as f:
+            for line in f:
+                if line.strip():
+                    n = normalize(json.loads(line))
+                    pdev = main.score_against_profile(n, chain.get(n.user_id) if n.user_id else None)
+                    print(json.dumps({"user_id": n.user_id, "profile_dev": round(pdev, 4)}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
@@ -0,0 +1,45 @@
+import main as twin
+
+
+class FakeES:
+    """Events 0..n-1 in one index, sorted by time; ``copied`` already have their ENRICHED_INDEX copy."""
+
+    def __init__(self, n, copied):
+        self.hits = [{"_index": "ith-events", "_id": str(i), "_source": {"user": {"id": "u"}}, "sort": [i, i]}
+                     for i in range(n)]
+        self.copied = {twin.enriched_id("ith-events", str(i)) for i in copied}
+        self.searches = 0
+        self.closed = False
+
+    def open_point_in_time(self, index, keep_alive):
+        return {"id": "pit-1"}
+
+    def close_point_in_time(self, id):
+        self.closed = True
+
+    def search(self, body, index=None):
+        self.searches += 1
+        assert index is None and body["pit"]["id"] == "pit-1"
+        start = body["search_after"][0] + 1 if "search_after" in body else 0
+        return {"pit_id": "pit-1", "hits": {"hits": self.hits[start:start + body["size"]]}}
+
+    def mget(self, index, ids, source):
+        return {"docs": [{"_id": i, "found": i in self.copied} for i in ids]}
+
+
+def test_copy_mode_pages_past_copied_events(monkeypatch):
+    es = FakeES(7000, copied=range(4500))
+    monkeypatch.setattr(twin, "ENRICH_IN_PLACE", False)
+    monkeypatch.setattr(twin, "get_es", lambda: es)
+    hits = twin.search_unenriched_since(60, limit=2000)
+    assert [h["_id"] for h in hits] == [str(i) for i in range(4500, 6500)]
+    assert es.searches == 4 and es.closed
+
+
+def test_copy_mode_stops_at_window_end(monkeypatch):
+    es = FakeES(2500, copied=range(0, 2500, 2))
+    monkeypatch.setattr(twin, "ENRICH_IN_PLACE", False)
+    monkeypatch.setattr(twin, "get_es", lambda: es)
+    hits = twin.search_unenriched_since(60, limit=2000)
+    assert [h["_id"] for h in hits] == [str(i) for i in range(1, 2500, 2)]
+    assert es.searches == 2
@@ -0,0 +1,44 @@
+import main as twin
+
+# dynamically mapped string fields are text; only their .keyword sub-field has doc values
+TEXT_FIELDS = {"source.geo.country", "user_agent.family", "event.outcome"}
+
+
+def _fields(runtime):
+    return {name: rf["script"].get("params", {}).get("fields", []) for name, rf in runtime.items()}
+
+
+def test_runtime_fields_list_no_text_fields():
+    for name, fields in _fields(twin.agg_runtime()).items():
+        assert not TEXT_FIELDS & set(fields), name
+
+
+def test_usable_set_limits_candidates():
+    usable = {"src.geo.country", "source.asn", "event.outcome.keyword"}
+    fields = _fields(twin.agg_runtime(usable))
+    assert fields["ith_country"] == ["src.geo.country"]
+    assert fields["ith_asn"] == ["source.asn"]
+    assert fields["ith_fail"] == ["event.outcome.keyword"]
+    assert fields["ith_ua"] == [] and fields["ith_lat"] == []
+    assert "ith_hour" in fields and "ith_weekday" in fields
+
+
+def test_profile_agg_body_uses_given_runtime():
+    rt = twin.agg_runtime(set())
+    assert twin.profile_agg_body(60, runtime=rt)["runtime_mappings"] is rt
+    assert twin.profile_agg_body(60)["runtime_mappings"] is twin._AGG_RUNTIME
+
+
+def test_aggregatable_fields_drops_fields_text_in_any_index(monkeypatch):
+    caps = {"fields": {
+        "src.geo.country": {"keyword": {"aggregatable": True}, "text": {"aggregatable": False}},
+        "src.geo.country.keyword": {"keyword": {"aggregatable": True}},
+        "source.asn": {"long": {"aggregatable": True}},
+    }}
+
+    class ES:
+        def field_caps(self, **kw):
+            return caps
+
+    monkeypatch.setattr(twin, "get_es", lambda: ES())
+    assert twin.aggregatable_fields() == {"src.geo.country.keyword", "source.asn"}
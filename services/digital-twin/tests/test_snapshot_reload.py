@@ -0,0 +1,34 @@
+import os
+
+import main as twin
+import snapshot
+
+
+def _profile(uid, fail):
+    return {"user_id": uid, "updated_at": "2025-01-01T00:00:00Z", "auth": {"fail_ratio": fail}}
+
+
+def test_scoring_chain_reopens_replaced_files(tmp_path, monkeypatch):
+    path = str(tmp_path / "base.prf")
+    snapshot.write_snapshot(path, [_profile("alice", 0.25)])
+    monkeypatch.setattr(twin, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(twin, "PROFILE_SNAPSHOT", "base.prf")
+    monkeypatch.setattr(twin, "PROFILE_SNAPSHOT_CHECK_S", 0)
+    monkeypatch.setattr(twin, "_scoring", None)
+    assert twin.scoring_profiles(["alice"])["alice"]["auth"]["fail_ratio"] == 0.25
+
+    # a compaction replaces the file atomically
+    snapshot.write_snapshot(path, [_profile("alice", 0.5), _profile("bob", 0.0)])
+    got = twin.scoring_profiles(["alice", "bob"])
+    assert got["alice"]["auth"]["fail_ratio"] == 0.5 and "bob" in got
+
+
+def test_unreadable_replacement_keeps_the_mapped_chain(tmp_path):
+    path = str(tmp_path / "base.prf")
+    snapshot.write_snapshot(path, [_profile("alice", 0.25)])
+    w = snapshot.WatchedChain(path, check_interval=0)
+    first = w.get()
+    with open(path + ".tmp", "wb") as f:
+        f.write(b"garbage")
+    os.replace(path + ".tmp", path)
+    assert w.get() is first and w.get().get("alice") is not None
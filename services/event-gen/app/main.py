@@ -1,4 +1,5 @@
 import os
+import importlib.util
 from fastapi import FastAPI
 
 app = FastAPI(
@@ -7,16 +8,17 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Try to mount scenarios only if it truly exists
-try:
-    from app.routes import scenarios  # may not exist in your tree
+# Mount scenarios only if it truly exists; find_spec checks the filesystem
+# without executing a failing import on every cold start.
+if importlib.util.find_spec("app.routes.scenarios") is not None:
     try:
+        from app.routes import scenarios
         app.include_router(scenarios.router)
         print("ROUTER >> mounted scenarios router")
     except Exception as e:
         print("ROUTER >> failed to mount scenarios:", repr(e))
-except Exception as e:
-    print("ROUTER >> no scenarios router, skipping:", repr(e))
+else:
+    print("ROUTER >> no scenarios router, skipping")
 
 # Mount honey when enabled
 if os.getenv("HONEY_ENABLED", "false").lower() == "true":
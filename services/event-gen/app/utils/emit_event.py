@@ -1,10 +1,20 @@
 from datetime import datetime, timezone
+import json
 import os
-import requests
+import zlib
 
 ELASTIC_INGEST_URL = os.getenv("INGESTOR_URL", "http://ingestor:8080/ingest")
+# gzip bodies of at least this many bytes (the ingestor inflates them); 0 turns it off
+INGEST_COMPRESS_MIN_BYTES = int(os.getenv("INGEST_COMPRESS_MIN_BYTES", "512"))
+
+_compress = INGEST_COMPRESS_MIN_BYTES > 0
+
+def _gzip(data: bytes) -> bytes:
+    c = zlib.compressobj(1, zlib.DEFLATED, 31)
+    return c.compress(data) + c.flush()
 
 def emit_event(evt: dict) -> None:
+    global _compress
     payload = {
         "@timestamp": datetime.now(timezone.utc).isoformat(),
         "product": "ith",
@@ -12,7 +22,19 @@ def emit_event(evt: dict) -> None:
         **evt,
     }
     try:
-        requests.post(ELASTIC_INGEST_URL, json=payload, timeout=5)
+        import requests  # deferred: only the honey routes emit, keep it off the cold-start path
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        headers = {"Content-Type": "application/json"}
+        if _compress and len(body) >= INGEST_COMPRESS_MIN_BYTES:
+            r = requests.post(ELASTIC_INGEST_URL, data=_gzip(body), timeout=5,
+                              headers={**headers, "Content-Encoding": "gzip"})
+            if r.status_code not in (400, 415):
+                return
+        r = requests.post(ELASTIC_INGEST_URL, data=body, headers=headers, timeout=5)
+        if _compress and r.ok and len(body) >= INGEST_COMPRESS_MIN_BYTES:
+            # the gzip body was refused (415) or unreadable (400, an ingestor without
+            # the decompression middleware) but the plain one went through
+            _compress = False
     except Exception:
         # Do not fail demo flows
         pass
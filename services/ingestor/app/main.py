@@ -1,7 +1,21 @@
-import os, json, re, logging, httpx
+import os, re, logging, threading, httpx
+from functools import lru_cache
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from datetime import datetime, timezone
+from app.utils.iprep import get_reputation
+from app.utils import metrics
+from app.utils.metrics import stage
+from app.utils.profiling import install_debug_routes
+from app.utils.normalize import Event, normalize
+from app.utils import codec
+from app.utils.compress import BodyEncoder, DecompressMiddleware
+from app.utils.prompt import TRIAGE_INSTRUCTIONS, build_prompt
+from app.utils import spool
+from app.utils.es_bulk import BulkHTTP
+from app.utils.es_target import WriteTarget
+from app.utils.resilience import BreakerOpen, ModelGuard, fake_model_from_env
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 log = logging.getLogger("ingestor")
@@ -24,6 +38,7 @@ VERTEX_LOCATION = env("VERTEX_LOCATION", default="us-east4")
 GCP_PROJECT     = env("GCP_PROJECT", default="ith-koushik-hackathon")
 
 app = FastAPI()
+app.add_middleware(DecompressMiddleware)  # Content-Encoding gzip/zstd bodies on /ingest
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*","http://localhost:5173"],
@@ -31,34 +46,37 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+install_debug_routes(app)
+
+_EVENTS = metrics.counter("ith_events_total", "Events processed by /ingest", ["outcome"])
 
 @app.get("/health")
 def health():
     return {
         "status": "ok",
         "indexes": {"events": INDEX_EVENTS, "qg": INDEX_QG, "dual": DUAL_WRITE},
-        "vertex": {"model": VERTEX_MODEL, "location": VERTEX_LOCATION, "project": GCP_PROJECT},
+        "vertex": {"model": VERTEX_MODEL, "location": VERTEX_LOCATION, "project": GCP_PROJECT, **_GUARD.status()},
         "elastic_url_set": bool(ELASTIC_URL),
         "elastic_key_set": bool(ELASTIC_API_KEY)
     }
 
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 def vertex_prompt(e, rule_name):
-    return (
-        "You are a cybersecurity analyst. Produce STRICT JSON only (no code fences) with keys: "
-        "title, description, severity, confidence, category, findings (array of {title,detail,indicator}), "
-        "recommended_actions (array). "
-        f"rule_name: {rule_name}\n"
-        f"event_json: {json.dumps(e, ensure_ascii=False)}"
-    )
+    # Selected identity fields under a token budget; see app/utils/prompt.py
+    return build_prompt(TRIAGE_INSTRUCTIONS, e, rule_name=rule_name)
 
 def _extract_json(s):
     try:
-        return json.loads(s)
+        return codec.loads(s)
     except:
         m = re.search(r"\{.*\}", s, re.S)
         if m:
             try:
-                return json.loads(m.group(0))
+                return codec.loads(m.group(0))
             except:
                 return {}
         return {}
@@ -101,19 +119,87 @@ def _normalize_confidence(val, default=0.6):
         pass
     return default
 
-def call_vertex(text):
+@lru_cache(maxsize=1)
+def _vertex_model():
+    fake = fake_model_from_env()  # AI_FAKE_MODEL: local latency/error injection
+    if fake is not None:
+        return fake
+    from vertexai import init
+    from vertexai.generative_models import GenerativeModel
+    init(project=GCP_PROJECT, location=VERTEX_LOCATION)
+    return GenerativeModel(VERTEX_MODEL)
+
+# Event index layout (ES_WRITE_MODE): data stream / write alias / plain index.
+# Writes always use op_type=create against the one name.
+_target = WriteTarget(ELASTIC_URL, ELASTIC_API_KEY, INDEX_EVENTS) if ELASTIC_URL and ELASTIC_API_KEY else None
+
+@app.on_event("startup")
+def _start_target():
+    if _target:
+        _target.start()
+
+@app.on_event("shutdown")
+def _stop_target():
+    if _target:
+        _target.stop()
+
+@app.get("/es_target")
+def es_target_status():
+    return _target.status() if _target else {"enabled": False}
+
+# Optional durable spool (SPOOL_DIR): ack after fsync, ship to Elastic in bulk.
+_drainer = None
+
+@app.on_event("startup")
+def _start_spool():
+    global _drainer
+    if spool.SPOOL_DIR and ELASTIC_URL and ELASTIC_API_KEY:
+        _drainer = spool.open_from_env(BulkHTTP(ELASTIC_URL, ELASTIC_API_KEY, op="create").ship)
+        metrics.gauge("ith_queue_depth", "Items waiting in internal queues", ["queue"]).labels("spool").set_function(
+            lambda: _drainer.spool.backlog_records)
+
+@app.on_event("shutdown")
+def _stop_spool():
+    if _drainer:
+        _drainer.stop()
+        _drainer.spool.close()
+
+@app.get("/spool")
+def spool_status():
+    return _drainer.status() if _drainer else {"enabled": False}
+
+@app.on_event("startup")
+def _warm_in_background():
+    # Import/init the Vertex SDK off the request path once the port is bound.
+    def _warm():
+        try:
+            _vertex_model()
+            get_reputation()
+        except Exception as e:
+            log.warning("warm-up failed: %s", e)
+    threading.Thread(target=_warm, name="warmup", daemon=True).start()
+
+# Deadline, circuit breaker and optional hedging for the model call
+_GUARD = ModelGuard()
+
+# Rules whose events get a hedged model call
+_HEDGED_RULES = {"ITH - Honey Identity Probe", "ITH - Privilege Escalation"}
+
+async def call_vertex(text, hedge=False):
     try:
-        from vertexai import init
-        from vertexai.generative_models import GenerativeModel
-        init(project=GCP_PROJECT, location=VERTEX_LOCATION)
-        model = GenerativeModel(VERTEX_MODEL)
-        resp = model.generate_content(text, generation_config={"temperature":0.2,"max_output_tokens":2048})
+        model = _vertex_model()
+        resp = await _GUARD.call(model.generate_content, text, hedge=hedge,
+                                 generation_config={"temperature":0.2,"max_output_tokens":2048})
         raw = _parts_text(resp).strip()
         if not raw:
             raise ValueError("Empty Vertex response")
     except Exception as e:
         err = f"VertexAI error: {e}"
-        log.error(err, exc_info=True)
+        if isinstance(e, BreakerOpen):
+            log.warning(err)
+        else:
+            log.error(err, exc_info=True)
+        metrics.STAGE_ERRORS.labels("ai").inc()
         return {
             "title": "Analysis Error",
             "description": err,
@@ -162,6 +248,21 @@ _RULE_BY_TYPE = {
     "failure": "ITH - MFA Bypass Attempt"
 }
 
+# rule -> (event.action, event.type) defaults when the producer sent neither
+_ACTION_TYPE_BY_RULE = {
+    "ITH - Honey Identity Probe": ("honeypot_access","access"),
+    "ITH - Credential Stuffing": ("password_guess","denied"),
+    "ITH - MFA Bypass Attempt": ("mfa_bypass","failure"),
+    "ITH - AI Enriched Login": ("login","start"),
+    "ITH - Impossible Travel": ("impossible_travel","info"),
+    "ITH - Suspicious Token Use": ("token_anomaly","info"),
+    "ITH - Geo Velocity Spike": ("geo_velocity","info"),
+    "ITH - Privilege Escalation": ("privilege_escalation","info"),
+    "ITH - Shared Account Usage": ("shared_account","info"),
+    "ITH - Suspicious Process Execution": ("suspicious_process","info"),
+    "ITH - Lateral Movement": ("lateral_movement","info")
+}
+
 def _map_from_text(text: str) -> str:
     t = (text or "").lower()
     if not t:
@@ -186,27 +287,36 @@ def _map_from_text(text: str) -> str:
         return "ITH - Shared Account Usage"
     return "ITH - Unknown"
 
-def infer_rule_name_initial(payload: dict, event: dict) -> str:
+def infer_rule_name_initial(payload: dict, event: Event) -> str:
+    raw = event.raw
     for k in ("rule_name","rule.name","raw.rule.name","detection","ui_rule","ith.rule"):
-        v = payload.get(k) or event.get(k)
+        v = payload.get(k) or raw.get(k)
         if isinstance(v, str) and v.strip():
             return v.strip()
-    scen = event.get("ith.scenario") or event.get("scenario") or payload.get("ith.scenario")
+    if isinstance(event.rule_name, str) and event.rule_name.strip():
+        return event.rule_name.strip()
+    scen = event.scenario or raw.get("scenario") or payload.get("ith.scenario")
     if isinstance(scen, str) and scen.strip():
         return f"ITH - {scen.strip()}" if not scen.lower().startswith("ith -") else scen.strip()
-    act = event.get("event.action") or event.get("action")
+    act = event.event_action
     if isinstance(act, str) and act.strip().lower() in _RULE_BY_ACTION:
         return _RULE_BY_ACTION[act.strip().lower()]
-    typ = event.get("event.type") or event.get("type")
+    typ = event.event_type
     if isinstance(typ, str) and typ.strip().lower() in _RULE_BY_TYPE:
         return _RULE_BY_TYPE[typ.strip().lower()]
     return "ITH - Unknown"
 
+_ES_BODY = BodyEncoder()
+
 async def write_elastic(doc, index_name):
     headers = {"Authorization":f"ApiKey {ELASTIC_API_KEY}","Content-Type":"application/json"}
-    url = f"{ELASTIC_URL.rstrip('/')}/{index_name}/_doc"
+    url = f"{ELASTIC_URL.rstrip('/')}/{index_name}/_doc?op_type=create"
+    body = codec.dumps(doc)
+    data, extra = _ES_BODY.encode(body)
     async with httpx.AsyncClient(timeout=20) as c:
-        r = await c.post(url, headers=headers, json=doc)
+        r = await c.post(url, headers={**headers, **extra}, content=data)
+        if extra and _ES_BODY.refused(r.status_code, body):
+            r = await c.post(url, headers=headers, content=body)
         if r.is_error:
             log.error("Elastic write failed %s %s -> %s", index_name, r.status_code, r.text)
             r.raise_for_status()
@@ -216,53 +326,45 @@ async def ingest(req: Request):
     try:
         if not ELASTIC_URL or not ELASTIC_API_KEY:
             return {"ok": False, "error": "Missing ELASTIC_URL/ELASTIC_API_KEY (or ELASTIC_CLOUD_URL/ELASTIC_CLOUD_API_KEY)"}
-        p = await req.json()
+        with stage("parse"):
+            p = await codec.read_json(req)
         e = p.get("event",{}) or {}
-        rule_name = infer_rule_name_initial(p, e)
-        ai = call_vertex(vertex_prompt(e, rule_name))
+        with stage("normalize"):
+            n = normalize(e)
+        rule_name = infer_rule_name_initial(p, n)
+        with stage("ai"):
+            ai = await call_vertex(vertex_prompt(n, rule_name), hedge=rule_name in _HEDGED_RULES)
         if rule_name == "ITH - Unknown":
             rule_name = _map_from_text(ai.get("title") or "")
-        user_name  = e.get("user.name") or e.get("user",{}).get("name")
-        event_act  = e.get("event.action") or e.get("event",{}).get("action")
-        event_type = e.get("event.type")   or e.get("event",{}).get("type")
-        if not event_act or not event_type:
-            rm = {
-                "ITH - Honey Identity Probe": ("honeypot_access","access"),
-                "ITH - Credential Stuffing": ("password_guess","denied"),
-                "ITH - MFA Bypass Attempt": ("mfa_bypass","failure"),
-                "ITH - AI Enriched Login": ("login","start"),
-                "ITH - Impossible Travel": ("impossible_travel","info"),
-                "ITH - Suspicious Token Use": ("token_anomaly","info"),
-                "ITH - Geo Velocity Spike": ("geo_velocity","info"),
-                "ITH - Privilege Escalation": ("privilege_escalation","info"),
-                "ITH - Shared Account Usage": ("shared_account","info"),
-                "ITH - Suspicious Process Execution": ("suspicious_process","info"),
-                "ITH - Lateral Movement": ("lateral_movement","info")
-            }
-            if rule_name in rm:
-                da, dt = rm[rule_name]
-                event_act = event_act or da
-                event_type = event_type or dt
-        src_ip     = e.get("source.ip")    or e.get("source",{}).get("ip")
-        dst_ip     = e.get("destination.ip") or e.get("destination",{}).get("ip")
-        geo_src    = e.get("geo.src")      or e.get("geo",{}).get("src")
-        geo_prev   = e.get("geo.prev")     or e.get("geo",{}).get("prev")
+        user_name  = n.user_name
+        event_act  = n.event_action
+        event_type = n.event_type
+        if (not event_act or not event_type) and rule_name in _ACTION_TYPE_BY_RULE:
+            da, dt = _ACTION_TYPE_BY_RULE[rule_name]
+            event_act = event_act or da
+            event_type = event_type or dt
+        src_ip     = n.source_ip
+        try:
+            reputation = get_reputation().lookup(src_ip, n.source_asn)
+        except Exception as ex:
+            log.warning("reputation lookup failed: %s", ex)
+            reputation = None
         now_iso = datetime.now(timezone.utc).isoformat()
-        scenario = e.get("ith.scenario") or ai.get("title") or rule_name
+        scenario = n.scenario or ai.get("title") or rule_name
         doc = {
             "@timestamp": now_iso,
             "event": {
-                "category": e.get("event.category","authentication"),
+                "category": n.get("event_category", "authentication"),
                 "action": event_act or "unknown",
                 "type": event_type or "info",
-                "outcome": e.get("event.outcome","unknown"),
+                "outcome": n.get("event_outcome", "unknown"),
                 "time": now_iso
             },
             "rule": {"name": rule_name},
             "user": {"name": user_name},
-            "source": {"ip": src_ip},
-            "destination": {"ip": dst_ip},
-            "geo": {"src": geo_src, "prev": geo_prev},
+            "source": {"ip": src_ip, **({"reputation": reputation} if reputation else {})},
+            "destination": {"ip": n.destination_ip},
+            "geo": {"src": n.geo_src, "prev": n.geo_prev},
             "raw": {
                 "rule": {"name": rule_name},
                 "event": {"action": event_act or "unknown", "type": event_type or "info"},
@@ -281,10 +383,22 @@ async def ingest(req: Request):
             },
             "raw_event": e
         }
-        await write_elastic(doc, INDEX_EVENTS)
-        if DUAL_WRITE:
-            await write_elastic(doc, INDEX_QG)
+        if _drainer:
+            records = [spool.encode_item(INDEX_EVENTS, doc)]
+            if DUAL_WRITE:
+                records.append(spool.encode_item(INDEX_QG, doc))
+            with stage("spool"):
+                durable = await _drainer.spool.append_durable(*records, timeout=spool.SPOOL_ACK_TIMEOUT)
+            _EVENTS.labels("ok").inc()
+            # not yet durable: spooled and will ship, but not fsynced within SPOOL_ACK_TIMEOUT
+            return {"ok": True, "spooled": True, "durable": durable}
+        with stage("index"):
+            await write_elastic(doc, INDEX_EVENTS)
+            if DUAL_WRITE:
+                await write_elastic(doc, INDEX_QG)
+        _EVENTS.labels("ok").inc()
         return {"ok": True}
     except Exception as ex:
         log.exception("Ingest failed")
+        _EVENTS.labels("error").inc()
         return {"ok": False, "error": str(ex)}
@@ -0,0 +1,119 @@
+"""
+Risk-gated, tiered AI enrichment.
+
+Each event gets a tier from its compute_risk score and reasons:
+
+    critical  honeypot / canary hits and AI_ALWAYS_REASONS (privilege_escalation)
+    high      score >= AI_HIGH_RISK
+    medium    score >= AI_MEDIUM_RISK
+    low       everything else (routine logins)
+
+critical always calls the model. low is sampled at AI_LOW_SAMPLE_RATE. While
+model calls are queued or in flight, each lower tier stops calling the model
+once the backlog reaches its share of AI_MAX_INFLIGHT (high 100%, medium 50%,
+low 25%). Events that skip the model get a deterministic template summary
+built from the risk reasons. ``ith_ai_decisions_total{tier,decision}`` counts
+model / sampled_out / shed per tier.
+"""
+import os
+import random
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from app.utils import metrics
+from app.utils.normalize import Event
+
+AI_HIGH_RISK = float(os.getenv("AI_HIGH_RISK", "0.6"))
+AI_MEDIUM_RISK = float(os.getenv("AI_MEDIUM_RISK", "0.3"))
+AI_LOW_SAMPLE_RATE = float(os.getenv("AI_LOW_SAMPLE_RATE", "0.01"))
+AI_MAX_INFLIGHT = int(os.getenv("AI_MAX_INFLIGHT", "16"))
+AI_ALWAYS_REASONS = frozenset(
+    r.strip() for r in os.getenv("AI_ALWAYS_REASONS", "privilege_escalation").split(",") if r.strip()
+)
+
+TIERS = ("critical", "high", "medium", "low")
+# Fraction of AI_MAX_INFLIGHT at which a tier falls back to the template.
+_SHED_AT: Dict[str, Optional[float]] = {"critical": None, "high": 1.0, "medium": 0.5, "low": 0.25}
+
+_DECISIONS = metrics.counter("ith_ai_decisions_total", "AI enrichment decisions per risk tier", ["tier", "decision"])
+
+_REASON_TEXT = {
+    "impossible_travel": "impossible travel since the previous login",
+    "asn_change": "login from a new ASN",
+    "mfa_bypass": "login without MFA within an hour of an MFA login",
+    "brute_force": "10+ failed logins in 5 minutes",
+    "credential_stuffing": "10+ accounts tried from the same IP in 5 minutes",
+    "shared_account": "account used from several devices within an hour",
+    "lateral_movement": "device used by several accounts within an hour",
+    "privilege_escalation": "role changed to admin",
+    "honeypot": "interaction with a honey identity",
+}
+
+
+def split_reasons(reasons: Optional[str]) -> list:
+    return [r for r in (reasons or "").split(";") if r and r != "none"]
+
+
+def is_honey(doc: Dict) -> bool:
+    tags = doc.get("tags") or ()
+    return "honey" in tags or (doc.get("event") or {}).get("category") == "honeypot"
+
+
+def tier_of(score: float, reasons: Optional[str], honey: bool = False) -> str:
+    if honey or not AI_ALWAYS_REASONS.isdisjoint(split_reasons(reasons)):
+        return "critical"
+    if score >= AI_HIGH_RISK:
+        return "high"
+    if score >= AI_MEDIUM_RISK:
+        return "medium"
+    return "low"
+
+
+class Policy:
+    """Tier decisions plus the count of model calls queued or in flight."""
+
+    def __init__(self, max_inflight: int = AI_MAX_INFLIGHT, low_sample_rate: float = AI_LOW_SAMPLE_RATE):
+        self.max_inflight = max(1, max_inflight)
+        self.low_sample_rate = low_sample_rate
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def decide(self, tier: str) -> str:
+        """"model", "sampled_out" or "shed"; counted per tier."""
+        shed_at = _SHED_AT[tier]
+        if tier == "low" and random.random() >= self.low_sample_rate:
+            decision = "sampled_out"
+        elif shed_at is not None and self.inflight >= shed_at * self.max_inflight:
+            decision = "shed"
+        else:
+            decision = "model"
+        _DECISIONS.labels(tier, decision).inc()
+        return decision
+
+    @contextmanager
+    def slot(self):
+        """Hold one place in the model backlog (enter before queuing the call)."""
+        with self._lock:
+            self.inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+
+def template_summary(e: Event, score: float, reasons: Optional[str], honey: bool = False) -> Dict:
+    """Deterministic stand-in for the model's summary and scenario."""
+    rs = split_reasons(reasons)
+    if honey:
+        rs = ["honeypot"] + rs
+    who = e.user_name or e.user_id or "unknown user"
+    what = e.event_action or "event"
+    where = f" from {e.source_ip}" if e.source_ip else ""
+    if rs:
+        text = "; ".join(_REASON_TEXT.get(r, r.replace("_", " ")) for r in rs)
+        summary = f"{who} {what}{where}: {text} (risk {score:.2f})."
+    else:
+        summary = f"{who} {what}{where}: no risk indicators."
+    return {"summary": summary, "scenario": rs[0] if rs else "routine"}
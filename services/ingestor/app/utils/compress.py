@@ -0,0 +1,191 @@
+"""
+Compressed HTTP bodies in both directions.
+
+Inbound: ``DecompressMiddleware`` (pure ASGI) inflates request bodies that
+carry ``Content-Encoding: gzip`` / ``deflate`` / ``zstd`` before the route
+sees them, so ``/ingest`` and friends keep calling ``codec.read_json``.
+zstd needs the optional ``zstandard`` package. An encoding we cannot
+decode gets a 415 listing the ones we can in ``Accept-Encoding`` (RFC
+7694), which is the hint clients use to fall back to plain bodies. A
+corrupt body gets a 400, and one that inflates past MAX_INFLATED_BYTES gets
+a 413.
+
+Outbound: ``BodyEncoder`` gzips request bodies to Elastic (``_bulk`` and
+``_doc``; Elasticsearch decodes gzip request bodies, zstd it does not).
+Bodies under COMPRESS_MIN_BYTES go out as they are. If the peer answers a
+compressed body with 415, the caller re-sends it plain and the encoder
+stays off for that peer from then on.
+
+    enc = BodyEncoder()
+    data, extra = enc.encode(body)              # extra: {"Content-Encoding": "gzip"} or {}
+    r = post(content=data, headers={**headers, **extra})
+    if extra and enc.refused(r.status_code, body):
+        r = post(content=body, headers=headers)
+
+Clients built with elasticsearch-py get the same through
+``http_compress`` (codec.es_client_kwargs, ES_HTTP_COMPRESS).
+"""
+import io
+import logging
+import os
+import zlib
+from typing import Dict, Optional, Tuple
+
+from app.utils import metrics
+from app.utils.codec import ES_HTTP_COMPRESS
+
+try:
+    import zstandard
+except ImportError:  # gzip/deflate only
+    zstandard = None
+
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "1"))
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+MAX_INFLATED_BYTES = int(os.getenv("MAX_INFLATED_BYTES", str(32 * 1024 * 1024)))
+
+ENCODINGS = ("gzip", "x-gzip", "deflate") + (("zstd",) if zstandard is not None else ())
+REFUSED_STATUSES = frozenset({415})
+
+log = logging.getLogger("ith-compress")
+
+# hop: ingest (inbound requests) / elastic (outbound bodies); form: wire / raw
+_BYTES = metrics.counter("ith_body_bytes_total", "Request body bytes as sent on the wire and uncompressed",
+                         ["hop", "form"])
+_REFUSED = metrics.counter("ith_compress_refused_total", "Compressed bodies refused by a peer (re-sent plain)")
+
+
+class BodyError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+# --------------------
+# Codecs
+# --------------------
+def gzip_bytes(data: bytes, level: int = COMPRESS_LEVEL) -> bytes:
+    # zlib with a gzip header: same output as gzip.compress without the GzipFile wrapper
+    c = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return c.compress(data) + c.flush()
+
+
+def decode(data: bytes, encoding: str, limit: int = MAX_INFLATED_BYTES) -> bytes:
+    """Inflate ``data``; BodyError 415 / 400 / 413 for unknown, corrupt or oversized bodies."""
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return data
+    if encoding not in ENCODINGS:
+        raise BodyError(415, f"unsupported Content-Encoding: {encoding}")
+    try:
+        if encoding == "zstd":
+            out = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read(limit + 1)
+        else:
+            # 47: auto-detect gzip or zlib header; 15 would reject raw gzip sent as "deflate"
+            d = zlib.decompressobj(47)
+            out = d.decompress(data, limit + 1)
+            if len(out) <= limit and not d.eof:
+                raise BodyError(400, f"truncated {encoding} body")
+    except BodyError:
+        raise
+    except Exception as e:  # zlib.error / zstandard.ZstdError
+        raise BodyError(400, f"invalid {encoding} body: {e}")
+    if len(out) > limit:
+        raise BodyError(413, f"body inflates past {limit} bytes")
+    return out
+
+
+# --------------------
+# Inbound
+# --------------------
+class DecompressMiddleware:
+    """Pure-ASGI middleware that inflates compressed request bodies."""
+
+    def __init__(self, app, limit: int = MAX_INFLATED_BYTES):
+        self.app = app
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = None
+        for k, v in scope["headers"]:
+            if k == b"content-encoding":
+                encoding = v.decode("latin-1")
+                break
+        if encoding is None or encoding.strip().lower() in ("", "identity"):
+            return await self.app(scope, receive, send)
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        raw = b"".join(chunks)
+        try:
+            body = decode(raw, encoding, self.limit)
+        except BodyError as e:
+            return await _reject(send, e)
+        _BYTES.labels("ingest", "wire").inc(len(raw))
+        _BYTES.labels("ingest", "raw").inc(len(body))
+
+        headers = [(k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")]
+        headers.append((b"content-length", str(len(body)).encode()))
+        sent = False
+
+        async def _receive():
+            nonlocal sent
+            if sent:
+                return await receive()  # disconnect
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(dict(scope, headers=headers), _receive, send)
+
+
+async def _reject(send, e: BodyError) -> None:
+    payload = ('{"error":"%s"}' % e.detail.replace('"', "'")).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+    if e.status == 415:
+        headers.append((b"accept-encoding", ", ".join(ENCODINGS).encode()))
+    await send({"type": "http.response.start", "status": e.status, "headers": headers})
+    await send({"type": "http.response.body", "body": payload})
+
+
+# --------------------
+# Outbound
+# --------------------
+class BodyEncoder:
+    """gzip for request bodies to one peer, switched off for good once the peer answers 415."""
+
+    def __init__(self, enabled: bool = ES_HTTP_COMPRESS, level: int = COMPRESS_LEVEL,
+                 min_bytes: int = COMPRESS_MIN_BYTES, hop: str = "elastic"):
+        self.enabled = enabled
+        self.level = level
+        self.min_bytes = min_bytes
+        self._wire = _BYTES.labels(hop, "wire")
+        self._raw = _BYTES.labels(hop, "raw")
+
+    def encode(self, body: bytes) -> Tuple[bytes, Dict[str, str]]:
+        self._raw.inc(len(body))
+        if not self.enabled or len(body) < self.min_bytes:
+            self._wire.inc(len(body))
+            return body, {}
+        data = gzip_bytes(body, self.level)
+        self._wire.inc(len(data))
+        return data, {"Content-Encoding": "gzip"}
+
+    def refused(self, status: int, body: Optional[bytes] = None) -> bool:
+        """True when ``status`` means the peer cannot read gzip; the caller re-sends plain."""
+        if status not in REFUSED_STATUSES:
+            return False
+        if self.enabled:
+            self.enabled = False
+            log.warning("peer answered %d to a gzip body; sending uncompressed from now on", status)
+        _REFUSED.inc()
+        if body is not None:
+            self._wire.inc(len(body))
+        return True
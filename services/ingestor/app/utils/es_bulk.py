@@ -0,0 +1,104 @@
+"""
+Helpers for Elasticsearch ``_bulk`` requests shared by the ingest paths.
+
+``ship`` callables used by the spool drainer take a list of ``(index, doc)``
+items and return one HTTP-style status per item; transport failures and
+whole-request 429/5xx are raised as RetryableError so the caller can back
+off without dropping anything.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.utils.codec import bulk_action, bulk_action_with_id, dumps
+from app.utils.compress import BodyEncoder
+from app.utils.es_target import auth_header
+
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class RetryableError(Exception):
+    pass
+
+
+def bulk_operations(items: Iterable[Tuple[str, Dict[str, Any]]], op: str = "index") -> List[Dict[str, Any]]:
+    ops: List[Dict[str, Any]] = []
+    for index, doc in items:
+        ops.append({op: {"_index": index}})
+        ops.append(doc)
+    return ops
+
+
+def bulk_body(items: Iterable[Tuple[str, Dict[str, Any]]], op: str = "index") -> bytes:
+    """NDJSON _bulk body; action lines come pre-encoded from the per-index cache.
+
+    Event writers pass ``op="create"``: it appends with an auto id exactly like
+    ``index`` on a plain index, and it is the only op data streams accept.
+    """
+    return b"".join(bulk_action(index, op) + dumps(doc) + b"\n" for index, doc in items)
+
+
+def bulk_body_with_ids(items: Iterable[Tuple[str, str, Dict[str, Any]]], op: str = "index") -> bytes:
+    """NDJSON _bulk body for ``(index, _id, doc)`` items; re-sending it is idempotent."""
+    return b"".join(bulk_action_with_id(index, doc_id, op) + dumps(doc) + b"\n" for index, doc_id, doc in items)
+
+
+def item_statuses(resp: Dict[str, Any], n: int) -> List[int]:
+    """Per-item status from a _bulk response body (200 for every item if errors=false)."""
+    items = resp.get("items") or []
+    if not resp.get("errors") and len(items) == n:
+        return [200] * n
+    out = []
+    for it in items:
+        body = next(iter(it.values()), {}) if isinstance(it, dict) else {}
+        out.append(int(body.get("status", 500)))
+    out.extend([500] * (n - len(out)))
+    return out
+
+
+class BulkHTTP:
+    """Synchronous _bulk sender over a pooled httpx client (one per drainer thread).
+
+    Bodies go out gzipped (ES_HTTP_COMPRESS); a 415 re-sends the batch plain
+    and keeps this sender uncompressed.
+    """
+
+    def __init__(self, url: str, api_key: str, timeout: float = 30.0, op: str = "index",
+                 encoder: Optional[BodyEncoder] = None):
+        import httpx  # only the drainer thread needs it
+        self.url = url.rstrip("/") + "/_bulk"
+        self.headers = {"Authorization": auth_header(api_key), "Content-Type": "application/x-ndjson"}
+        self.op = op
+        self.encoder = encoder or BodyEncoder()
+        self._client = httpx.Client(timeout=timeout)
+
+    def ship(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        import httpx
+        body = bulk_body(items, self.op)
+        data, extra = self.encoder.encode(body)
+        try:
+            r = self._client.post(self.url, headers={**self.headers, **extra}, content=data)
+            if extra and self.encoder.refused(r.status_code, body):
+                r = self._client.post(self.url, headers=self.headers, content=body)
+        except httpx.HTTPError as e:
+            raise RetryableError(f"bulk transport error: {e}")
+        if r.status_code in RETRYABLE_STATUSES:
+            raise RetryableError(f"bulk HTTP {r.status_code}")
+        if r.is_error:
+            return [r.status_code] * len(items)
+        try:
+            return item_statuses(r.json(), len(items))
+        except ValueError as e:  # cut-off or non-JSON reply: the outcome is unknown, re-ship
+            raise RetryableError(f"bulk response unreadable: {e}")
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def status_of(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an elasticsearch-py / httpx exception, if any."""
+    for attr in ("status_code", "status"):
+        v = getattr(exc, attr, None)
+        if isinstance(v, int):
+            return v
+    meta = getattr(exc, "meta", None)
+    v = getattr(meta, "status", None)
+    return v if isinstance(v, int) else None
@@ -0,0 +1,210 @@
+"""
+Where event writers send documents: a data stream, a rolling index behind
+a write alias, or (the old behaviour) one fixed index.
+
+    ES_WRITE_MODE=datastream   ith-events is a data stream; Elastic rolls its
+                               backing indices (.ds-ith-events-*)
+    ES_WRITE_MODE=alias        ith-events is a write alias over ith-events-000001,
+                               ith-events-000002, ...
+    ES_WRITE_MODE=index        ith-events is a plain index (default, no setup)
+
+Writers keep using the one name (ELASTIC_INDEX) with ``create`` bulk items.
+Appends never overwrite, and data streams accept nothing else. A rollover
+just moves the name to a new backing index, so writers never notice it.
+
+``bootstrap()`` runs at startup and is idempotent. It installs an index
+template with the tuned settings (ES_SHARDS, ES_REFRESH_INTERVAL,
+ES_REPLICAS) and the event mappings, then creates the data stream, or the
+first backing index carrying the write alias, when missing. The template
+matches only ``<name>`` (datastream) or the rollover indices ``<name>-0*``
+(alias), never a plain ``<name>*``: that would also match
+``ith-events-enriched``, which the digital twin writes with ``index``
+upserts, and in datastream mode Elastic would create it as a data stream
+that rejects them.
+
+Bootstrap fails soft: a writer without cluster privileges still writes to
+the existing target. A plain index already holding the name has to be
+reindexed or renamed before switching it to a data stream or alias. With
+ES_ROLLOVER_MAX_AGE / ES_ROLLOVER_MAX_SIZE / ES_ROLLOVER_MAX_DOCS set, a
+thread asks for a conditional ``POST <name>/_rollover`` every
+ES_ROLLOVER_CHECK_S. Leave them empty when an ILM policy (ES_ILM_POLICY,
+set in the template) does the rollover.
+"""
+import base64
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+log = logging.getLogger("ith-es-target")
+
+ES_WRITE_MODE = os.getenv("ES_WRITE_MODE", "index")
+ES_SHARDS = int(os.getenv("ES_SHARDS", "1"))
+ES_REPLICAS = os.getenv("ES_REPLICAS", "")
+ES_REFRESH_INTERVAL = os.getenv("ES_REFRESH_INTERVAL", "30s")
+ES_ILM_POLICY = os.getenv("ES_ILM_POLICY", "")
+ES_ROLLOVER_MAX_AGE = os.getenv("ES_ROLLOVER_MAX_AGE", "")
+ES_ROLLOVER_MAX_SIZE = os.getenv("ES_ROLLOVER_MAX_SIZE", "")
+ES_ROLLOVER_MAX_DOCS = os.getenv("ES_ROLLOVER_MAX_DOCS", "")
+ES_ROLLOVER_CHECK_S = float(os.getenv("ES_ROLLOVER_CHECK_S", "300"))
+
+MODES = ("datastream", "alias", "index")
+
+# same fields as elastic/index_template.json
+EVENT_MAPPINGS: Dict[str, Any] = {
+    "dynamic": True,
+    "properties": {
+        "@timestamp": {"type": "date"},
+        "user": {"properties": {"id": {"type": "keyword"}, "name": {"type": "keyword"}}},
+        "src": {"properties": {
+            "ip": {"type": "ip"},
+            "geo": {"properties": {"lat": {"type": "float"}, "lon": {"type": "float"},
+                                   "country": {"type": "keyword"}, "city": {"type": "keyword"}}},
+        }},
+        "device": {"properties": {"fingerprint": {"type": "keyword"}}},
+        "asn": {"type": "integer"},
+        "event": {"properties": {"kind": {"type": "keyword"}, "action": {"type": "keyword"},
+                                 "risk_score": {"type": "float"}, "explanation": {"type": "text"}}},
+    },
+}
+
+
+def auth_header(api_key: str) -> str:
+    """``ApiKey`` header value from an encoded key or an ``id:key`` pair."""
+    if ":" in api_key:
+        api_key = base64.b64encode(api_key.encode()).decode()
+    return f"ApiKey {api_key}"
+
+
+class WriteTarget:
+    op = "create"  # bulk action for appends; data streams refuse "index"
+
+    def __init__(self, url: str, api_key: str, name: str, mode: str = ES_WRITE_MODE, shards: int = ES_SHARDS,
+                 replicas: str = ES_REPLICAS, refresh_interval: str = ES_REFRESH_INTERVAL,
+                 ilm_policy: str = ES_ILM_POLICY, max_age: str = ES_ROLLOVER_MAX_AGE,
+                 max_size: str = ES_ROLLOVER_MAX_SIZE, max_docs: str = ES_ROLLOVER_MAX_DOCS,
+                 check_s: float = ES_ROLLOVER_CHECK_S, timeout: float = 30.0):
+        if mode not in MODES:
+            raise ValueError(f"ES_WRITE_MODE must be one of {MODES}, not {mode!r}")
+        self.url = url.rstrip("/")
+        self.headers = {"Authorization": auth_header(api_key), "Content-Type": "application/json"}
+        self.name = name
+        self.mode = mode
+        self.shards = shards
+        self.replicas = replicas
+        self.refresh_interval = refresh_interval
+        self.ilm_policy = ilm_policy
+        self.conditions: Dict[str, Any] = {}
+        if max_age:
+            self.conditions["max_age"] = max_age
+        if max_size:
+            self.conditions["max_primary_shard_size"] = max_size
+        if max_docs:
+            self.conditions["max_docs"] = int(max_docs)
+        self.check_s = check_s
+        self.timeout = timeout
+        self.rollovers = 0
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --------------------
+    # Setup
+    # --------------------
+    def template(self) -> Dict[str, Any]:
+        settings: Dict[str, Any] = {"number_of_shards": self.shards, "refresh_interval": self.refresh_interval}
+        if self.replicas != "":
+            settings["number_of_replicas"] = int(self.replicas)
+        if self.ilm_policy:
+            settings["index.lifecycle.name"] = self.ilm_policy
+            if self.mode == "alias":
+                settings["index.lifecycle.rollover_alias"] = self.name
+        body: Dict[str, Any] = {
+            "index_patterns": [f"{self.name}-0*"] if self.mode == "alias" else [self.name],
+            "priority": 600,  # above ith-template (500), which matches the same names
+            "template": {"settings": settings, "mappings": EVENT_MAPPINGS},
+        }
+        if self.mode == "datastream":
+            body["data_stream"] = {}
+        return body
+
+    def bootstrap(self) -> Dict[str, Any]:
+        """Install the template and create the data stream / first aliased index if missing."""
+        out: Dict[str, Any] = {"mode": self.mode, "name": self.name}
+        if self.mode == "index":
+            return out
+        import httpx
+        try:
+            with httpx.Client(timeout=self.timeout, headers=self.headers) as c:
+                r = c.put(f"{self.url}/_index_template/{self.name}", json=self.template())
+                out["template"] = r.status_code
+                if self.mode == "datastream":
+                    r = c.put(f"{self.url}/_data_stream/{self.name}")
+                    # 400 resource_already_exists_exception: created earlier or by the first write
+                    out["data_stream"] = "created" if r.is_success else ("exists" if r.status_code == 400 else r.status_code)
+                else:
+                    r = c.get(f"{self.url}/_alias/{self.name}")
+                    if r.status_code == 404:
+                        first = f"{self.name}-000001"
+                        r = c.put(f"{self.url}/{first}", json={"aliases": {self.name: {"is_write_index": True}}})
+                        out["alias"] = f"created on {first}" if r.is_success else r.status_code
+                    else:
+                        out["alias"] = "exists"
+        except httpx.HTTPError as e:
+            out["error"] = str(e)
+        if "error" in out or any(isinstance(v, int) and v >= 300 for v in out.values()):
+            self.last_error = str(out)
+            log.warning("ES write target bootstrap incomplete: %s", out)
+        else:
+            log.info("ES write target ready: %s", out)
+        return out
+
+    # --------------------
+    # Rollover
+    # --------------------
+    def rollover(self) -> Optional[Dict[str, Any]]:
+        """Conditional rollover; returns Elastic's answer (``rolled_over`` true/false)."""
+        if self.mode == "index" or not self.conditions:
+            return None
+        import httpx
+        try:
+            with httpx.Client(timeout=self.timeout, headers=self.headers) as c:
+                r = c.post(f"{self.url}/{self.name}/_rollover", json={"conditions": self.conditions})
+        except httpx.HTTPError as e:
+            self.last_error = str(e)
+            return None
+        if r.is_error:
+            self.last_error = f"rollover HTTP {r.status_code}: {r.text[:300]}"
+            log.warning("ES %s", self.last_error)
+            return None
+        res = r.json()
+        if res.get("rolled_over"):
+            self.rollovers += 1
+            log.info("ES rollover %s: %s -> %s", self.name, res.get("old_index"), res.get("new_index"))
+        return res
+
+    def start(self) -> None:
+        """Bootstrap, then check the rollover conditions every ``check_s`` in a thread."""
+        if self._thread is not None:
+            return
+
+        def run():
+            self.bootstrap()
+            while not self._stop.wait(self.check_s):
+                self.rollover()
+
+        if self.mode == "index":
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="es-rollover", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(5)
+            self._thread = None
+
+    def status(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "name": self.name, "op": self.op, "conditions": self.conditions,
+                "check_s": self.check_s, "rollovers": self.rollovers, "last_error": self.last_error}
@@ -0,0 +1,223 @@
+"""
+Offline IP -> country / lat / lon / ASN enrichment.
+
+The table is a range file (see rangefile.py) with ``v4`` and ``v6`` sections;
+each range carries ``lat, lon (float32), asn (uint32), country (2 chars)``.
+It is compiled from any CSV/TSV export that has a network column (``network``
+CIDR, or ``start_ip``/``end_ip``) plus some of ``country``, ``latitude``,
+``longitude``, ``asn`` — e.g. GeoLite2 City/ASN joins or iptoasn dumps.
+
+A bounded LRU sits in front of the mmap'd table for hot IPs; there are no
+network calls on the ingest path.
+
+Build:   python -m app.utils.geoip build /tmp/ith-geo.idx geo.csv
+Lookup:  python -m app.utils.geoip lookup /tmp/ith-geo.idx 1.1.1.1
+"""
+import csv
+import ipaddress
+import logging
+import math
+import os
+import struct
+import sys
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.utils.iprep import ip_key
+from app.utils.normalize import normalize
+from app.utils.rangefile import MappedRangeFile, write_rangefile
+
+log = logging.getLogger("ingestor.geoip")
+
+MAGIC = b"ITHGEO01"
+GEOIP_INDEX_PATH = os.getenv("GEOIP_INDEX_PATH", "/tmp/ith-geo.idx")
+GEOIP_CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", "65536"))
+
+_PAYLOAD = struct.Struct(">ffI2s")
+_NO_ASN = 0
+
+_COLS = {
+    "network": ("network", "cidr", "prefix"),
+    "start": ("start_ip", "range_start", "ip_from", "start"),
+    "end": ("end_ip", "range_end", "ip_to", "end"),
+    "country": ("country", "country_code", "country_iso_code", "cc"),
+    "lat": ("latitude", "lat"),
+    "lon": ("longitude", "lon", "lng"),
+    "asn": ("asn", "as_number", "autonomous_system_number"),
+}
+
+
+def _pick(row: Dict[str, str], field: str) -> Optional[str]:
+    for c in _COLS[field]:
+        v = row.get(c)
+        if v not in (None, ""):
+            return v.strip()
+    return None
+
+
+def _float(v: Optional[str]) -> float:
+    try:
+        return float(v) if v is not None else math.nan
+    except ValueError:
+        return math.nan
+
+
+def _ranges_from_rows(rows: Iterable[Dict[str, str]]):
+    for row in rows:
+        row = {(k or "").strip().lower(): v for k, v in row.items()}
+        net = _pick(row, "network")
+        try:
+            if net:
+                n = ipaddress.ip_network(net, strict=False)
+                lo, hi = n.network_address, n.broadcast_address
+            else:
+                lo = ipaddress.ip_address(_pick(row, "start") or "")
+                hi = ipaddress.ip_address(_pick(row, "end") or "")
+        except ValueError:
+            continue
+        asn = _pick(row, "asn") or ""
+        asn = asn[2:] if asn[:2].upper() == "AS" else asn
+        payload = _PAYLOAD.pack(
+            _float(_pick(row, "lat")), _float(_pick(row, "lon")),
+            int(asn) if asn.isdigit() else _NO_ASN,
+            (_pick(row, "country") or "").upper().encode("ascii", "replace")[:2].ljust(2, b" "),
+        )
+        yield lo.version, int(lo), int(hi), payload
+
+
+def build_table(out_path: str, rows: Iterable[Dict[str, str]]) -> Dict[str, int]:
+    fams: Dict[int, List] = {4: [], 6: []}
+    for version, lo, hi, payload in _ranges_from_rows(rows):
+        fams[version].append((lo, hi, payload))
+    sections, counts = {}, {}
+    for version, width, name in ((4, 4, "v4"), (6, 16, "v6")):
+        ranges = sorted(fams[version], key=lambda r: r[0])
+        out, last_end, dropped = [], -1, 0
+        for lo, hi, payload in ranges:
+            if lo <= last_end:
+                dropped += 1
+                continue
+            out.append((lo.to_bytes(width, "big"), hi.to_bytes(width, "big"), payload))
+            last_end = hi
+        if dropped:
+            log.warning("geoip %s: dropped %d overlapping ranges", name, dropped)
+        sections[name] = (width, _PAYLOAD.size, out)
+        counts[name] = len(out)
+    write_rangefile(out_path, MAGIC, sections)
+    return counts
+
+
+def build_table_from_file(out_path: str, csv_path: str) -> Dict[str, int]:
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        dialect = "excel-tab" if csv_path.endswith(".tsv") else "excel"
+        return build_table(out_path, csv.DictReader(f, dialect=dialect))
+
+
+class GeoIP:
+    def __init__(self, path: str = GEOIP_INDEX_PATH, cache_size: int = GEOIP_CACHE_SIZE):
+        self._file = MappedRangeFile(path, MAGIC)
+        self._seen = None
+        self._cached = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, ip: str) -> Optional[Dict[str, Any]]:
+        rf = self._seen
+        fam, key = ip_key(ip)
+        if rf is None or key is None:
+            return None
+        payload = rf.find(fam, key)
+        if payload is None:
+            return None
+        lat, lon, asn, cc = _PAYLOAD.unpack(payload)
+        out: Dict[str, Any] = {}
+        if not math.isnan(lat) and not math.isnan(lon):
+            out["lat"], out["lon"] = round(lat, 4), round(lon, 4)
+        country = cc.decode("ascii", "replace").strip()
+        if country:
+            out["country"] = country
+        if asn != _NO_ASN:
+            out["asn"] = asn
+        return out or None
+
+    def lookup(self, ip: Any) -> Optional[Dict[str, Any]]:
+        """{lat, lon, country, asn} (any subset) for ``ip``, or None. Result is shared; do not mutate."""
+        if not ip:
+            return None
+        rf = self._file.get()
+        if rf is not self._seen:
+            self._seen = rf
+            self._cached.cache_clear()
+        if rf is None:
+            return None
+        return self._cached(str(ip))
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+
+_geoip: Optional[GeoIP] = None
+
+
+def get_geoip() -> GeoIP:
+    global _geoip
+    if _geoip is None:
+        _geoip = GeoIP()
+    return _geoip
+
+
+def enrich_event(ev: Dict[str, Any]) -> bool:
+    """
+    Fill ``<source|src>.geo.lat/lon/country`` and ``asn`` from the local table
+    when the producer did not send them (``source.geo.lat`` ... and
+    ``source.asn`` as dotted keys for dotted events). Returns True if anything
+    was added.
+    """
+    e = normalize(ev)
+    if not e.source_ip:
+        return False
+    have_geo = e.source_lat is not None and e.source_lon is not None
+    have_asn = e.source_asn is not None
+    if have_geo and have_asn:
+        return False
+    hit = get_geoip().lookup(e.source_ip)
+    if not hit:
+        return False
+    src = ev.get("source") if isinstance(ev.get("source"), dict) else ev.get("src")
+    nested = isinstance(src, dict) and bool(src.get("ip"))
+    changed = False
+    if not have_geo and "lat" in hit:
+        if nested:
+            geo = src.get("geo")
+            if not isinstance(geo, dict):
+                geo = src["geo"] = {}
+            geo["lat"], geo["lon"] = hit["lat"], hit["lon"]
+            if hit.get("country"):
+                geo.setdefault("country", hit["country"])
+        else:
+            ev["source.geo.lat"], ev["source.geo.lon"] = hit["lat"], hit["lon"]
+            if hit.get("country") and e.source_country is None:
+                ev["source.geo.country"] = hit["country"]
+        changed = True
+    if not have_asn and "asn" in hit:
+        if nested:
+            src["asn"] = hit["asn"]
+        else:
+            ev["source.asn"] = hit["asn"]
+        changed = True
+    return changed
+
+
+def _main(argv: List[str]) -> int:
+    if len(argv) == 3 and argv[0] == "build":
+        print(build_table_from_file(argv[1], argv[2]))
+        return 0
+    if len(argv) >= 3 and argv[0] == "lookup":
+        g = GeoIP(argv[1])
+        for ip in argv[2:]:
+            print(ip, g.lookup(ip))
+        return 0
+    print("usage: geoip build OUT table.csv | geoip lookup INDEX ip ...", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
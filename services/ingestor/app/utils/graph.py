@@ -0,0 +1,261 @@
+"""
+Time-windowed bipartite graph of users, source IPs and device fingerprints.
+
+    g = EntityGraph(window_s=3600)
+    g.observe(ts, "alice", ip="10.0.0.7", device="dev-42")
+    g.neighbors("device", "dev-42")          # users on that device in the window
+    g.degree("user", "alice", "device")      # distinct devices alice used, O(1)
+    g.co_users("alice", via="device")        # users sharing any of alice's devices
+
+Every node is interned to an integer id per kind; per node there is only a
+list head and a degree (4 bytes each, in flat arrays) per neighbour kind.
+Edges live in one pool per kind (user-ip, user-device) of parallel
+``array("I")`` columns: both endpoints, last seen, and next / prev links for
+the two doubly linked lists the edge sits on, 28 bytes per edge with no
+per-node or per-edge Python objects. Queries walk one list (O(degree)) and
+filter on last-seen, so they are exact for the window.
+
+Edges expire in event time. An edge is enqueued with the end of its
+``window/64`` tick when it is created or refreshed into a new tick.
+``observe`` pops queue entries older than the window and unlinks edges not
+seen since, in O(1). With ``max_skew_s`` set, an event stamped more than
+that past the wall clock is counted in ``future`` and ignored; otherwise
+one bad timestamp would move ``now`` ahead, and edges would stop expiring
+until real time caught up with it. Times that do not fit the unsigned
+32-bit columns (before 1970, or from 2106 on) are counted in
+``out_of_range`` and ignored the same way. Degrees are therefore exact to
+within one tick; edge slots and nodes left with no edges are freed for reuse. The queue is three
+parallel arrays (9 bytes per entry).
+"""
+import time
+from array import array
+from typing import Callable, Dict, List, Optional
+
+KINDS = ("user", "ip", "device")
+_KIND = {k: i for i, k in enumerate(KINDS)}
+_TICKS = 64
+_NIL = 0xFFFFFFFF
+
+
+class _Nodes:
+    """Interned node ids of one kind; list head and degree per neighbour kind."""
+
+    def __init__(self, neighbour_kinds):
+        self.ids: Dict[str, int] = {}
+        self.names: List[Optional[str]] = []
+        self.free: List[int] = []
+        self.head = {k: array("I") for k in neighbour_kinds}
+        self.deg = {k: array("I") for k in neighbour_kinds}
+
+    def intern(self, name: str) -> int:
+        i = self.ids.get(name)
+        if i is not None:
+            return i
+        if self.free:
+            i = self.free.pop()
+            self.names[i] = name
+        else:
+            i = len(self.names)
+            self.names.append(name)
+            for k in self.head:
+                self.head[k].append(_NIL)
+                self.deg[k].append(0)
+        self.ids[name] = i
+        return i
+
+    def release_if_isolated(self, i: int) -> None:
+        for d in self.deg.values():
+            if d[i]:
+                return
+        del self.ids[self.names[i]]
+        self.names[i] = None
+        self.free.append(i)
+
+
+class _Edges:
+    """Pool of user-(ip|device) edges: endpoints, last seen, and list links on both sides."""
+
+    def __init__(self):
+        self.u = array("I")
+        self.v = array("I")
+        self.ts = array("I")
+        self.nu = array("I")
+        self.pu = array("I")
+        self.nv = array("I")
+        self.pv = array("I")
+        self.free = array("I")
+
+    def alloc(self) -> int:
+        if self.free:
+            return self.free.pop()
+        for col in (self.u, self.v, self.ts, self.nu, self.pu, self.nv, self.pv):
+            col.append(0)
+        return len(self.u) - 1
+
+
+class EntityGraph:
+    def __init__(self, window_s: float = 3600.0, max_skew_s: Optional[float] = None,
+                 clock: Callable[[], float] = time.time):
+        self.window = window_s
+        self.max_skew_s = max_skew_s
+        self._clock = clock
+        self.tick = max(1, int(window_s // _TICKS))
+        self._nodes = [_Nodes((1, 2)), _Nodes((0,)), _Nodes((0,))]
+        self._edges = {1: _Edges(), 2: _Edges()}
+        self._q_ts = array("I")
+        self._q_kind = array("B")
+        self._q_e = array("I")
+        self._q_head = 0
+        self.edges = 0
+        self.now = 0
+        self.future = 0
+        self.out_of_range = 0
+        self._t_max = _NIL - 2 * self.tick  # the queue stores the end of the next tick
+
+    # --------------------
+    # Updates
+    # --------------------
+    def observe(self, ts: float, user: str, ip: Optional[str] = None, device: Optional[str] = None) -> None:
+        """Record that ``user`` was seen with ``ip`` / ``device`` at epoch ``ts``, then expire old edges."""
+        t = int(ts)
+        if not 0 <= t <= self._t_max:
+            self.out_of_range += 1
+            return
+        if t > self.now:
+            if self.max_skew_s is not None and t > self._clock() + self.max_skew_s:
+                self.future += 1
+                return
+            self.now = t
+            self._expire(t - self.window)
+        if not ip and not device:
+            return
+        u = self._nodes[0].intern(user)
+        if ip:
+            self._touch(1, u, ip, t)
+        if device:
+            self._touch(2, u, device, t)
+
+    def _touch(self, kind: int, u: int, name: str, t: int) -> None:
+        users, other, E = self._nodes[0], self._nodes[kind], self._edges[kind]
+        v = other.intern(name)
+        # walk the shorter of the two lists for an existing edge
+        if users.deg[kind][u] <= other.deg[0][v]:
+            e, ends, nxt = users.head[kind][u], E.v, E.nu
+            want = v
+        else:
+            e, ends, nxt = other.head[0][v], E.u, E.nv
+            want = u
+        while e != _NIL and ends[e] != want:
+            e = nxt[e]
+        if e != _NIL:
+            old = E.ts[e]
+            if t <= old:
+                return
+            E.ts[e] = t
+            if t // self.tick != old // self.tick:
+                self._enqueue(t, kind, e)
+            return
+        e = E.alloc()
+        E.u[e], E.v[e], E.ts[e] = u, v, t
+        hu, hv = users.head[kind], other.head[0]
+        E.pu[e] = E.pv[e] = _NIL
+        E.nu[e], E.nv[e] = hu[u], hv[v]
+        if hu[u] != _NIL:
+            E.pu[hu[u]] = e
+        if hv[v] != _NIL:
+            E.pv[hv[v]] = e
+        hu[u] = hv[v] = e
+        users.deg[kind][u] += 1
+        other.deg[0][v] += 1
+        self.edges += 1
+        self._enqueue(t, kind, e)
+
+    def _enqueue(self, t: int, kind: int, e: int) -> None:
+        self._q_ts.append((t // self.tick + 1) * self.tick)
+        self._q_kind.append(kind)
+        self._q_e.append(e)
+
+    def _unlink(self, kind: int, e: int) -> None:
+        users, other, E = self._nodes[0], self._nodes[kind], self._edges[kind]
+        u, v = E.u[e], E.v[e]
+        n, p = E.nu[e], E.pu[e]
+        if p != _NIL:
+            E.nu[p] = n
+        else:
+            users.head[kind][u] = n
+        if n != _NIL:
+            E.pu[n] = p
+        n, p = E.nv[e], E.pv[e]
+        if p != _NIL:
+            E.nv[p] = n
+        else:
+            other.head[0][v] = n
+        if n != _NIL:
+            E.pv[n] = p
+        users.deg[kind][u] -= 1
+        other.deg[0][v] -= 1
+        E.ts[e] = 0
+        E.free.append(e)
+        self.edges -= 1
+        users.release_if_isolated(u)
+        other.release_if_isolated(v)
+
+    def _expire(self, cutoff: float) -> None:
+        h, qts = self._q_head, self._q_ts
+        n = len(qts)
+        while h < n and qts[h] < cutoff:
+            kind, e = self._q_kind[h], self._q_e[h]
+            h += 1
+            # 0 = already freed; newer = refreshed (a later entry covers it). A
+            # reused slot is only removed here if it has expired too.
+            t = self._edges[kind].ts[e]
+            if t and t < cutoff:
+                self._unlink(kind, e)
+        self._q_head = h
+        if h > 65536 and h * 2 > n:
+            for q in (self._q_ts, self._q_kind, self._q_e):
+                del q[:h]
+            self._q_head = 0
+
+    # --------------------
+    # Queries
+    # --------------------
+    def degree(self, kind: str, name: str, via: str = "user") -> int:
+        """Distinct ``via`` neighbours of a node (exact to within one tick), O(1)."""
+        nodes = self._nodes[_KIND[kind]]
+        i = nodes.ids.get(name)
+        d = nodes.deg.get(_KIND[via])
+        return d[i] if i is not None and d is not None else 0
+
+    def neighbors(self, kind: str, name: str, via: str = "user", since: Optional[float] = None) -> List[str]:
+        """``via`` neighbours seen since ``since`` (default: the window), O(degree)."""
+        k, vk = _KIND[kind], _KIND[via]
+        nodes = self._nodes[k]
+        i = nodes.ids.get(name)
+        if i is None or vk not in nodes.head:
+            return []
+        E = self._edges[k or vk]
+        ends, nxt = (E.v, E.nu) if k == 0 else (E.u, E.nv)
+        cutoff = self.now - self.window if since is None else since
+        names = self._nodes[vk].names
+        out = []
+        e = nodes.head[vk][i]
+        while e != _NIL:
+            if E.ts[e] >= cutoff:
+                out.append(names[ends[e]])
+            e = nxt[e]
+        return out
+
+    def co_users(self, user: str, via: str = "device", since: Optional[float] = None) -> List[str]:
+        """Other users who shared a ``via`` node with ``user`` in the window; O(sum of those degrees)."""
+        out: Dict[str, None] = {}
+        for node in self.neighbors("user", user, via, since):
+            for u in self.neighbors(via, node, "user", since):
+                if u != user:
+                    out[u] = None
+        return list(out)
+
+    def status(self) -> Dict[str, int]:
+        return {"edges": self.edges, "users": len(self._nodes[0].ids), "ips": len(self._nodes[1].ids),
+                "devices": len(self._nodes[2].ids), "expiry_queue": len(self._q_ts) - self._q_head,
+                "future": self.future, "out_of_range": self.out_of_range, "window_s": self.window}
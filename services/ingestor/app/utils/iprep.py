@@ -0,0 +1,256 @@
+"""
+IP / ASN reputation index.
+
+Feeds (tor exit nodes, bad-ASN lists, blocklists) are compiled into a single
+range file (see rangefile.py) with three sections: ``v4`` and ``v6`` address
+ranges and ``asn`` number ranges. Each range carries a 16-bit mask of the
+feeds that list it, so overlapping feeds are resolved once at build time and a
+lookup is a single binary search.
+
+Feed files are plain text, one entry per line; ``#`` starts a comment.
+An entry is an IP (``1.2.3.4``, ``2001:db8::1``), a CIDR (``10.0.0.0/8``) or an
+ASN (``AS13335`` or ``13335``).
+
+Build:   python -m app.utils.iprep build /tmp/ith-iprep.idx tor_exit=data/tor_exit_nodes.txt bad_asn=bad_asn.txt
+Lookup:  python -m app.utils.iprep lookup /tmp/ith-iprep.idx 1.1.1.1
+
+The image ships data/tor_exit_nodes.txt, the default IPREP_FEEDS, and the
+Dockerfile compiles it into IPREP_INDEX_PATH at build time.
+"""
+import ipaddress
+import logging
+import os
+import re
+import socket
+import struct
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.utils.normalize import normalize
+from app.utils.rangefile import MappedRangeFile, write_rangefile
+
+log = logging.getLogger("ingestor.iprep")
+
+MAGIC = b"ITHREP01"
+MAX_FEEDS = 16
+
+IPREP_INDEX_PATH = os.getenv("IPREP_INDEX_PATH", "/tmp/ith-iprep.idx")
+_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data")
+# "name=path,name=path" — compiled into IPREP_INDEX_PATH when the index is missing.
+IPREP_FEEDS = os.getenv("IPREP_FEEDS", f"tor_exit={os.path.join(_DATA, 'tor_exit_nodes.txt')}")
+
+_ASN_RE = re.compile(r"^(?:AS)?(\d+)$", re.I)
+_MASK = struct.Struct(">H")
+
+
+def _parse_line(line: str) -> Optional[Tuple[str, int, int]]:
+    s = line.split("#", 1)[0].strip()
+    if not s:
+        return None
+    m = _ASN_RE.match(s)
+    if m:
+        n = int(m.group(1))
+        return "asn", n, n
+    if "/" not in s:
+        # Bare addresses are the bulk of real feeds; inet_pton is ~20x cheaper
+        # than constructing an ip_network.
+        fam, af = ("v6", socket.AF_INET6) if ":" in s else ("v4", socket.AF_INET)
+        try:
+            n = int.from_bytes(socket.inet_pton(af, s), "big")
+        except OSError:
+            raise ValueError(s)
+        return fam, n, n
+    net = ipaddress.ip_network(s, strict=False)
+    fam = "v4" if net.version == 4 else "v6"
+    return fam, int(net.network_address), int(net.broadcast_address)
+
+
+def ip_key(ip: Any) -> Tuple[str, Optional[bytes]]:
+    """(section, packed big-endian key) for an address; IPv4-mapped IPv6 folds to v4."""
+    s = str(ip).strip()
+    try:
+        if ":" not in s:
+            return "v4", socket.inet_pton(socket.AF_INET, s)
+        packed = socket.inet_pton(socket.AF_INET6, s.split("%", 1)[0])
+    except OSError:
+        return "v4", None
+    if packed[:12] == b"\0" * 10 + b"\xff\xff":
+        return "v4", packed[12:]
+    return "v6", packed
+
+
+def _flatten(intervals: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """Sweep (start, end, bit) intervals into sorted, disjoint (start, end, mask) ranges."""
+    points = []
+    for s, e, bit in intervals:
+        points.append((s, 1, bit))
+        points.append((e + 1, -1, bit))
+    points.sort()
+    active = [0] * MAX_FEEDS
+    out: List[Tuple[int, int, int]] = []
+    mask, prev, i = 0, None, 0
+    while i < len(points):
+        pos = points[i][0]
+        if mask and prev is not None and pos > prev:
+            if out and out[-1][2] == mask and out[-1][1] + 1 == prev:
+                out[-1] = (out[-1][0], pos - 1, mask)
+            else:
+                out.append((prev, pos - 1, mask))
+        while i < len(points) and points[i][0] == pos:
+            _, delta, bit = points[i]
+            active[bit] += delta
+            if active[bit]:
+                mask |= 1 << bit
+            else:
+                mask &= ~(1 << bit)
+            i += 1
+        prev = pos
+    return out
+
+
+def build_index(out_path: str, feeds: Dict[str, Iterable[str]]) -> Dict[str, int]:
+    """Compile ``{feed_name: lines}`` into ``out_path``. Returns per-section range counts."""
+    names = list(feeds)
+    if len(names) > MAX_FEEDS:
+        raise ValueError(f"at most {MAX_FEEDS} feeds per index")
+    per_family: Dict[str, List[Tuple[int, int, int]]] = {"v4": [], "v6": [], "asn": []}
+    for bit, name in enumerate(names):
+        for lineno, line in enumerate(feeds[name], 1):
+            try:
+                parsed = _parse_line(line)
+            except ValueError:
+                log.warning("iprep feed %s:%d: skipping unparsable entry %r", name, lineno, line.strip())
+                continue
+            if parsed:
+                fam, s, e = parsed
+                per_family[fam].append((s, e, bit))
+
+    widths = {"v4": 4, "v6": 16, "asn": 4}
+    sections = {}
+    counts = {}
+    for fam, width in widths.items():
+        ranges = _flatten(per_family[fam])
+        counts[fam] = len(ranges)
+        sections[fam] = (width, _MASK.size, [
+            (s.to_bytes(width, "big"), e.to_bytes(width, "big"), _MASK.pack(m)) for s, e, m in ranges
+        ])
+    write_rangefile(out_path, MAGIC, sections, meta={"feeds": names})
+    return counts
+
+
+def build_index_from_files(out_path: str, feed_paths: Dict[str, str]) -> Dict[str, int]:
+    handles = {name: open(path, encoding="utf-8") for name, path in feed_paths.items()}
+    try:
+        return build_index(out_path, handles)
+    finally:
+        for h in handles.values():
+            h.close()
+
+
+def parse_feed_spec(spec: str) -> Dict[str, str]:
+    feeds = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            name, path = part.split("=", 1)
+            feeds[name.strip()] = path.strip()
+    return feeds
+
+
+class IPReputation:
+    def __init__(self, path: str = IPREP_INDEX_PATH, check_interval: float = 30.0):
+        self._file = MappedRangeFile(path, MAGIC, check_interval)
+        # mask -> feed names for the file they were read from; a reload can reorder the feeds
+        self._mask_file = None
+        self._mask_cache: Dict[int, Tuple[str, ...]] = {}
+
+    def _feeds(self, rf, payload: Optional[bytes]) -> Tuple[str, ...]:
+        if payload is None:
+            return ()
+        if rf is not self._mask_file:
+            self._mask_file, self._mask_cache = rf, {}
+        mask = _MASK.unpack(payload)[0]
+        hit = self._mask_cache.get(mask)
+        if hit is None:
+            names = rf.meta.get("feeds", [])
+            hit = tuple(n for b, n in enumerate(names) if mask >> b & 1)
+            self._mask_cache[mask] = hit
+        return hit
+
+    def feeds_for_ip(self, ip: Any) -> Tuple[str, ...]:
+        rf = self._file.get()
+        if rf is None or not ip:
+            return ()
+        fam, key = ip_key(ip)
+        if key is None:
+            return ()
+        return self._feeds(rf, rf.find(fam, key))
+
+    def feeds_for_asn(self, asn: Any) -> Tuple[str, ...]:
+        rf = self._file.get()
+        if rf is None or asn in (None, ""):
+            return ()
+        m = _ASN_RE.match(str(asn).strip())
+        if not m or int(m.group(1)) > 0xFFFFFFFF:
+            return ()
+        return self._feeds(rf, rf.find("asn", int(m.group(1)).to_bytes(4, "big")))
+
+    def lookup(self, ip: Any = None, asn: Any = None) -> Optional[Dict[str, List[str]]]:
+        ip_hits = self.feeds_for_ip(ip)
+        asn_hits = self.feeds_for_asn(asn)
+        if not ip_hits and not asn_hits:
+            return None
+        return {"ip": list(ip_hits), "asn": list(asn_hits)}
+
+
+_reputation: Optional[IPReputation] = None
+
+
+def get_reputation() -> IPReputation:
+    """Process-wide index; compiles IPREP_FEEDS on first use if the file is missing."""
+    global _reputation
+    if _reputation is None:
+        if not os.path.exists(IPREP_INDEX_PATH) and IPREP_FEEDS:
+            try:
+                counts = build_index_from_files(IPREP_INDEX_PATH, parse_feed_spec(IPREP_FEEDS))
+                log.info("iprep index built at %s: %s", IPREP_INDEX_PATH, counts)
+            except Exception as e:
+                log.warning("iprep build failed: %s", e)
+        _reputation = IPReputation(IPREP_INDEX_PATH)
+    return _reputation
+
+
+def enrich_event(ev: Dict[str, Any]) -> Optional[Dict[str, List[str]]]:
+    """Set ``<source|src>.reputation`` (``source.reputation`` for dotted events) when the IP or ASN is listed."""
+    e = normalize(ev)
+    src = ev.get("source") if isinstance(ev.get("source"), dict) else ev.get("src")
+    asn = e.source_asn
+    if asn is None:  # ECS source.as.number
+        asn = (src.get("as") or {}).get("number") if isinstance(src, dict) else ev.get("source.as.number")
+    rep = get_reputation().lookup(e.source_ip, asn)
+    if rep:
+        if isinstance(src, dict):
+            src["reputation"] = rep
+        else:
+            ev["source.reputation"] = rep
+    return rep
+
+
+def _main(argv: List[str]) -> int:
+    if len(argv) >= 2 and argv[0] == "build":
+        feeds = parse_feed_spec(",".join(argv[2:]))
+        if not feeds:
+            print("usage: iprep build OUT name=path [name=path ...]", file=sys.stderr)
+            return 2
+        print(build_index_from_files(argv[1], feeds))
+        return 0
+    if len(argv) >= 3 and argv[0] == "lookup":
+        rep = IPReputation(argv[1])
+        for q in argv[2:]:
+            print(q, rep.lookup(ip=q) if not _ASN_RE.match(q) else rep.lookup(asn=q))
+        return 0
+    print("usage: iprep build OUT name=path ... | iprep lookup INDEX ip|asn ...", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
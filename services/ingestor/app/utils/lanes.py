@@ -0,0 +1,124 @@
+"""
+Priority lanes for the ingest pipeline.
+
+Each lane has its own bounded asyncio queue and its own pool of worker tasks,
+so a flood in a low lane (routine logins and their AI calls) never occupies
+the workers of a higher one. /ingest runs the cheap per-event stages inline,
+then ``await lanes.submit(lane, job)`` and gets the handler's result back.
+
+    p1  honeypot / canary hits, privilege escalation (critical risk tier)
+    p2  high and medium risk
+    p3  everything else
+
+Sizes are per lane, ``name=value`` lists like IPREP_FEEDS:
+
+    LANES_WORKERS=p1=4,p2=8,p3=8
+    LANES_QUEUE=p1=1000,p2=5000,p3=5000
+    LANES_SLO_MS=p1=500,p2=5000,p3=30000
+
+``ith_lane_seconds{lane}`` measures enqueue-to-done latency, and
+``ith_lane_slo_breaches_total{lane}`` counts items slower than their lane's
+SLO. When a lane queue stays full for LANES_ENQUEUE_TIMEOUT seconds,
+``submit`` raises LaneFull.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.utils import metrics
+
+LANES: Tuple[str, ...] = ("p1", "p2", "p3")
+
+
+def _per_lane(name: str, default: Dict[str, float]) -> Dict[str, float]:
+    out = dict(default)
+    for part in os.getenv(name, "").split(","):
+        lane, _, value = part.partition("=")
+        if lane.strip() in out and value.strip():
+            out[lane.strip()] = float(value)
+    return out
+
+
+LANES_WORKERS = _per_lane("LANES_WORKERS", {"p1": 4, "p2": 8, "p3": 8})
+LANES_QUEUE = _per_lane("LANES_QUEUE", {"p1": 1000, "p2": 5000, "p3": 5000})
+LANES_SLO_MS = _per_lane("LANES_SLO_MS", {"p1": 500, "p2": 5000, "p3": 30000})
+LANES_ENQUEUE_TIMEOUT = float(os.getenv("LANES_ENQUEUE_TIMEOUT", "2"))
+
+LANE_SECONDS = metrics.histogram("ith_lane_seconds", "Enqueue-to-done latency per priority lane", ["lane"])
+LANE_SLO_BREACHES = metrics.counter("ith_lane_slo_breaches_total", "Items slower than their lane SLO", ["lane"])
+LANE_REJECTED = metrics.counter("ith_lane_rejected_total", "Items refused because the lane queue stayed full", ["lane"])
+
+Handler = Callable[[str, Any], Awaitable[Any]]
+
+
+class LaneFull(Exception):
+    pass
+
+
+class Lanes:
+    def __init__(self, handler: Handler, workers: Optional[Dict[str, float]] = None,
+                 queue: Optional[Dict[str, float]] = None, slo_ms: Optional[Dict[str, float]] = None):
+        self.handler = handler
+        self.workers = {k: max(1, int(v)) for k, v in (workers or LANES_WORKERS).items()}
+        self.queue_size = {k: max(1, int(v)) for k, v in (queue or LANES_QUEUE).items()}
+        self.slo = {k: v / 1000.0 for k, v in (slo_ms or LANES_SLO_MS).items()}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.done = {lane: 0 for lane in LANES}
+
+    def start(self) -> None:
+        """Create the queues and worker tasks; call from the running event loop."""
+        for lane in LANES:
+            self._queues[lane] = asyncio.Queue(self.queue_size[lane])
+            for i in range(self.workers[lane]):
+                self._tasks.append(asyncio.create_task(self._work(lane), name=f"lane-{lane}-{i}"))
+        depth = metrics.gauge("ith_queue_depth", "Items waiting in internal queues", ["queue"])
+        for lane in LANES:
+            depth.labels(f"lane_{lane}").set_function(self._queues[lane].qsize)
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def submit(self, lane: str, job: Any) -> Any:
+        """Queue ``job`` on ``lane`` and return ``await handler(lane, job)``."""
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self._queues[lane].put((job, fut, time.perf_counter())),
+                                   LANES_ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            LANE_REJECTED.labels(lane).inc()
+            raise LaneFull(f"lane {lane} queue full")
+        return await fut
+
+    async def _work(self, lane: str) -> None:
+        q = self._queues[lane]
+        hist, slo = LANE_SECONDS.labels(lane), self.slo[lane]
+        while True:
+            job, fut, t0 = await q.get()
+            try:
+                res = await self.handler(lane, job)
+                if not fut.done():
+                    fut.set_result(res)
+            except asyncio.CancelledError:
+                if not fut.done():
+                    fut.cancel()
+                raise
+            except Exception as ex:  # surfaced to the submitter
+                if not fut.done():
+                    fut.set_exception(ex)
+            finally:
+                el = time.perf_counter() - t0
+                hist.observe(el)
+                if el > slo:
+                    LANE_SLO_BREACHES.labels(lane).inc()
+                self.done[lane] += 1
+                q.task_done()
+
+    def status(self) -> Dict[str, Any]:
+        return {lane: {"queued": self._queues[lane].qsize() if lane in self._queues else 0,
+                       "workers": self.workers[lane], "done": self.done[lane],
+                       "slo_ms": self.slo[lane] * 1000} for lane in LANES}
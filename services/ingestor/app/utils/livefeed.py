@@ -0,0 +1,129 @@
+"""
+Live feed of scored events for analyst dashboards (server-sent events).
+
+/ingest publishes one small record per scored event into a fixed-size ring.
+Each record is encoded once as an SSE frame at publish time; subscribers
+only filter and copy bytes, so N dashboards cost N socket writes and no
+Elastic searches.
+
+    GET /stream?min_risk=0.5&rule=impossible_travel&user=alice
+    Last-Event-ID: 12345        (or ?last_id=12345) resumes after that offset
+
+Offsets increase by one per record for the life of the process. Every
+subscriber has its own cursor into the ring, so a slow client never blocks
+/ingest or other clients: when it falls more than LIVE_RING_SIZE records
+behind, the overwritten records are skipped and it gets a ``gap`` event
+with the count, then continues from the oldest record still held. A
+subscriber gets at most LIVE_BATCH frames per write, and ``: ping`` every
+LIVE_HEARTBEAT_S seconds keeps idle connections open through proxies.
+"""
+import asyncio
+import os
+from typing import AsyncIterator, List, Optional, Tuple
+
+from app.utils import codec, metrics
+
+LIVE_RING_SIZE = int(os.getenv("LIVE_RING_SIZE", "10000"))
+LIVE_BATCH = int(os.getenv("LIVE_BATCH", "256"))
+LIVE_HEARTBEAT_S = float(os.getenv("LIVE_HEARTBEAT_S", "15"))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", "200"))
+
+_PUBLISHED = metrics.counter("ith_live_published_total", "Scored events published to the live feed")
+_SKIPPED = metrics.counter("ith_live_skipped_total", "Records a slow live subscriber missed (ring overwrote them)")
+
+# (score, user, reasons, frame)
+_Slot = Tuple[float, str, Tuple[str, ...], bytes]
+
+
+class LiveFeed:
+    """Ring of the last ``size`` records and the subscribers reading it; use from the event loop only."""
+
+    def __init__(self, size: int = LIVE_RING_SIZE, batch: int = LIVE_BATCH,
+                 heartbeat_s: float = LIVE_HEARTBEAT_S, max_subscribers: int = LIVE_MAX_SUBSCRIBERS):
+        self.size = max(1, size)
+        self.batch = max(1, batch)
+        self.heartbeat_s = heartbeat_s
+        self.max_subscribers = max_subscribers
+        self._ring: List[Optional[_Slot]] = [None] * self.size
+        self.next = 1  # offset of the next record
+        self.subscribers = 0
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def oldest(self) -> int:
+        return max(1, self.next - self.size)
+
+    def publish(self, score: float, user: str, reasons: str, record: dict) -> int:
+        """Append one record; returns its offset."""
+        off = self.next
+        rule = tuple(r for r in reasons.split(";") if r and r != "none")
+        frame = b"id: %d\nevent: event\ndata: %s\n\n" % (off, codec.dumps(record))
+        self._ring[off % self.size] = (score, user, rule, frame)
+        self.next = off + 1
+        _PUBLISHED.inc()
+        if self._wake is not None:
+            self._wake.set()
+            self._wake = None
+        return off
+
+    def read(self, cursor: int, min_risk: float = 0.0, rule: str = "", user: str = "") -> Tuple[List[bytes], int, int]:
+        """(frames matching the filters, new cursor, records skipped) for up to ``batch`` records after ``cursor``."""
+        skipped = 0
+        if cursor < self.oldest:
+            skipped = self.oldest - cursor
+            cursor = self.oldest
+        end = min(self.next, cursor + self.batch)
+        ring, size = self._ring, self.size
+        out = []
+        for off in range(cursor, end):
+            score, u, rules, frame = ring[off % size]
+            if score < min_risk or (user and u != user) or (rule and rule not in rules):
+                continue
+            out.append(frame)
+        return out, end, skipped
+
+    async def _changed(self, timeout: float) -> None:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def full(self) -> bool:
+        return self.subscribers >= self.max_subscribers
+
+    def start_cursor(self, last_id: Optional[str]) -> int:
+        """Offset to read from: just after ``last_id`` when given, else only new records.
+
+        An id at or past ``next`` is from before a restart; the client gets new records only.
+        """
+        try:
+            return min(int(last_id) + 1, self.next) if last_id not in (None, "") else self.next
+        except ValueError:
+            return self.next
+
+    async def subscribe(self, cursor: int, min_risk: float = 0.0, rule: str = "",
+                        user: str = "") -> AsyncIterator[bytes]:
+        """SSE byte chunks from ``cursor`` on, until the client goes away."""
+        self.subscribers += 1
+        try:
+            yield b"retry: 2000\n\n"
+            while True:
+                if cursor >= self.next:
+                    await self._changed(self.heartbeat_s)
+                    if cursor >= self.next:
+                        yield b": ping\n\n"
+                        continue
+                frames, cursor, skipped = self.read(cursor, min_risk, rule, user)
+                if skipped:
+                    _SKIPPED.inc(skipped)
+                    yield b"event: gap\ndata: {\"skipped\": %d, \"resume\": %d}\n\n" % (skipped, cursor)
+                if frames:
+                    yield b"".join(frames)
+        finally:
+            self.subscribers -= 1
+
+    def status(self):
+        return {"next": self.next, "oldest": self.oldest, "held": self.next - self.oldest, "size": self.size,
+                "subscribers": self.subscribers}
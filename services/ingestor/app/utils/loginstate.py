@@ -0,0 +1,246 @@
+"""
+Compact per-user last-login state for compute_risk.
+
+Each user id is interned and mapped to an integer slot. The slot indexes
+parallel typed arrays:
+
+    ts     d   epoch seconds of the last login
+    lat    f   NaN when unknown
+    lon    f
+    asn    I   0 when unknown; non-numeric ASN labels get ids counted down from 2**32-1
+    flags  B   bit 0: MFA used, bit 1: slot in use
+
+That is 21 bytes of state per user, plus the user id string and its dict
+entry, where a dict of a datetime and boxed floats costs several hundred.
+
+``compact()`` frees users whose last login is older than LOGIN_STATE_TTL_S.
+Freed slots are reused by new users, so the arrays stop growing once the
+working set is stable. With LOGIN_STATE_PATH set, ``start()`` loads the
+snapshot and a maintenance thread compacts and saves every
+LOGIN_STATE_COMPACT_S seconds; ``stop()`` saves once more. Snapshots hold
+live users only and are written atomically.
+"""
+import json
+import logging
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, NamedTuple, Optional
+
+
+log = logging.getLogger("ingestor.loginstate")
+
+LOGIN_STATE_TTL_S = float(os.getenv("LOGIN_STATE_TTL_S", str(30 * 86400)))
+LOGIN_STATE_COMPACT_S = float(os.getenv("LOGIN_STATE_COMPACT_S", "600"))
+# Unset keeps the state in memory only.
+LOGIN_STATE_PATH = os.getenv("LOGIN_STATE_PATH", "")
+
+MAGIC = b"ITHLGN01"
+_HEAD = struct.Struct("<8sI")
+_MFA, _USED = 1, 2
+_NAN = float("nan")
+_LABEL_BASE = 0xFFFFFFFF
+
+
+class Login(NamedTuple):
+    ts: float
+    lat: Optional[float]
+    lon: Optional[float]
+    asn: int
+    mfa: bool
+
+
+def epoch(dt: datetime) -> float:
+    """Epoch seconds; naive datetimes are taken as UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class LoginState:
+    def __init__(self, ttl_s: float = LOGIN_STATE_TTL_S):
+        self.ttl = ttl_s
+        self._slots: Dict[str, int] = {}
+        self._free = array("I")
+        self._ts = array("d")
+        self._lat = array("f")
+        self._lon = array("f")
+        self._asn = array("I")
+        self._flags = array("B")
+        self._labels: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._path = ""
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def asn_key(self, asn: Any) -> int:
+        """ASN as stored: the number for 15169 / "15169" / "AS15169", an id for other labels, 0 for none."""
+        if asn is None or asn == "":
+            return 0
+        s = str(asn).strip()
+        digits = s[2:] if s[:2].upper() == "AS" else s
+        if digits.isdigit() and int(digits) < _LABEL_BASE:
+            return int(digits)
+        key = self._labels.get(s)
+        if key is None:
+            with self._lock:
+                key = self._labels.setdefault(s, _LABEL_BASE - len(self._labels))
+        return key
+
+    def get(self, user_id: str) -> Optional[Login]:
+        i = self._slots.get(user_id)
+        if i is None:
+            return None
+        lat, lon = self._lat[i], self._lon[i]
+        return Login(self._ts[i], None if lat != lat else lat, None if lon != lon else lon,
+                     self._asn[i], bool(self._flags[i] & _MFA))
+
+    def put(self, user_id: str, ts: float, lat: Optional[float], lon: Optional[float], asn: Any,
+            mfa: bool) -> None:
+        lat = _NAN if lat is None else lat
+        lon = _NAN if lon is None else lon
+        asn = self.asn_key(asn)
+        flags = _USED | (_MFA if mfa else 0)
+        with self._lock:
+            i = self._slots.get(user_id)
+            if i is None:
+                if self._free:
+                    i = self._free.pop()
+                else:
+                    i = len(self._ts)
+                    self._ts.append(0.0)
+                    self._lat.append(0.0)
+                    self._lon.append(0.0)
+                    self._asn.append(0)
+                    self._flags.append(0)
+                self._slots[sys.intern(user_id)] = i
+            self._ts[i] = ts
+            self._lat[i] = lat
+            self._lon[i] = lon
+            self._asn[i] = asn
+            self._flags[i] = flags
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Free users idle for longer than the TTL; returns how many were dropped."""
+        cutoff = (time.time() if now is None else now) - self.ttl
+        with self._lock:
+            ts = self._ts
+            expired = [(uid, i) for uid, i in self._slots.items() if ts[i] < cutoff]
+            for uid, i in expired:
+                del self._slots[uid]
+                self._flags[i] = 0
+                self._free.append(i)
+        return len(expired)
+
+    def status(self) -> Dict[str, Any]:
+        return {"users": len(self._slots), "slots": len(self._ts), "free": len(self._free),
+                "ttl_s": self.ttl, "path": self._path or None}
+
+    # --------------------
+    # Snapshots
+    # --------------------
+    def save(self, path: str) -> int:
+        """Write live users to ``path`` atomically; returns the user count."""
+        with self._lock:
+            items = list(self._slots.items())
+            cols = [a[:] for a in (self._ts, self._lat, self._lon, self._asn, self._flags)]
+            labels = dict(self._labels)
+        idx = [i for _, i in items]
+        dense = [array(c.typecode, [c[i] for i in idx]) for c in cols]
+        uid_off, blob = array("I"), bytearray()
+        for u, _ in items:
+            blob += u.encode("utf-8")
+            uid_off.append(len(blob))
+        header = json.dumps({"count": len(items), "byteorder": sys.byteorder, "labels": labels,
+                             "saved_at": time.time()}).encode()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".loginstate-", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEAD.pack(MAGIC, len(header)))
+                f.write(header)
+                for c in [uid_off] + dense:
+                    c.tofile(f)
+                f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return len(items)
+
+    def load(self, path: str) -> int:
+        """Replace the state with the snapshot at ``path`` (expired users dropped); returns the user count."""
+        with open(path, "rb") as f:
+            magic, n = _HEAD.unpack(f.read(_HEAD.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a login state snapshot")
+            header = json.loads(f.read(n))
+            count = header["count"]
+            cols = []
+            for code in ("I", "d", "f", "f", "I", "B"):
+                a = array(code)
+                a.fromfile(f, count)
+                if header["byteorder"] != sys.byteorder:
+                    a.byteswap()
+                cols.append(a)
+            uid_off = cols.pop(0)
+            blob = f.read()
+        if len(blob) != (uid_off[-1] if count else 0):
+            raise ValueError(f"{path}: truncated user ids")
+        uids, start = [], 0
+        for end in uid_off:
+            uids.append(blob[start:end].decode("utf-8"))
+            start = end
+        with self._lock:
+            self._ts, self._lat, self._lon, self._asn, self._flags = cols
+            self._slots = {sys.intern(u): i for i, u in enumerate(uids)}
+            self._free = array("I")
+            self._labels = header.get("labels") or {}
+        self.compact()
+        return len(self._slots)
+
+    # --------------------
+    # Maintenance thread
+    # --------------------
+    def start(self, path: str = LOGIN_STATE_PATH, interval: float = LOGIN_STATE_COMPACT_S) -> None:
+        self._path = path
+        if path and os.path.exists(path):
+            try:
+                log.info("login state: loaded %d users from %s", self.load(path), path)
+            except (OSError, EOFError, ValueError, KeyError) as ex:
+                log.warning("login state: ignoring unreadable snapshot %s: %s", path, ex)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="loginstate", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._path:
+            self.save(self._path)
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                t0 = time.perf_counter()
+                dropped = self.compact()
+                saved = self.save(self._path) if self._path else None
+                log.info("login state: %d expired, %s saved, %.2fs", dropped, saved, time.perf_counter() - t0)
+            except Exception:
+                log.exception("login state maintenance failed")
+
@@ -0,0 +1,148 @@
+"""
+Single-pass normalizer from producer event layouts to one canonical record.
+
+Producers send the same fields three ways: ECS dotted keys at the top level
+(``"source.ip": ...``), nested ECS objects (``{"source": {"ip": ...}}``) and
+the legacy generator layout (``{"src": {"ip": ...}}``). ``normalize(ev)``
+resolves every field once and returns an ``Event`` whose ``__slots__`` hold
+the canonical values, so each stage reads ``e.source_ip`` instead of
+repeating its own ``.get`` chain over every variant.
+
+Each slot tries its aliases in order, every alias first as a flat top-level
+key and then as a nested path; the first value that is not None wins (only
+None counts as missing; ``Event.get`` also treats "" as missing). A nested
+walk stops at the first intermediate that is not a dict.
+
+Edit this file under services/ingestor/app/utils/ only;
+scripts/sync_vendored.py copies it into the other services.
+"""
+from typing import Any, Dict, List, Tuple
+
+# slot name -> aliases, most authoritative first. The first alias is the
+# canonical ECS path used by Event.to_ecs().
+FIELDS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("timestamp", ("@timestamp",)),
+    ("user_id", ("user.id",)),
+    ("user_name", ("user.name", "user")),
+    ("event_action", ("event.action", "action")),
+    ("event_type", ("event.type", "type")),
+    ("event_category", ("event.category",)),
+    ("event_outcome", ("event.outcome",)),
+    ("event_mfa", ("event.mfa",)),
+    ("event_new_role", ("event.new_role",)),
+    ("risk_score", ("event.risk_score", "risk.score")),
+    ("risk_reasons", ("event.explanation", "risk.reason", "event_explanation")),
+    ("source_ip", ("source.ip", "src.ip")),
+    ("source_lat", ("source.geo.lat", "src.geo.lat")),
+    ("source_lon", ("source.geo.lon", "src.geo.lon")),
+    ("source_country", ("source.geo.country", "src.geo.country")),
+    ("source_asn", ("source.asn", "src.asn", "asn")),
+    ("source_reputation", ("source.reputation", "src.reputation")),
+    ("destination_ip", ("destination.ip",)),
+    ("user_agent_family", ("user_agent.family",)),
+    ("device_fingerprint", ("device.fingerprint",)),
+    ("geo_src", ("geo.src",)),
+    ("geo_prev", ("geo.prev",)),
+    ("rule_name", ("rule.name",)),
+    ("scenario", ("ith.scenario",)),
+)
+
+SLOTS: Tuple[str, ...] = tuple(name for name, _ in FIELDS)
+CANONICAL_PATHS: Dict[str, str] = {name: aliases[0] for name, aliases in FIELDS}
+
+
+_N = len(SLOTS)
+
+
+def _split(path: str) -> Tuple[str, str, str]:
+    parent, _, key = path.rpartition(".")
+    return path, parent, key
+
+
+# every object an alias reaches through (``source``, ``source.geo`` ...),
+# shallowest first; the parent path "" is the event itself
+_PARENTS = frozenset(p[:i] for _, aliases in FIELDS for p in aliases for i, c in enumerate(p) if c == ".")
+_OBJECTS = tuple(_split(p) for p in sorted(_PARENTS, key=lambda p: p.count(".")))
+_DOTTED = frozenset(p for _, aliases in FIELDS for p in aliases if "." in p)
+# per slot: (dicts count as missing, aliases as (path, parent, key)). A slot with
+# an alias that is also a parent (``user``) takes no dict: that is the parent object.
+_PLAN = tuple((not _PARENTS.isdisjoint(aliases), tuple(_split(p) for p in aliases)) for _, aliases in FIELDS)
+
+
+def _values(ev: Dict[str, Any]) -> List[Any]:
+    """Slot values in SLOTS order: each alias as a flat key, then under its parent object."""
+    objs = {"": ev}
+    for path, parent, key in _OBJECTS:
+        o = objs.get(parent)
+        if o is not None:
+            o = o.get(key)
+            if isinstance(o, dict):
+                objs[path] = o
+    flat = not _DOTTED.isdisjoint(ev)
+    out = []
+    for scalar, aliases in _PLAN:
+        for path, parent, key in aliases:
+            v = ev.get(path) if flat or not parent else None
+            if (v is None or scalar and isinstance(v, dict)) and parent:
+                o = objs.get(parent)
+                v = None if o is None else o.get(key)
+            if v is not None and not (scalar and isinstance(v, dict)):
+                break
+        else:
+            v = None
+        out.append(v)
+    return out
+
+
+class Event:
+    """Canonical view of one event. ``raw`` is the untouched producer dict."""
+
+    __slots__ = SLOTS + ("raw",)
+
+    def __init__(self, raw: Dict[str, Any], values=None):
+        self.raw = raw
+        for name, v in zip(SLOTS, values or (None,) * _N):
+            setattr(self, name, v)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Slot value, with ``default`` for missing or empty-string values."""
+        v = getattr(self, name, None)
+        return default if v is None or v == "" else v
+
+    @property
+    def user_key(self) -> str:
+        return str(self.user_id or self.user_name or "unknown")
+
+    @property
+    def mfa(self) -> bool:
+        v = self.event_mfa
+        if isinstance(v, str):
+            return v.strip().lower() in ("true", "1", "yes")
+        return bool(v)
+
+    def to_ecs(self) -> Dict[str, Any]:
+        """Nested ECS dict of the populated canonical fields."""
+        out: Dict[str, Any] = {}
+        for name in SLOTS:
+            v = getattr(self, name)
+            if v is None:
+                continue
+            node = out
+            *parents, leaf = CANONICAL_PATHS[name].split(".")
+            for p in parents:
+                node = node.setdefault(p, {})
+            node[leaf] = v
+        return out
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{n}={getattr(self, n)!r}" for n in SLOTS if getattr(self, n) is not None)
+        return f"Event({fields})"
+
+
+def normalize(ev: Any) -> Event:
+    """Canonical Event for ``ev`` (dotted, nested or legacy ``src`` layout)."""
+    if isinstance(ev, Event):
+        return ev
+    if not isinstance(ev, dict):
+        return Event({})
+    return Event(ev, _values(ev))
@@ -0,0 +1,137 @@
+"""
+Opt-in, authenticated on-demand profiling endpoints.
+
+    GET /debug/profile?seconds=N   wall-clock sampling profiler; returns
+                                   collapsed stacks ("a;b;c <count>") that
+                                   flamegraph.pl / speedscope load directly
+    GET /debug/alloc?seconds=N     top allocation sites (tracemalloc) that
+                                   grew during the window
+
+Disabled unless DEBUG_ENDPOINTS=true *and* DEBUG_TOKEN is set; requests must
+send the token as ``X-Debug-Token`` or ``Authorization: Bearer``. The sampler
+runs on its own thread and reads ``sys._current_frames()`` at a fixed
+interval, so the profiled code is never instrumented or slowed beyond the
+cost of the stack walk. Only one profile runs at a time.
+
+Edit this file under services/ingestor/app/utils/ only;
+scripts/sync_vendored.py copies it into the other services.
+"""
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Dict, List, Optional
+
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "false").lower() == "true"
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+MAX_SECONDS = float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "60"))
+
+_busy = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    co = frame.f_code
+    return f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> Dict[str, int]:
+    """Sample every other thread's stack for ``seconds``; returns {collapsed_stack: samples}."""
+    me = threading.get_ident()
+    names = {}
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for t in threading.enumerate():
+            names.setdefault(t.ident, t.name)
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(tid, f"thread-{tid}"))
+            stack.reverse()
+            counts[";".join(stack)] += 1
+        time.sleep(interval)
+    return dict(counts)
+
+
+def render_collapsed(counts: Dict[str, int]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items(), key=lambda kv: -kv[1]))
+
+
+def alloc_top(seconds: float, top: int = 25, nframes: int = 5) -> List[Dict[str, object]]:
+    """Allocation sites whose live size grew most during the window."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(nframes)
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    out = []
+    for st in after.compare_to(before, "traceback")[:top]:
+        out.append({
+            "size_diff_kb": round(st.size_diff / 1024, 1),
+            "size_kb": round(st.size / 1024, 1),
+            "count_diff": st.count_diff,
+            "traceback": [f"{fr.filename}:{fr.lineno}" for fr in st.traceback],
+        })
+    return out
+
+
+def _authorized(x_debug_token: Optional[str], authorization: Optional[str]) -> bool:
+    if not DEBUG_TOKEN:
+        return False
+    supplied = x_debug_token or ""
+    if not supplied and authorization and authorization.lower().startswith("bearer "):
+        supplied = authorization[7:].strip()
+    return hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode())
+
+
+def install_debug_routes(app) -> bool:
+    """Mount /debug/profile and /debug/alloc on ``app`` when enabled. Returns True if mounted."""
+    if not (DEBUG_ENDPOINTS and DEBUG_TOKEN):
+        return False
+    from fastapi import Header, HTTPException, Query
+    from fastapi.responses import PlainTextResponse
+
+    def _guard(x_debug_token, authorization):
+        if not _authorized(x_debug_token, authorization):
+            raise HTTPException(status_code=401, detail="debug token required")
+        if not _busy.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="another profile is running")
+
+    @app.get("/debug/profile", include_in_schema=False)
+    async def debug_profile(seconds: float = Query(10.0, gt=0),
+                            interval_ms: float = Query(10.0, ge=1.0, le=1000.0),
+                            x_debug_token: Optional[str] = Header(None),
+                            authorization: Optional[str] = Header(None)):
+        _guard(x_debug_token, authorization)
+        try:
+            counts = await asyncio.to_thread(sample_stacks, min(seconds, MAX_SECONDS), interval_ms / 1000.0)
+        finally:
+            _busy.release()
+        return PlainTextResponse(render_collapsed(counts))
+
+    @app.get("/debug/alloc", include_in_schema=False)
+    async def debug_alloc(seconds: float = Query(10.0, gt=0),
+                          top: int = Query(25, ge=1, le=500),
+                          x_debug_token: Optional[str] = Header(None),
+                          authorization: Optional[str] = Header(None)):
+        _guard(x_debug_token, authorization)
+        try:
+            sites = await asyncio.to_thread(alloc_top, min(seconds, MAX_SECONDS), top)
+        finally:
+            _busy.release()
+        return {"seconds": min(seconds, MAX_SECONDS), "top": sites}
+
+    return True
@@ -0,0 +1,135 @@
+"""
+Compact, token-budgeted prompts for the Vertex enrichment calls.
+
+Instead of the raw event JSON, the prompt carries only the fields that matter
+for identity threats, one ``key=value`` per line in a fixed order:
+
+    rule=ITH - Impossible Travel
+    user=alice id=u-1842
+    action=login type=start outcome=failure mfa=false
+    src=203.0.113.9 asn=64500 geo=US 40.71,-74.00 rep=tor_exit
+    risk=0.70 reasons=impossible_travel;asn_change
+
+The instructions come first and never change between calls, and every value
+is rendered deterministically (fixed field order, rounded floats, sorted
+lists, no timestamps), so identical events produce byte-identical prompts
+and the provider can reuse the cached prefix.
+
+The budget is counted with a chars/4 estimate (PROMPT_CHARS_PER_TOKEN); when
+a prompt would exceed PROMPT_MAX_TOKENS, the lowest-priority lines are
+dropped first and the last surviving line is truncated.
+"""
+import os
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from app.utils.normalize import Event, normalize
+
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "400"))
+PROMPT_CHARS_PER_TOKEN = float(os.getenv("PROMPT_CHARS_PER_TOKEN", "4"))
+_VALUE_MAX = 96  # chars per rendered value
+
+TRIAGE_INSTRUCTIONS = (
+    "You are a cybersecurity analyst triaging an identity event. "
+    "Reply with STRICT JSON only (no code fences) with keys: title, description, severity "
+    "(low|medium|high|critical), confidence (0-1), category, findings (array of "
+    "{title,detail,indicator}), recommended_actions (array of strings).\n"
+    "Event fields:\n"
+)
+
+SUMMARY_INSTRUCTIONS = (
+    "You are a SOC analyst. Summarize the risk of this identity event in one short sentence "
+    "and name a scenario. Reply with JSON only with keys: summary (string), confidence (0-1), "
+    "scenario (string).\n"
+    "Event fields:\n"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / PROMPT_CHARS_PER_TOKEN + 0.999)
+
+
+def _fmt(v: Any) -> Optional[str]:
+    if v is None or v == "" or v == [] or v == {}:
+        return None
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    if isinstance(v, float):
+        return f"{v:.2f}"
+    if isinstance(v, (list, tuple, set)):
+        parts = sorted(p for p in (_fmt(x) for x in v) if p)
+        return ",".join(parts) or None
+    if isinstance(v, dict):
+        parts = [f"{k}:{s}" for k, s in sorted((str(k), _fmt(x)) for k, x in v.items()) if s]
+        return ",".join(parts) or None
+    s = " ".join(str(v).split())  # collapse newlines / runs of whitespace
+    return s[:_VALUE_MAX] if s else None
+
+
+def _geo(e: Event) -> Optional[str]:
+    parts = []
+    if e.source_country:
+        parts.append(str(e.source_country))
+    lat, lon = e.source_lat, e.source_lon
+    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+        parts.append(f"{lat:.2f},{lon:.2f}")
+    return " ".join(parts) or None
+
+
+def _reputation(e: Event) -> Optional[str]:
+    rep = e.source_reputation
+    if not isinstance(rep, dict):
+        return _fmt(rep)
+    return _fmt(sorted(set(rep.get("ip") or []) | {f"asn:{f}" for f in rep.get("asn") or []}))
+
+
+# (priority, line fields); lower priority number survives longer. Each field
+# is (key, getter(event, extra) -> value).
+_Getter = Callable[[Event, dict], Any]
+_LINES: Sequence[Tuple[int, Sequence[Tuple[str, _Getter]]]] = (
+    (0, (("rule", lambda e, x: x.get("rule_name") or e.rule_name),)),
+    (0, (("user", lambda e, x: e.user_name), ("id", lambda e, x: e.user_id if e.user_id != e.user_name else None))),
+    (0, (("action", lambda e, x: e.event_action), ("type", lambda e, x: e.event_type),
+         ("outcome", lambda e, x: e.event_outcome), ("mfa", lambda e, x: e.event_mfa))),
+    (1, (("src", lambda e, x: e.source_ip), ("asn", lambda e, x: e.source_asn),
+         ("geo", lambda e, x: _geo(e)), ("rep", lambda e, x: _reputation(e)))),
+    (1, (("risk", lambda e, x: e.risk_score), ("reasons", lambda e, x: e.risk_reasons))),
+    (2, (("category", lambda e, x: e.event_category), ("role", lambda e, x: e.event_new_role),
+         ("scenario", lambda e, x: e.scenario))),
+    (3, (("geo_src", lambda e, x: e.geo_src), ("geo_prev", lambda e, x: e.geo_prev),
+         ("dst", lambda e, x: e.destination_ip), ("ua", lambda e, x: e.user_agent_family))),
+)
+
+
+def event_lines(ev: Any, **extra: Any) -> List[Tuple[int, str]]:
+    """(priority, "k=v k=v") lines for the populated fields, in prompt order."""
+    e = normalize(ev)
+    out = []
+    for prio, fields in _LINES:
+        parts = []
+        for key, get in fields:
+            s = _fmt(get(e, extra))
+            if s is not None:
+                parts.append(f"{key}={s}")
+        if parts:
+            out.append((prio, " ".join(parts)))
+    return out
+
+
+def build_prompt(instructions: str, ev: Any, max_tokens: Optional[int] = None, **extra: Any) -> str:
+    """
+    ``instructions`` followed by the compact event block, within ``max_tokens``
+    (default PROMPT_MAX_TOKENS). ``extra`` overrides event fields, e.g.
+    ``rule_name`` inferred by the caller.
+    """
+    budget = int((max_tokens or PROMPT_MAX_TOKENS) * PROMPT_CHARS_PER_TOKEN) - len(instructions)
+    lines: List[Optional[Tuple[int, str]]] = list(event_lines(ev, **extra))
+    total = sum(len(s) + 1 for _, s in lines)
+    # Drop whole lines, lowest priority (and latest) first; priority 0 lines
+    # are never dropped, only truncated.
+    for i in sorted(range(len(lines)), key=lambda i: (-lines[i][0], -i)):
+        if total <= budget or lines[i][0] == 0:
+            break
+        total -= len(lines[i][1]) + 1
+        lines[i] = None
+    body = "\n".join(line[1] for line in lines if line is not None)
+    return instructions + body[:max(budget, 0)]
@@ -0,0 +1,177 @@
+"""
+Sorted fixed-width range tables on disk, memory-mapped and binary-searched.
+
+A range file holds one or more named sections. Each section is an array of
+records ``start | end | payload`` where start/end are big-endian keys of a
+fixed width (4 bytes for IPv4/ASN, 16 for IPv6), sorted by start and
+non-overlapping. Big-endian keys compare correctly as raw bytes, so lookups
+never decode the file: a process maps it once and every worker on the host
+shares the same page cache.
+
+Files are always replaced atomically (write to a temp file, fsync, rename),
+so readers either see the old table or the new one, never a partial write.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+_HEAD = struct.Struct("<8sI")
+
+
+class RangeFile:
+    def __init__(self, path: str, magic: bytes):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            st = os.fstat(f.fileno())
+        self.stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        got, hlen = _HEAD.unpack_from(self._mm, 0)
+        if got != magic:
+            raise ValueError(f"{path}: bad magic {got!r}, expected {magic!r}")
+        header = json.loads(self._mm[_HEAD.size:_HEAD.size + hlen])
+        self.meta: Dict[str, Any] = header.get("meta", {})
+        self._sections: Dict[str, Tuple[int, int, int, int]] = {
+            name: (s["offset"], s["count"], s["width"], 2 * s["width"] + s["payload"])
+            for name, s in header["sections"].items()
+        }
+
+    def count(self, section: str) -> int:
+        sec = self._sections.get(section)
+        return sec[1] if sec else 0
+
+    def find(self, section: str, key: bytes) -> Optional[bytes]:
+        """Payload of the range containing ``key``, or None. O(log n)."""
+        sec = self._sections.get(section)
+        if not sec:
+            return None
+        off, n, w, rs = sec
+        if len(key) != w:
+            return None
+        mm = self._mm
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            base = off + mid * rs
+            if mm[base:base + w] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        base = off + (lo - 1) * rs
+        if key <= mm[base + w:base + 2 * w]:
+            return mm[base + 2 * w:base + rs]
+        return None
+
+
+def write_rangefile(path: str, magic: bytes,
+                    sections: Dict[str, Tuple[int, int, Iterable[Tuple[bytes, bytes, bytes]]]],
+                    meta: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Write ``sections`` ({name: (width, payload_size, sorted records)}) and
+    atomically swap the result into ``path``.
+    """
+    names = list(sections)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".rangefile-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # Records are streamed to a scratch area first because the header
+            # (which holds section offsets) must precede them.
+            blobs, counts = [], {}
+            for name in names:
+                width, psize, records = sections[name]
+                buf = bytearray()
+                n = 0
+                for start, end, payload in records:
+                    if len(start) != width or len(end) != width or len(payload) != psize:
+                        raise ValueError(f"section {name}: record does not match width/payload size")
+                    buf += start
+                    buf += end
+                    buf += payload
+                    n += 1
+                blobs.append(buf)
+                counts[name] = n
+
+            def header_for(base: int) -> bytes:
+                table, off = {}, base
+                for name, buf in zip(names, blobs):
+                    width, psize, _ = sections[name]
+                    table[name] = {"offset": off, "count": counts[name], "width": width, "payload": psize}
+                    off += len(buf)
+                return json.dumps({"meta": meta or {}, "sections": table}, sort_keys=True).encode()
+
+            # Offsets depend on header length; iterate until it is stable.
+            base = 0
+            while True:
+                hdr = header_for(base)
+                want = (_HEAD.size + len(hdr) + 7) & ~7
+                if want == base:
+                    break
+                base = want
+            f.write(_HEAD.pack(magic, len(hdr)))
+            f.write(hdr)
+            f.write(b"\0" * (base - _HEAD.size - len(hdr)))
+            for buf in blobs:
+                f.write(buf)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    try:
+        dfd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dfd)
+        finally:
+            os.close(dfd)
+    except OSError:
+        pass
+
+
+class MappedRangeFile:
+    """
+    Holder that re-maps the file when it has been swapped on disk. The stat
+    check runs at most every ``check_interval`` seconds, so the hot path is a
+    timestamp comparison and an attribute read.
+    """
+
+    def __init__(self, path: str, magic: bytes, check_interval: float = 30.0):
+        self.path = path
+        self.magic = magic
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._rf: Optional[RangeFile] = None
+        self._next_check = 0.0
+
+    def get(self) -> Optional[RangeFile]:
+        now = time.monotonic()
+        if now >= self._next_check:
+            with self._lock:
+                if now >= self._next_check:
+                    self._next_check = now + self.check_interval
+                    self._reload()
+        return self._rf
+
+    def _reload(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._rf = None
+            return
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self._rf is not None and self._rf.stamp == stamp:
+            return
+        # The previous map is left for the GC so in-flight lookups stay valid.
+        self._rf = RangeFile(self.path, self.magic)
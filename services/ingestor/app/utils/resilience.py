@@ -0,0 +1,231 @@
+"""
+Deadline, circuit breaker and hedging around blocking model calls.
+
+    guard = ModelGuard()
+    resp = await guard.call(model.generate_content, prompt, hedge=is_p1)
+
+``call`` runs ``fn`` on the guard's own thread pool and gives up after
+AI_TIMEOUT_S (ModelTimeout). The worker thread cannot be interrupted and
+finishes in the background, but the request no longer waits for it.
+
+The breaker keeps the last AI_BREAKER_WINDOW outcomes. A call counts as a
+failure when it raises, times out, or takes longer than AI_SLOW_MS. Once at
+least AI_BREAKER_MIN_CALLS are recorded and the failure share reaches
+AI_BREAKER_ERROR_RATE, the breaker opens. While open, ``call`` raises
+BreakerOpen immediately, so callers go straight to their fallback output.
+After AI_BREAKER_COOLDOWN_S one probe call is let through: success closes
+the breaker, failure re-opens it.
+
+With ``hedge=True``, a second identical request starts if the first has not
+answered after AI_HEDGE_AFTER_MS. Whichever succeeds first wins, and both
+share the same deadline.
+
+FakeModel stands in for GenerativeModel in local runs and load tests, with
+injected latency, spikes and errors. Set it with
+AI_FAKE_MODEL="latency_ms=200,jitter_ms=50,spike_rate=0.02,spike_ms=8000,error_rate=0.05".
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.utils import metrics
+
+AI_TIMEOUT_S = float(os.getenv("AI_TIMEOUT_S", "20"))
+AI_SLOW_MS = float(os.getenv("AI_SLOW_MS", "8000"))
+AI_HEDGE_AFTER_MS = float(os.getenv("AI_HEDGE_AFTER_MS", "2000"))
+AI_WORKERS = int(os.getenv("AI_WORKERS", "16"))
+AI_BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", "20"))
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "5"))
+AI_BREAKER_ERROR_RATE = float(os.getenv("AI_BREAKER_ERROR_RATE", "0.5"))
+AI_BREAKER_COOLDOWN_S = float(os.getenv("AI_BREAKER_COOLDOWN_S", "30"))
+AI_FAKE_MODEL = os.getenv("AI_FAKE_MODEL", "")
+
+_CALLS = metrics.counter("ith_ai_calls_total", "Guarded model calls by outcome", ["outcome"])
+_HEDGES = metrics.counter("ith_ai_hedges_total", "Hedged model requests", ["event"])
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class BreakerOpen(Exception):
+    pass
+
+
+class ModelTimeout(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, window: int = AI_BREAKER_WINDOW, min_calls: int = AI_BREAKER_MIN_CALLS,
+                 error_rate: float = AI_BREAKER_ERROR_RATE, cooldown: float = AI_BREAKER_COOLDOWN_S):
+        self.min_calls = max(1, min_calls)
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._window: deque = deque(maxlen=max(1, window))
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state, self._probing = HALF_OPEN, False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self.state = CLOSED
+                    self._window.clear()
+                else:
+                    self._open()
+                return
+            self._window.append(ok)
+            n = len(self._window)
+            if self.state == CLOSED and n >= self.min_calls and self._window.count(False) / n >= self.error_rate:
+                self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._window.clear()
+
+
+def _consume(f: "asyncio.Future") -> None:
+    # Losing / abandoned attempts finish later; read their outcome so asyncio
+    # does not log "exception was never retrieved".
+    if not f.cancelled():
+        f.exception()
+
+
+class ModelGuard:
+    def __init__(self, timeout: float = AI_TIMEOUT_S, slow_ms: float = AI_SLOW_MS,
+                 hedge_after_ms: float = AI_HEDGE_AFTER_MS, workers: int = AI_WORKERS,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.timeout = timeout
+        self.slow = slow_ms / 1000.0
+        self.hedge_after = hedge_after_ms / 1000.0
+        self.breaker = breaker or CircuitBreaker()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="model")
+        metrics.gauge("ith_ai_breaker_state", "Model circuit breaker (0 closed, 1 half-open, 2 open)").set_function(
+            lambda: _STATE_VALUE[self.breaker.state])
+
+    async def call(self, fn: Callable[..., Any], *args: Any, hedge: bool = False, **kwargs: Any) -> Any:
+        """``fn(*args, **kwargs)`` within the deadline; raises BreakerOpen, ModelTimeout or fn's error."""
+        if not self.breaker.allow():
+            _CALLS.labels("short_circuit").inc()
+            raise BreakerOpen("model circuit open")
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        deadline = t0 + self.timeout
+
+        def start():
+            f = loop.run_in_executor(self._pool, lambda: fn(*args, **kwargs))
+            f.add_done_callback(_consume)
+            return f
+
+        attempts = [start()]
+        pending = set(attempts)
+        err: Optional[BaseException] = None
+        while pending:
+            wait = deadline - loop.time()
+            if hedge and len(attempts) == 1:
+                wait = min(wait, t0 + self.hedge_after - loop.time())
+            done, pending = await asyncio.wait(pending, timeout=max(wait, 0),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if len(attempts) > 1:
+                        _HEDGES.labels("won" if f is attempts[1] else "lost").inc()
+                    elapsed = loop.time() - t0
+                    self.breaker.record(elapsed <= self.slow)
+                    _CALLS.labels("ok" if elapsed <= self.slow else "slow").inc()
+                    return f.result()
+                err = f.exception()
+            if loop.time() >= deadline:
+                break
+            # Hedge on slowness only; a fast error is not retried.
+            if hedge and len(attempts) == 1 and pending:
+                attempts.append(start())
+                pending.add(attempts[1])
+                _HEDGES.labels("launched").inc()
+        if pending:
+            self.breaker.record(False)
+            _CALLS.labels("timeout").inc()
+            raise ModelTimeout(f"model call exceeded {self.timeout:g}s")
+        self.breaker.record(False)
+        _CALLS.labels("error").inc()
+        raise err
+
+    def status(self) -> Dict[str, Any]:
+        return {"breaker": self.breaker.state, "timeout_s": self.timeout, "hedge_after_ms": self.hedge_after * 1000}
+
+
+# --------------------
+# Local fake model
+# --------------------
+_FAKE_TEXT = (
+    '{"title":"Fake analysis","description":"Synthetic response from FakeModel.","severity":"low",'
+    '"confidence":0.5,"category":"test","findings":[],"recommended_actions":[],'
+    '"summary":"Synthetic response from FakeModel.","scenario":"fake"}'
+)
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+        self.candidates = []
+
+
+class FakeModel:
+    """``generate_content`` with injected latency, spikes and errors."""
+
+    def __init__(self, latency_ms: float = 200, jitter_ms: float = 50, spike_rate: float = 0.0,
+                 spike_ms: float = 5000, error_rate: float = 0.0, text: str = _FAKE_TEXT,
+                 seed: Optional[int] = None):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.spike_rate = spike_rate
+        self.spike = spike_ms / 1000.0
+        self.error_rate = error_rate
+        self.text = text
+        self.calls = 0
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: Any, **kwargs: Any) -> _FakeResponse:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + self._rnd.uniform(0, self.jitter)
+            if self._rnd.random() < self.spike_rate:
+                delay = self.spike
+            fail = self._rnd.random() < self.error_rate
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError("FakeModel injected error")
+        return _FakeResponse(self.text)
+
+
+def fake_model_from_env(spec: str = AI_FAKE_MODEL) -> Optional[FakeModel]:
+    """FakeModel from a ``name=value,...`` spec (AI_FAKE_MODEL); None when unset."""
+    if not spec:
+        return None
+    kwargs: Dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            kwargs[name.strip()] = float(value)
+    return FakeModel(**kwargs)
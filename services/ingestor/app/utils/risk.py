@@ -0,0 +1,153 @@
+"""
+Login risk heuristics on event time.
+
+    engine = RiskEngine()                      # thresholds from env
+    score, reasons = engine.score(user_id, event, ts)   # ts: epoch seconds
+
+The engine keeps its own state (last login per user, recent failures per
+user, recent users per IP), so the live ingestor and a replay can run side
+by side with different thresholds. All windows are measured in event time,
+which is what lets the replay (app.utils.replay) run history as fast as the
+CPU allows. The wall clock is only read to keep logins stamped more than
+RISK_MAX_SKEW_S in the future out of the graph; history never is.
+
+    impossible_travel    speed since the previous login > RISK_TRAVEL_KMH
+    asn_change           ASN differs from the previous login
+    mfa_bypass           no MFA within RISK_MFA_BYPASS_S of a login with MFA
+    brute_force          >= RISK_BRUTE_FAILS failures within RISK_BRUTE_WINDOW_S
+    credential_stuffing  >= RISK_STUFFING_USERS users from one IP within RISK_STUFFING_WINDOW_S
+    shared_account       user on >= RISK_SHARED_DEVICES device fingerprints within RISK_GRAPH_WINDOW_S
+    lateral_movement     device fingerprint used by >= RISK_LATERAL_USERS users within RISK_GRAPH_WINDOW_S
+    privilege_escalation role_change to admin
+
+The last two read the user / IP / device graph (app.utils.graph), which
+every login with a source IP or device fingerprint updates.
+"""
+import os
+from collections import deque
+from math import asin, cos, radians, sin, sqrt
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.utils.graph import EntityGraph
+from app.utils.loginstate import LoginState
+from app.utils.normalize import Event
+
+RISK_TRAVEL_KMH = float(os.getenv("RISK_TRAVEL_KMH", "900"))
+RISK_MFA_BYPASS_S = float(os.getenv("RISK_MFA_BYPASS_S", "3600"))
+RISK_BRUTE_FAILS = int(os.getenv("RISK_BRUTE_FAILS", "10"))
+RISK_BRUTE_WINDOW_S = float(os.getenv("RISK_BRUTE_WINDOW_S", "300"))
+RISK_STUFFING_USERS = int(os.getenv("RISK_STUFFING_USERS", "10"))
+RISK_STUFFING_WINDOW_S = float(os.getenv("RISK_STUFFING_WINDOW_S", "300"))
+RISK_GRAPH_WINDOW_S = float(os.getenv("RISK_GRAPH_WINDOW_S", "3600"))
+RISK_SHARED_DEVICES = int(os.getenv("RISK_SHARED_DEVICES", "5"))
+RISK_LATERAL_USERS = int(os.getenv("RISK_LATERAL_USERS", "5"))
+RISK_MAX_SKEW_S = float(os.getenv("RISK_MAX_SKEW_S", "300"))
+
+WEIGHTS = {
+    "impossible_travel": 0.7, "asn_change": 0.3, "mfa_bypass": 0.5, "brute_force": 0.6,
+    "credential_stuffing": 0.7, "shared_account": 0.4, "lateral_movement": 0.6, "privilege_escalation": 1.0,
+}
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dphi = radians(lat2 - lat1)
+    dlambda = radians(lon2 - lon1)
+    a = sin(dphi/2)**2 + cos(phi1) * cos(phi2) * sin(dlambda/2)**2
+    return 2 * R * asin(sqrt(a))
+
+
+def _safe_float(v) -> Optional[float]:
+    try:
+        return float(v) if v is not None else None
+    except Exception:
+        return None
+
+
+class RiskEngine:
+    def __init__(self, travel_kmh: float = RISK_TRAVEL_KMH, mfa_bypass_s: float = RISK_MFA_BYPASS_S,
+                 brute_fails: int = RISK_BRUTE_FAILS, brute_window_s: float = RISK_BRUTE_WINDOW_S,
+                 stuffing_users: int = RISK_STUFFING_USERS, stuffing_window_s: float = RISK_STUFFING_WINDOW_S,
+                 shared_devices: int = RISK_SHARED_DEVICES, lateral_users: int = RISK_LATERAL_USERS,
+                 graph_window_s: float = RISK_GRAPH_WINDOW_S, logins: Optional[LoginState] = None,
+                 max_skew_s: float = RISK_MAX_SKEW_S):
+        self.travel_kmh = travel_kmh
+        self.mfa_bypass_s = mfa_bypass_s
+        self.brute_fails = brute_fails
+        self.brute_window_s = brute_window_s
+        self.stuffing_users = stuffing_users
+        self.stuffing_window_s = stuffing_window_s
+        self.shared_devices = shared_devices
+        self.lateral_users = lateral_users
+        self.graph = EntityGraph(graph_window_s, max_skew_s=max_skew_s)
+        self.logins = logins if logins is not None else LoginState()
+        self._failures: Dict[str, Deque[float]] = {}
+        self._ip_users: Dict[str, Deque[Tuple[str, float]]] = {}
+
+    def score(self, user_id: str, e: Event, ts: float) -> Tuple[float, str]:
+        """(score in 0..1, ";"-joined reasons or "none") for ``e`` at epoch ``ts``; updates the state."""
+        reasons: List[str] = []
+        if e.event_action == "login":
+            prev = self.logins.get(user_id)
+            lat, lon = _safe_float(e.source_lat), _safe_float(e.source_lon)
+            asn = e.source_asn
+            ip = e.source_ip
+
+            if prev:
+                if prev.lat is not None and prev.lon is not None and lat is not None and lon is not None:
+                    dt_h = (ts - prev.ts) / 3600.0
+                    if dt_h > 0 and haversine(prev.lat, prev.lon, lat, lon) / dt_h > self.travel_kmh:
+                        reasons.append("impossible_travel")
+                if prev.asn and asn and prev.asn != self.logins.asn_key(asn):
+                    reasons.append("asn_change")
+                if prev.mfa and not e.mfa and ts - prev.ts <= self.mfa_bypass_s:
+                    reasons.append("mfa_bypass")
+
+            if e.event_outcome == "failure":
+                fails = self._failures.setdefault(user_id, deque())
+                fails.append(ts)
+                while fails and ts - fails[0] > self.brute_window_s:
+                    fails.popleft()
+                if len(fails) >= self.brute_fails:
+                    reasons.append("brute_force")
+            else:
+                self._failures.pop(user_id, None)
+
+            if ip:
+                seen = self._ip_users.setdefault(ip, deque())
+                seen.append((user_id, ts))
+                while seen and ts - seen[0][1] > self.stuffing_window_s:
+                    seen.popleft()
+                if len(seen) >= self.stuffing_users and len({u for u, _ in seen}) >= self.stuffing_users:
+                    reasons.append("credential_stuffing")
+
+            device = e.device_fingerprint
+            if ip or device:
+                g = self.graph
+                g.observe(ts, user_id, ip, device)
+                if device and g.degree("user", user_id, "device") >= self.shared_devices:
+                    reasons.append("shared_account")
+                if device and g.degree("device", device) >= self.lateral_users:
+                    reasons.append("lateral_movement")
+
+            self.logins.put(user_id, ts, lat, lon, asn, e.mfa)
+
+        if e.event_action == "role_change" and e.event_new_role == "admin":
+            reasons.append("privilege_escalation")
+
+        score = max(0.0, min(1.0, sum(WEIGHTS[r] for r in reasons)))
+        return score, (";".join(reasons) if reasons else "none")
+
+    def sweep(self, ts: float) -> None:
+        """Drop failure and IP windows whose newest entry is older than their window at ``ts``."""
+        for key, d in list(self._failures.items()):
+            if not d or ts - d[-1] > self.brute_window_s:
+                del self._failures[key]
+        for key, d in list(self._ip_users.items()):
+            if not d or ts - d[-1][1] > self.stuffing_window_s:
+                del self._ip_users[key]
+
+    def status(self) -> Dict[str, int]:
+        return {"users": len(self.logins), "failing_users": len(self._failures), "tracked_ips": len(self._ip_users),
+                "graph": self.graph.status()}
@@ -0,0 +1,252 @@
+"""
+Per-minute and per-hour rollups of scored events, kept in memory and
+written to a small rollup index for dashboards.
+
+    r = Rollups()
+    r.add(ts, user_id, reasons, score, source_ip, failed)   # per scored event
+    r.start(ship)                                           # flush thread
+
+One bucket per (interval, start, dimension, key). The dimension is ``user``
+(every event) or ``rule`` (each reason other than "none"). A bucket holds
+the event and failure counts, risk sum and max, and the distinct source IPs
+(the first ROLLUP_MAX_IPS are kept; ``distinct_ips`` counts them all).
+
+Every ROLLUP_FLUSH_S the buckets changed since the last flush are sent as
+``index`` operations with a deterministic ``_id``. Open hour buckets are
+sent only every ROLLUP_HOUR_REFRESH_S, since they would otherwise be
+rewritten on every flush. The ``_id`` is
+``<instance>:<interval>:<dimension>:<key>:<start>``. Each document is
+the bucket's full cumulative state, so re-sending one (after a retry, or
+the next flush of a still-open bucket) is idempotent. Items that fail with
+a retryable status stay dirty for the next flush. ROLLUP_INSTANCE keeps
+replicas from overwriting each other; dashboards sum ``events`` across
+instances. Buckets are assigned by event time. A bucket closes once the
+newest event seen is ROLLUP_LATENESS_S past its end, and it is dropped
+from memory after its last state is stored. Events that arrive for an
+already dropped bucket are counted as late and skipped rather than
+overwriting the stored document with a partial one. Events stamped more
+than ROLLUP_MAX_SKEW_S past the wall clock are counted as future and
+skipped, so one bad timestamp cannot push the watermark ahead and make
+every later event late.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.utils import metrics
+from app.utils.es_bulk import RETRYABLE_STATUSES
+
+ROLLUP_INDEX = os.getenv("ROLLUP_INDEX", "ith-rollups")
+ROLLUP_FLUSH_S = float(os.getenv("ROLLUP_FLUSH_S", "10"))
+ROLLUP_HOUR_REFRESH_S = float(os.getenv("ROLLUP_HOUR_REFRESH_S", "60"))
+ROLLUP_LATENESS_S = float(os.getenv("ROLLUP_LATENESS_S", "120"))
+ROLLUP_MAX_IPS = int(os.getenv("ROLLUP_MAX_IPS", "100"))
+ROLLUP_INSTANCE = os.getenv("ROLLUP_INSTANCE") or socket.gethostname()
+ROLLUP_MAX_SKEW_S = float(os.getenv("ROLLUP_MAX_SKEW_S", "300"))
+
+INTERVALS = (("1m", 60), ("1h", 3600))
+_WIDTH = dict(INTERVALS)
+
+log = logging.getLogger("ith-rollup")
+
+_FLUSHED = metrics.counter("ith_rollup_docs_total", "Rollup documents sent by outcome", ["outcome"])
+_LATE = metrics.counter("ith_rollup_late_total", "Events skipped because their rollup bucket was already closed")
+_FUTURE = metrics.counter("ith_rollup_future_total", "Events skipped because their time is past the wall clock")
+
+# (interval label, bucket start, dimension, key)
+Key = Tuple[str, int, str, str]
+# items for ship(): (index, _id, doc) -> one status per item
+Ship = Callable[[List[Tuple[str, str, Dict[str, Any]]]], List[int]]
+
+
+class _Bucket:
+    __slots__ = ("events", "failures", "risk_sum", "risk_max", "ips", "extra_ips", "dirty")
+
+    def __init__(self):
+        self.events = 0
+        self.failures = 0
+        self.risk_sum = 0.0
+        self.risk_max = 0.0
+        self.ips: Dict[str, None] = {}
+        self.extra_ips: Optional[set] = None  # IPs past ROLLUP_MAX_IPS, counted only
+        self.dirty = True
+
+
+class Rollups:
+    def __init__(self, index: str = ROLLUP_INDEX, flush_s: float = ROLLUP_FLUSH_S,
+                 lateness_s: float = ROLLUP_LATENESS_S, max_ips: int = ROLLUP_MAX_IPS,
+                 instance: str = ROLLUP_INSTANCE, hour_refresh_s: float = ROLLUP_HOUR_REFRESH_S,
+                 max_skew_s: float = ROLLUP_MAX_SKEW_S, clock: Callable[[], float] = time.time):
+        self.index = index
+        self.flush_s = flush_s
+        self._refresh = {"1m": 0.0, "1h": hour_refresh_s}
+        self._sent_at: Dict[str, float] = {}
+        self.lateness_s = lateness_s
+        self.max_ips = max_ips
+        self.instance = instance
+        self.max_skew_s = max_skew_s
+        self._clock = clock
+        self.watermark = 0.0
+        self._buckets: Dict[Key, _Bucket] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.late = 0
+        self.future = 0
+        self.sent = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    # --------------------
+    # Accumulate
+    # --------------------
+    def add(self, ts: float, user: str, reasons: str, score: float, ip: Optional[str] = None,
+            failed: bool = False) -> None:
+        keys = [("user", user)]
+        if reasons and reasons != "none":
+            keys.extend(("rule", r) for r in reasons.split(";") if r)
+        with self._lock:
+            if ts > self.watermark:
+                if ts > self._clock() + self.max_skew_s:
+                    self.future += 1
+                    _FUTURE.inc()
+                    return
+                self.watermark = ts
+            horizon = self.watermark - self.lateness_s
+            buckets = self._buckets
+            for label, width in INTERVALS:
+                start = int(ts // width) * width
+                closed = start + width < horizon
+                for dim, value in keys:
+                    k = (label, start, dim, value)
+                    b = buckets.get(k)
+                    if b is None:
+                        if closed:
+                            self.late += 1
+                            _LATE.inc()
+                            continue
+                        b = buckets[k] = _Bucket()
+                    b.events += 1
+                    b.failures += failed
+                    b.risk_sum += score
+                    if score > b.risk_max:
+                        b.risk_max = score
+                    if ip and ip not in b.ips:
+                        if len(b.ips) < self.max_ips:
+                            b.ips[ip] = None
+                        else:
+                            if b.extra_ips is None:
+                                b.extra_ips = set()
+                            b.extra_ips.add(ip)
+                    b.dirty = True
+
+    # --------------------
+    # Flush
+    # --------------------
+    def doc_id(self, k: Key) -> str:
+        label, start, dim, value = k
+        return f"{self.instance}:{label}:{dim}:{value}:{start}"
+
+    def _doc(self, k: Key, events: int, failures: int, risk_sum: float, risk_max: float, ips: List[str],
+             distinct: int) -> Dict[str, Any]:
+        label, start, dim, value = k
+        return {
+            "@timestamp": datetime.fromtimestamp(start, timezone.utc).isoformat().replace("+00:00", "Z"),
+            "interval": label, "dimension": dim, "key": value, "instance": self.instance,
+            "events": events, "failures": failures,
+            "risk_sum": round(risk_sum, 4), "risk_max": risk_max, "risk_avg": round(risk_sum / events, 4),
+            "distinct_ips": distinct, "ips": ips,
+        }
+
+    def collect(self, now: Optional[float] = None) -> List[Tuple[Key, Dict[str, Any]]]:
+        """Documents for dirty buckets (marked clean), after dropping closed buckets already stored.
+
+        Open hour buckets are only included every ROLLUP_HOUR_REFRESH_S; closed ones always are.
+        """
+        now = time.monotonic() if now is None else now
+        due = {label for label, _ in INTERVALS if now - self._sent_at.get(label, float("-inf")) >= self._refresh[label]}
+        for label in due:
+            self._sent_at[label] = now
+        snap = []
+        with self._lock:
+            horizon = self.watermark - self.lateness_s
+            for k, b in list(self._buckets.items()):
+                closed = k[1] + _WIDTH[k[0]] < horizon
+                if not b.dirty:
+                    if closed:
+                        del self._buckets[k]
+                    continue
+                if not closed and k[0] not in due:
+                    continue
+                snap.append((k, b.events, b.failures, b.risk_sum, b.risk_max, list(b.ips),
+                             len(b.ips) + (len(b.extra_ips) if b.extra_ips else 0)))
+                b.dirty = False
+        return [(s[0], self._doc(*s)) for s in snap]
+
+    def flush(self, ship: Ship, now: Optional[float] = None) -> int:
+        """Send dirty buckets; returns documents stored. Retryable failures stay dirty."""
+        docs = self.collect(now)
+        if not docs:
+            return 0
+        try:
+            statuses = ship([(self.index, self.doc_id(k), d) for k, d in docs])
+        except Exception as ex:
+            log.warning("rollup flush failed: %s", ex)
+            statuses = [503] * len(docs)
+        ok = retry = 0
+        with self._lock:
+            for (k, _), st in zip(docs, statuses):
+                if st < 300:
+                    ok += 1
+                elif st in RETRYABLE_STATUSES:
+                    retry += 1
+                    b = self._buckets.get(k)
+                    if b is not None:
+                        b.dirty = True
+        bad = len(docs) - ok - retry
+        self.sent += ok
+        self.failed += bad
+        _FLUSHED.labels("ok").inc(ok)
+        if retry:
+            _FLUSHED.labels("retry").inc(retry)
+        if bad:
+            _FLUSHED.labels("error").inc(bad)
+            log.warning("rollup flush: %d documents rejected", bad)
+        return ok
+
+    def start(self, ship: Ship) -> None:
+        if self._thread is not None or self.flush_s <= 0:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.flush_s):
+                self.flush(ship)
+            self.flush(ship)
+
+        self._thread = threading.Thread(target=run, name="rollup-flush", daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            dirty = sum(1 for b in self._buckets.values() if b.dirty)
+            held = len(self._buckets)
+        return {"index": self.index, "instance": self.instance, "buckets": held, "dirty": dirty,
+                "sent": self.sent, "failed": self.failed, "late": self.late, "future": self.future, "flush_s": self.flush_s,
+                "watermark": self.watermark}
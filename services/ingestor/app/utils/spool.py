@@ -0,0 +1,475 @@
+"""
+Durable on-disk spool between /ingest and Elasticsearch.
+
+Events are appended to size-capped segment files (``<id>.seg``) as framed
+records ``[len u32][crc32 u32][payload]``. A flusher thread fsyncs the active
+segment every ``fsync_interval`` seconds and releases every appender that was
+waiting on that batch (group commit), so /ingest can acknowledge once an event
+is on disk without paying one fsync per request.
+
+A drainer thread reads from the committed offset, ships records to Elastic in
+bulk and only then advances ``offset.json`` (written atomically). A crash
+re-ships at most the batch that was in flight (at-least-once). Torn writes at
+the tail of the last segment are detected by the CRC and truncated on open.
+Fully drained segments are deleted.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.utils.codec import dumps, loads
+from app.utils.es_bulk import RetryableError
+
+log = logging.getLogger("ingestor.spool")
+
+_FRAME = struct.Struct(">II")
+_SEG_FMT = "{:012d}.seg"
+_OFFSET_FILE = "offset.json"
+_DEAD_LETTER = "dead-letter.ndjson"
+
+# Unset SPOOL_DIR keeps the synchronous write path.
+SPOOL_DIR = os.getenv("SPOOL_DIR", "")
+SPOOL_SEGMENT_MB = int(os.getenv("SPOOL_SEGMENT_MB", "64"))
+SPOOL_FSYNC_MS = float(os.getenv("SPOOL_FSYNC_MS", "5"))
+SPOOL_ACK_TIMEOUT = float(os.getenv("SPOOL_ACK_TIMEOUT", "5"))
+
+Position = Tuple[int, int]  # (segment id, byte offset)
+
+# dead-letter status for records that cannot be decoded or built into a request
+UNPROCESSABLE = 422
+
+
+def _fsync_dir(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+class Spool:
+    def __init__(self, directory: str, segment_bytes: int = 64 << 20, fsync_interval: float = 0.005):
+        self.dir = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._wlock = threading.Lock()          # appends / segment roll
+        self._cv = threading.Condition()         # durability state
+        self._dirty = threading.Event()
+        self._data = threading.Event()           # wakes the drainer
+        self._stop = threading.Event()
+        self._waiters: List[Tuple[int, Any, Any]] = []
+
+        self._write_seq = 0
+        self._durable_seq = 0
+        self.appended = 0
+        self.backlog_records = 0
+
+        self._committed = self._load_offset()
+        self._recover()
+        self._durable_pos: Position = (self._active_id, self._active_size)
+        self._flusher = threading.Thread(target=self._flush_loop, name="spool-fsync", daemon=True)
+        self._flusher.start()
+
+    # ---------- files ----------
+    def _seg_path(self, seg: int) -> str:
+        return os.path.join(self.dir, _SEG_FMT.format(seg))
+
+    def _segments(self) -> List[int]:
+        return sorted(int(n[:-4]) for n in os.listdir(self.dir) if n.endswith(".seg") and n[:-4].isdigit())
+
+    def _load_offset(self) -> Position:
+        try:
+            with open(os.path.join(self.dir, _OFFSET_FILE)) as f:
+                o = json.load(f)
+            return int(o["segment"]), int(o["pos"])
+        except (FileNotFoundError, ValueError, KeyError):
+            return (0, 0)
+
+    def _scan(self, seg: int, pos: int) -> Tuple[int, int, bool]:
+        """(records, end of last valid frame, clean) reading ``seg`` from ``pos``."""
+        n = 0
+        with open(self._seg_path(seg), "rb") as f:
+            f.seek(pos)
+            while True:
+                head = f.read(_FRAME.size)
+                if not head:
+                    return n, pos, True
+                if len(head) < _FRAME.size:
+                    return n, pos, False
+                length, crc = _FRAME.unpack(head)
+                body = f.read(length)
+                if len(body) < length or zlib.crc32(body) != crc:
+                    return n, pos, False
+                pos += _FRAME.size + length
+                n += 1
+
+    def _recover(self) -> None:
+        segs = self._segments()
+        if not segs:
+            segs = [self._committed[0]]
+            open(self._seg_path(segs[0]), "ab").close()
+        if self._committed[0] < segs[0]:
+            self._committed = (segs[0], 0)
+        last = segs[-1]
+        for seg in segs:
+            if seg < self._committed[0]:
+                os.unlink(self._seg_path(seg))
+                continue
+            start = self._committed[1] if seg == self._committed[0] else 0
+            n, end, clean = self._scan(seg, start)
+            self.backlog_records += n
+            if not clean:
+                if seg == last:
+                    log.warning("spool: truncating torn tail of segment %d at %d", seg, end)
+                    with open(self._seg_path(seg), "r+b") as f:
+                        f.truncate(end)
+                else:
+                    log.error("spool: corrupt frame in segment %d at %d; later records in it are skipped", seg, end)
+        self._active_id = last
+        self._active = open(self._seg_path(last), "ab")
+        self._active_size = self._active.tell()
+
+    def _roll(self) -> None:
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._active.close()
+        self._active_id += 1
+        self._active = open(self._seg_path(self._active_id), "ab")
+        self._active_size = 0
+        _fsync_dir(self.dir)
+
+    # ---------- write side ----------
+    def append(self, data: bytes) -> int:
+        """Buffer one record; returns its sequence number (durable once the flusher passes it)."""
+        frame = _FRAME.pack(len(data), zlib.crc32(data)) + data
+        with self._wlock:
+            if self._active_size and self._active_size + len(frame) > self.segment_bytes:
+                self._roll()
+            self._active.write(frame)
+            self._active_size += len(frame)
+            self._write_seq += 1
+            seq = self._write_seq
+            self.appended += 1
+            self.backlog_records += 1
+        self._dirty.set()
+        return seq
+
+    def append_many(self, records: List[bytes]) -> int:
+        """Append several records; returns the last sequence number."""
+        seq = 0
+        for data in records:
+            seq = self.append(data)
+        return seq
+
+    def wait_durable(self, seq: int, timeout: Optional[float] = None) -> bool:
+        with self._cv:
+            return self._cv.wait_for(lambda: self._durable_seq >= seq, timeout)
+
+    async def append_durable(self, *records: bytes, timeout: Optional[float] = 5.0) -> bool:
+        """Append off the event loop (lock and file write), then await the group fsync.
+
+        Returns False if the fsync did not land within ``timeout``: the records
+        are spooled and will ship, but a crash before the next fsync loses them.
+        """
+        seq = await asyncio.get_running_loop().run_in_executor(None, self.append_many, list(records))
+        return await self.durable(seq, timeout)
+
+    async def durable(self, seq: int, timeout: Optional[float] = 5.0) -> bool:
+        """Await the fsync covering ``seq`` (and therefore every earlier append); False on timeout."""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        with self._cv:
+            if self._durable_seq >= seq:
+                return True
+            self._waiters.append((seq, loop, fut))
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            with self._cv:  # the flusher must not resolve it on a loop that may be gone
+                self._waiters = [w for w in self._waiters if w[2] is not fut]
+            return False
+        return True
+
+    def _flush_loop(self) -> None:
+        while not self._stop.is_set():
+            if not self._dirty.wait(0.5):
+                continue
+            time.sleep(self.fsync_interval)  # let concurrent appends join this batch
+            self._dirty.clear()
+            try:
+                with self._wlock:
+                    self._active.flush()
+                    seq, pos = self._write_seq, (self._active_id, self._active_size)
+                    fd = os.dup(self._active.fileno())
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                # Appenders keep waiting (and time out) rather than being told
+                # their events are durable.
+                log.error("spool fsync failed: %s", e)
+                self._dirty.set()
+                time.sleep(0.5)
+                continue
+            with self._cv:
+                self._durable_seq, self._durable_pos = seq, pos
+                ready = [w for w in self._waiters if w[0] <= seq]
+                self._waiters = [w for w in self._waiters if w[0] > seq]
+                self._cv.notify_all()
+            for _, loop, fut in ready:
+                loop.call_soon_threadsafe(_resolve, fut, seq)
+            self._data.set()
+
+    # ---------- read side ----------
+    def read_batch(self, max_records: int, start: Optional[Position] = None) -> Tuple[List[bytes], Position]:
+        """Up to ``max_records`` durable records from ``start`` (default: committed offset)."""
+        seg, pos = start or self._committed
+        with self._cv:
+            end_seg, end_pos = self._durable_pos
+        out: List[bytes] = []
+        while len(out) < max_records and (seg, pos) < (end_seg, end_pos):
+            try:
+                f = open(self._seg_path(seg), "rb")
+            except FileNotFoundError:
+                seg, pos = seg + 1, 0
+                continue
+            with f:
+                f.seek(pos)
+                limit = end_pos if seg == end_seg else None
+                while len(out) < max_records and (limit is None or pos < limit):
+                    head = f.read(_FRAME.size)
+                    if len(head) < _FRAME.size:
+                        break
+                    length, crc = _FRAME.unpack(head)
+                    body = f.read(length)
+                    if len(body) < length or zlib.crc32(body) != crc:
+                        break
+                    out.append(body)
+                    pos += _FRAME.size + length
+            if len(out) < max_records and seg < end_seg:
+                seg, pos = seg + 1, 0
+        return out, (seg, pos)
+
+    def commit(self, pos: Position, records: int) -> None:
+        tmp = os.path.join(self.dir, _OFFSET_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"segment": pos[0], "pos": pos[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.dir, _OFFSET_FILE))
+        self._committed = pos
+        with self._wlock:
+            self.backlog_records -= records
+            active = self._active_id
+        for seg in self._segments():
+            if seg < pos[0] and seg != active:
+                try:
+                    os.unlink(self._seg_path(seg))
+                except FileNotFoundError:
+                    pass
+
+    def dead_letter(self, records: List[bytes], statuses: List[int],
+                    errors: Optional[List[Optional[str]]] = None) -> None:
+        with open(os.path.join(self.dir, _DEAD_LETTER), "ab") as f:
+            for rec, st, err in zip(records, statuses, errors or [None] * len(records)):
+                line = {"status": st, "record": rec.decode("utf-8", "replace")}
+                if err:
+                    line["error"] = err
+                f.write(dumps(line) + b"\n")
+
+    def backlog_bytes(self) -> int:
+        seg, pos = self._committed
+        total = 0
+        for s in self._segments():
+            if s < seg:
+                continue
+            try:
+                size = os.path.getsize(self._seg_path(s))
+            except FileNotFoundError:
+                continue
+            total += size - (pos if s == seg else 0)
+        return max(0, total)
+
+    def wait_for_data(self, timeout: float) -> None:
+        self._data.wait(timeout)
+        self._data.clear()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._flusher.join(timeout=2)
+        with self._wlock:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self._active.close()
+
+
+def _resolve(fut, seq) -> None:
+    if not fut.done():
+        fut.set_result(seq)
+
+
+class SpoolDrainer:
+    """
+    Ships spooled records with ``ship(records) -> [status per record]``.
+
+    Batch size adapts AIMD-style: it grows while bulk calls finish under
+    ``target_latency`` and halves on retryable failures (429/5xx/timeouts),
+    which back off with jittered exponential delays. Only RetryableError
+    (transport failures, whole-request 429/5xx) and retryable item statuses
+    are retried. Records rejected with any other status, records ``decode``
+    cannot read and records ``ship`` cannot build go to the dead-letter file
+    with status 422, so the offset can move on.
+    """
+
+    def __init__(self, spool: Spool, ship: Callable[[List[Any]], List[int]],
+                 min_batch: int = 50, max_batch: int = 5000, target_latency: float = 1.0,
+                 decode: Optional[Callable[[bytes], Any]] = None):
+        self.spool = spool
+        self.ship = ship
+        self.decode = decode or (lambda record: record)
+        self.min_batch, self.max_batch = min_batch, max_batch
+        self.batch_size = min_batch
+        self.target_latency = target_latency
+        self.shipped = 0
+        self.dead = 0
+        self.retries = 0
+        self.drain_rate = 0.0
+        self.last_error: Optional[str] = None
+        self.last_batch_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="spool-drainer", daemon=True)
+
+    def start(self) -> "SpoolDrainer":
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        backoff = 0.0
+        while not self._stop.is_set():
+            records, end = self.spool.read_batch(self.batch_size)
+            if not records:
+                self.spool.wait_for_data(0.5)
+                continue
+            t0 = time.monotonic()
+            items: List[Any] = [None] * len(records)
+            pending: List[int] = []
+            dead: Dict[int, Tuple[int, Optional[str]]] = {}
+            for i, rec in enumerate(records):
+                try:
+                    items[i] = self.decode(rec)
+                    pending.append(i)
+                except Exception as e:
+                    dead[i] = (UNPROCESSABLE, f"decode: {e}")
+            while pending and not self._stop.is_set():
+                try:
+                    statuses = self.ship([items[i] for i in pending])
+                except RetryableError as e:
+                    backoff = self._backoff(backoff, str(e))
+                    continue
+                except Exception as e:
+                    # not a transport failure: the same batch would fail the same way forever,
+                    # so find the records that cannot be built by shipping them one at a time
+                    log.warning("spool ship failed (%s), shipping %d records one by one", e, len(pending))
+                    statuses = self._ship_each(items, pending, dead)
+                retry = []
+                for i, st in zip(pending, statuses):
+                    if 200 <= st < 300 or i in dead:
+                        continue
+                    if st in (408, 429) or st >= 500:
+                        retry.append(i)
+                    else:
+                        dead[i] = (st, None)
+                pending = retry
+                if retry:
+                    backoff = self._backoff(backoff, f"{len(retry)} items rejected with retryable status")
+                else:
+                    backoff = 0.0
+            if pending:
+                return  # stopping mid-batch: offset not committed, records re-ship on restart
+            if dead:
+                idx = sorted(dead)
+                self.spool.dead_letter([records[i] for i in idx], [dead[i][0] for i in idx],
+                                       [dead[i][1] for i in idx])
+                self.dead += len(idx)
+            self.spool.commit(end, len(records))
+            elapsed = time.monotonic() - t0
+            self.shipped += len(records) - len(dead)
+            now = time.monotonic()
+            inst = len(records) / max(now - (self.last_batch_at or t0), 1e-3)
+            self.drain_rate = inst if not self.drain_rate else 0.8 * self.drain_rate + 0.2 * inst
+            self.last_batch_at = now
+            if elapsed < self.target_latency and len(records) == self.batch_size:
+                self.batch_size = min(self.max_batch, self.batch_size + max(self.min_batch, self.batch_size // 4))
+
+    def _ship_each(self, items: List[Any], pending: List[int],
+                   dead: Dict[int, Tuple[int, Optional[str]]]) -> List[int]:
+        """One status per pending record, each shipped alone; records that still raise go to ``dead``."""
+        out = []
+        for i in pending:
+            try:
+                out.append(self.ship([items[i]])[0])
+            except RetryableError:
+                out.append(503)
+            except Exception as e:
+                dead[i] = (UNPROCESSABLE, f"ship: {e}")
+                out.append(UNPROCESSABLE)
+        return out
+
+    def _backoff(self, backoff: float, msg: str) -> float:
+        self.retries += 1
+        self.last_error = msg
+        self.batch_size = max(self.min_batch, self.batch_size // 2)
+        log.warning("spool drain retry (batch=%d): %s", self.batch_size, msg)
+        backoff = min(30.0, max(0.2, backoff * 2))
+        self._stop.wait(backoff * (0.5 + random.random()))
+        return backoff
+
+    def status(self) -> Dict[str, Any]:
+        idle = self.last_batch_at is None or time.monotonic() - self.last_batch_at > 10
+        return {
+            "dir": self.spool.dir,
+            "backlog_records": self.spool.backlog_records,
+            "backlog_bytes": self.spool.backlog_bytes(),
+            "appended": self.spool.appended,
+            "shipped": self.shipped,
+            "dead_lettered": self.dead,
+            "retries": self.retries,
+            "batch_size": self.batch_size,
+            "drain_rate_eps": 0.0 if idle else round(self.drain_rate, 1),
+            "last_error": self.last_error,
+        }
+
+
+def encode_item(index: str, doc: Dict[str, Any]) -> bytes:
+    return dumps({"index": index, "doc": doc})
+
+
+def decode_item(record: bytes) -> Tuple[str, Dict[str, Any]]:
+    item = loads(record)
+    return item["index"], item["doc"]
+
+
+def open_from_env(ship_items: Callable[[List[Tuple[str, Dict[str, Any]]]], List[int]]) -> Optional[SpoolDrainer]:
+    """Spool + running drainer when SPOOL_DIR is set; ``ship_items`` gets decoded (index, doc) pairs."""
+    if not SPOOL_DIR:
+        return None
+    spool = Spool(SPOOL_DIR, segment_bytes=SPOOL_SEGMENT_MB << 20, fsync_interval=SPOOL_FSYNC_MS / 1000.0)
+    log.info("spool enabled at %s (%d records pending)", SPOOL_DIR, spool.backlog_records)
+    return SpoolDrainer(spool, ship_items, decode=decode_item).start()
@@ -1,14 +1,40 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, Optional
+import asyncio
 import os
-import json
 import logging
-
-from elasticsearch import Elasticsearch  # catch generic Exception on errors
+import threading
+import time
+
+from app.utils.geoip import enrich_event as enrich_geo
+from app.utils.iprep import enrich_event as enrich_reputation
+from app.utils import metrics
+from app.utils.metrics import stage
+from app.utils.profiling import install_debug_routes
+from app.utils.normalize import Event, normalize
+from app.utils import spool
+from app.utils.es_bulk import (RETRYABLE_STATUSES, RetryableError, bulk_body, bulk_body_with_ids, item_statuses,
+                               status_of)
+from app.utils.es_target import WriteTarget
+from app.utils import codec
+from app.utils.compress import DecompressMiddleware
+from app.utils.prompt import SUMMARY_INSTRUCTIONS, build_prompt
+from app.utils import ai_policy
+from app.utils import lanes
+from app.utils.livefeed import LiveFeed
+from app.utils.loginstate import epoch
+from app.utils.risk import RISK_MAX_SKEW_S, RiskEngine
+from app.utils.rollup import Rollups
+from app.utils.resilience import AI_FAKE_MODEL, ModelGuard, fake_model_from_env
 
 app = FastAPI()
+app.add_middleware(DecompressMiddleware)  # Content-Encoding gzip/zstd bodies on /ingest
+app.add_middleware(metrics.MetricsMiddleware)
+install_debug_routes(app)
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("ith-ingestor")
 
@@ -23,15 +49,135 @@ VERTEX_LOCATION = os.environ.get("VERTEX_LOCATION", "us-central1")
 VERTEX_MODEL = os.environ.get("VERTEX_MODEL", "gemini-1.5-pro")
 GCP_PROJECT = os.environ.get("GOOGLE_CLOUD_PROJECT")  # auto-set on Cloud Run
 
-if not ES_URL or not ES_API_KEY:
-    raise RuntimeError("Set ELASTIC_CLOUD_URL and ELASTIC_API_KEY in the environment")
+# --------------------
+# Clients are built on first use (or by the warm-up thread) so a cold
+# instance binds its port without paying for the elasticsearch/vertexai imports.
+# --------------------
+@lru_cache(maxsize=1)
+def get_es():
+    if not ES_URL or not ES_API_KEY:
+        raise RuntimeError("Set ELASTIC_CLOUD_URL and ELASTIC_API_KEY in the environment")
+    from elasticsearch import Elasticsearch  # catch generic Exception on errors
+    # Accept both encoded key and id:key format
+    if ":" in ES_API_KEY:
+        ak_id, ak_key = ES_API_KEY.split(":", 1)
+        return Elasticsearch(ES_URL, api_key=(ak_id, ak_key), verify_certs=True, **codec.es_client_kwargs())
+    return Elasticsearch(ES_URL, api_key=ES_API_KEY, verify_certs=True, **codec.es_client_kwargs())
+
+@lru_cache(maxsize=4)
+def get_vertex_model(project: str, location: str, model_name: str):
+    fake = fake_model_from_env()  # AI_FAKE_MODEL: local latency/error injection
+    if fake is not None:
+        return fake
+    # Lazy import, and support both new/old import paths
+    try:
+        import vertexai
+        try:
+            from vertexai.generative_models import GenerativeModel
+        except Exception:
+            from vertexai.preview.generative_models import GenerativeModel
+    except Exception as imp_err:
+        raise RuntimeError(f"vertexai import failed: {imp_err}")
+    vertexai.init(project=project, location=location)
+    return GenerativeModel(model_name)
+
+def _warm():
+    t0 = time.perf_counter()
+    for name, fn in (
+        ("elasticsearch", get_es),
+        ("vertexai", lambda: get_vertex_model(GCP_PROJECT, VERTEX_LOCATION, VERTEX_MODEL) if GCP_PROJECT else None),
+        ("geoip", lambda: __import__("app.utils.geoip", fromlist=["get_geoip"]).get_geoip()),
+        ("iprep", lambda: __import__("app.utils.iprep", fromlist=["get_reputation"]).get_reputation()),
+    ):
+        try:
+            fn()
+        except Exception as e:
+            log.warning("warm-up %s failed: %s", name, e)
+    log.info("warm-up finished in %.0f ms", (time.perf_counter() - t0) * 1000)
+
+# --------------------
+# Optional durable spool: /ingest acks once the event is fsync'd to SPOOL_DIR
+# and a drainer ships it to Elastic in bulk.
+# --------------------
+_drainer = None
+
+def _send_bulk(body: bytes, n: int):
+    try:
+        resp = get_es().bulk(operations=body)
+    except Exception as ex:
+        st = status_of(ex)
+        if st is None or st in RETRYABLE_STATUSES:
+            raise RetryableError(str(ex))
+        return [st] * n
+    return item_statuses(getattr(resp, "body", resp), n)
+
+def _ship_bulk(items):
+    return _send_bulk(bulk_body(items, WriteTarget.op), len(items))
+
+@app.on_event("startup")
+def _start_spool():
+    global _drainer
+    _drainer = spool.open_from_env(_ship_bulk)
+    if _drainer:
+        metrics.gauge("ith_queue_depth", "Items waiting in internal queues", ["queue"]).labels("spool").set_function(
+            lambda: _drainer.spool.backlog_records)
+
+@app.on_event("shutdown")
+def _stop_spool():
+    if _drainer:
+        _drainer.stop()
+        _drainer.spool.close()
+
+@app.get("/spool")
+def spool_status():
+    return _drainer.status() if _drainer else {"enabled": False}
+
+# --------------------
+# Event index layout (ES_WRITE_MODE): data stream, write alias over rolling
+# indices, or one plain index. Writers only ever see INDEX.
+# --------------------
+_target = WriteTarget(ES_URL, ES_API_KEY, INDEX) if ES_URL and ES_API_KEY else None
+
+@app.on_event("startup")
+def _start_target():
+    if _target:
+        _target.start()
+
+@app.on_event("shutdown")
+def _stop_target():
+    if _target:
+        _target.stop()
+
+@app.get("/es_target")
+def es_target_status():
+    return _target.status() if _target else {"enabled": False}
+
+# --------------------
+# Per-user / per-rule rollups (ROLLUP_INDEX) for dashboards, flushed from a
+# background thread with idempotent bulk writes
+# --------------------
+_rollups = Rollups()
+# registered here, for the live instance only: a gauge samples one object
+metrics.gauge("ith_rollup_buckets", "Rollup buckets held in memory").set_function(lambda: len(_rollups))
+
+@app.on_event("startup")
+def _start_rollups():
+    if ES_URL and ES_API_KEY:
+        _rollups.start(lambda items: _send_bulk(bulk_body_with_ids(items), len(items)))
+
+@app.on_event("shutdown")
+def _stop_rollups():
+    _rollups.stop()
 
-# Accept both encoded key and id:key format
-if ":" in ES_API_KEY:
-    ak_id, ak_key = ES_API_KEY.split(":", 1)
-    es = Elasticsearch(ES_URL, api_key=(ak_id, ak_key), verify_certs=True)
-else:
-    es = Elasticsearch(ES_URL, api_key=ES_API_KEY, verify_certs=True)
+@app.get("/rollups")
+def rollups_status():
+    return _rollups.status()
+
+@app.on_event("startup")
+def _warm_in_background():
+    # Runs after the app is importable; the port is bound as soon as startup
+    # returns, while the heavy SDKs load on this thread.
+    threading.Thread(target=_warm, name="warmup", daemon=True).start()
 
 # --------------------
 # Health
@@ -43,138 +189,76 @@ def health():
         "index": INDEX,
         "vertex_model": VERTEX_MODEL,
         "vertex_location": VERTEX_LOCATION,
+        "vertex_guard": _GUARD.status(),
     }
 
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+_CACHE_EVENTS = metrics.gauge("ith_cache_requests", "Cache lookups since start", ["cache", "result"])
+_EVENTS = metrics.counter("ith_events_total", "Events processed by /ingest", ["outcome"])
+
+def _collect_cache_stats():
+    from app.utils.geoip import get_geoip
+    ci = get_geoip().cache_info()
+    _CACHE_EVENTS.labels("geoip", "hit").set(ci.hits)
+    _CACHE_EVENTS.labels("geoip", "miss").set(ci.misses)
+
+metrics.on_collect(_collect_cache_stats)
+
 # --------------------
 # Light risk heuristics
 # --------------------
-_last_login: Dict[str, Dict[str, Any]] = {}
-_failures: Dict[str, List[datetime]] = {}
-_ip_to_users: Dict[str, List[tuple]] = {}
-
-def _safe_float(v):
-    try:
-        return float(v) if v is not None else None
-    except Exception:
-        return None
+_risk = RiskEngine()
+metrics.gauge("ith_login_state_users", "Users held in the compact login state").set_function(
+    lambda: len(_risk.logins))
+# drop idle failure / per-IP windows every this many scored events
+RISK_SWEEP_EVERY = int(os.getenv("RISK_SWEEP_EVERY", "10000"))
+_risk_scored = 0
 
 def _ts(s: str) -> datetime:
     if not s:
         return datetime.utcnow()
     return datetime.fromisoformat(str(s).replace("Z", "+00:00"))
 
-def haversine(lat1, lon1, lat2, lon2):
-    from math import radians, sin, cos, asin, sqrt
-    R = 6371.0
-    phi1, phi2 = radians(lat1), radians(lat2)
-    dphi = radians(lat2 - lat1)
-    dlambda = radians(lon2 - lon1)
-    a = sin(dphi/2)**2 + cos(phi1) * cos(phi2) * sin(dlambda/2)**2
-    return 2 * R * asin(sqrt(a))
-
-def compute_risk(user_id: str, ev: Dict[str, Any]) -> (float, str):
-    score, reasons = 0.0, []
-    ts = _ts(ev.get("@timestamp"))
-    event = ev.get("event", {})
-    src = ev.get("source", {}) or ev.get("src", {})
-    prev = _last_login.get(user_id)
-
-    if event.get("action") == "login":
-        lat = (src.get("geo") or {}).get("lat")
-        lon = (src.get("geo") or {}).get("lon")
-        asn = src.get("asn")
-        ip = src.get("ip")
-
-        # impossible travel
-        if prev and prev.get("lat") is not None and lat is not None:
-            try:
-                dist = haversine(prev["lat"], prev["lon"], float(lat), float(lon))
-                dt_h = (ts - prev["ts"]).total_seconds() / 3600.0
-                if dt_h > 0 and dist / dt_h > 900:
-                    score += 0.7; reasons.append("impossible_travel")
-            except Exception:
-                pass
-
-        # ASN change
-        if prev and prev.get("asn") and asn and prev["asn"] != asn:
-            score += 0.3; reasons.append("asn_change")
-
-        # MFA bypass (recent no-MFA after MFA)
-        if prev and prev.get("mfa") and not event.get("mfa", False):
-            if (ts - prev["ts"]) <= timedelta(hours=1):
-                score += 0.5; reasons.append("mfa_bypass")
-
-        # brute force (>=10 fails in 5m)
-        if event.get("outcome") == "failure":
-            _failures.setdefault(user_id, []).append(ts)
-            _failures[user_id] = [t for t in _failures[user_id] if ts - t <= timedelta(minutes=5)]
-            if len(_failures[user_id]) >= 10:
-                score += 0.6; reasons.append("brute_force")
-        else:
-            _failures[user_id] = []
-
-        # credential stuffing (>=10 distinct users from same IP in 5m)
-        if ip:
-            _ip_to_users.setdefault(ip, []).append((user_id, ts))
-            _ip_to_users[ip] = [(u, t) for (u, t) in _ip_to_users[ip] if ts - t <= timedelta(minutes=5)]
-            uniq = len(set(u for (u, _) in _ip_to_users[ip]))
-            if uniq >= 10:
-                score += 0.7; reasons.append("credential_stuffing")
-
-        _last_login[user_id] = {
-            "ts": ts, "lat": _safe_float(lat), "lon": _safe_float(lon),
-            "asn": asn, "mfa": event.get("mfa", False)
-        }
-
-    # privilege escalation
-    if event.get("action") == "role_change" and event.get("new_role") == "admin":
-        score += 1.0; reasons.append("privilege_escalation")
-
-    score = max(0.0, min(1.0, score))
-    return score, (";".join(reasons) if reasons else "none")
+def compute_risk(user_id: str, e: Event, ts: Optional[float] = None) -> (float, str):
+    # only ever called on the event loop, so the counter and sweep need no lock
+    global _risk_scored
+    ts = epoch(_ts(e.timestamp)) if ts is None else ts
+    out = _risk.score(user_id, e, ts)
+    _risk_scored += 1
+    if RISK_SWEEP_EVERY > 0 and _risk_scored % RISK_SWEEP_EVERY == 0:
+        # event time, but never past the wall clock: a future-dated event must not empty every window
+        _risk.sweep(min(ts, time.time() + RISK_MAX_SKEW_S))
+    return out
 
 # --------------------
 # Vertex AI enrichment (lazy import to avoid startup crashes)
 # --------------------
-def enrich_with_ai(doc: Dict[str, Any]) -> Dict[str, Any]:
+_GUARD = ModelGuard()
+
+async def enrich_with_ai(doc: Dict[str, Any], hedge: bool = False) -> Dict[str, Any]:
     """
-    Non-blocking enrichment with Vertex AI (Gemini).
+    Enrichment with Vertex AI (Gemini) under the model guard (deadline,
+    circuit breaker, optional hedging; see app/utils/resilience.py).
     Lazy-imports vertexai so the app always starts; if enrichment fails,
-    we still index the doc with ai.enriched=False and ai.error set.
+    times out or the breaker is open, we still index the doc with
+    ai.enriched=False and ai.error set.
     """
     try:
-        project = os.environ.get("GOOGLE_CLOUD_PROJECT")
-        location = os.environ.get("VERTEX_LOCATION", "us-central1")
-        model_name = os.environ.get("VERTEX_MODEL", "gemini-1.5-pro")
-        if not project:
+        if not GCP_PROJECT and not AI_FAKE_MODEL:
             raise RuntimeError("GOOGLE_CLOUD_PROJECT not set (Cloud Run sets this)")
+        model = get_vertex_model(GCP_PROJECT, VERTEX_LOCATION, VERTEX_MODEL)
 
-        # --- Lazy import, and support both new/old import paths ---
-        try:
-            import vertexai
-            try:
-                from vertexai.generative_models import GenerativeModel
-            except Exception:
-                from vertexai.preview.generative_models import GenerativeModel
-        except Exception as imp_err:
-            raise RuntimeError(f"vertexai import failed: {imp_err}")
-
-        vertexai.init(project=project, location=location)
-        model = GenerativeModel(model_name)
-
-        event_copy = {k: v for k, v in doc.items() if k != "@timestamp"}
-        prompt = (
-            "You are a SOC analyst. Summarize the risk in one short sentence and name a scenario. "
-            "Return JSON with keys: summary (string), confidence (0-1), scenario (string). "
-            f"Event: {json.dumps(event_copy, default=str)[:4000]}"
-        )
-
-        resp = model.generate_content(prompt)
+        prompt = build_prompt(SUMMARY_INSTRUCTIONS, doc)
+
+        resp = await _GUARD.call(model.generate_content, prompt, hedge=hedge)
         text = (getattr(resp, "text", None) or "").strip()
 
         summary, confidence, scenario = text, 0.9, "ai_enriched"
         try:
-            obj = json.loads(text)
+            obj = codec.loads(text)
             summary = obj.get("summary", summary)
             confidence = float(obj.get("confidence", confidence))
             scenario = obj.get("scenario", scenario)
@@ -190,39 +274,204 @@ def enrich_with_ai(doc: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         doc["ai.enriched"] = False
         doc["ai.error"] = str(e)
+        metrics.STAGE_ERRORS.labels("ai").inc()
+    return doc
+
+_AI = ai_policy.Policy()
+metrics.gauge("ith_queue_depth", "Items waiting in internal queues", ["queue"]).labels("ai").set_function(
+    lambda: _AI.inflight)
+
+async def enrich_tiered(doc: Dict[str, Any], e: Event, score: float, reasons: str, tier: str) -> Dict[str, Any]:
+    """
+    Call the model only when the risk tier allows it (see app/utils/ai_policy.py);
+    otherwise, or if the call fails, fill ai.summary from the template.
+    """
+    honey = ai_policy.is_honey(doc)
+    decision = _AI.decide(tier)
+    doc["ai.tier"] = tier
+    if decision == "model":
+        with _AI.slot():
+            doc = await enrich_with_ai(doc, hedge=tier == "critical")
+        if doc.get("ai.enriched"):
+            doc["ai.mode"] = "model"
+            return doc
+        decision = "error"
+    t = ai_policy.template_summary(e, score, reasons, honey)
+    doc["ai.enriched"] = False
+    doc["ai.mode"] = f"template:{decision}"
+    doc["ai.summary"] = t["summary"]
+    doc.setdefault("event", {}).setdefault("scenario", t["scenario"])
+    doc["rule.explanation"] = t["summary"]
     return doc
 
+# --------------------
+# Priority lanes: AI + write run on per-lane worker pools, so a canary hit
+# never waits behind a backlog of routine logins (see app/utils/lanes.py)
+# --------------------
+ALERT_WEBHOOK_URL = os.environ.get("ALERT_WEBHOOK_URL", "")
+_LANE_BY_TIER = {"critical": "p1", "high": "p2", "medium": "p2", "low": "p3"}
+_ALERTS = metrics.counter("ith_lane_alerts_total", "P1 events pushed to ALERT_WEBHOOK_URL", ["outcome"])
+
+async def _write(ev: Dict[str, Any], lane: str) -> Dict[str, Any]:
+    # P1 goes straight to Elastic so it is searchable ahead of the spool
+    # backlog; the spool is its fallback.
+    if lane == "p1" or not _drainer:
+        try:
+            with stage("index"):
+                return {"es": await run_in_threadpool(get_es().index, index=INDEX, document=ev,
+                                                   op_type=WriteTarget.op)}
+        except Exception:
+            if not _drainer:
+                raise
+            log.warning("direct P1 index failed; spooling")
+    with stage("spool"):
+        durable = await _drainer.spool.append_durable(spool.encode_item(INDEX, ev), timeout=spool.SPOOL_ACK_TIMEOUT)
+    return {"spooled": True, "durable": durable}
+
+async def _alert(ev: Dict[str, Any]) -> None:
+    try:
+        import httpx
+        async with httpx.AsyncClient(timeout=5) as client:
+            r = await client.post(ALERT_WEBHOOK_URL, content=codec.dumps(ev),
+                                  headers={"Content-Type": "application/json"})
+        _ALERTS.labels("ok" if r.status_code < 300 else "error").inc()
+    except Exception as ex:
+        log.warning("P1 alert failed: %s", ex)
+        _ALERTS.labels("error").inc()
+
+async def _process(lane: str, job) -> Dict[str, Any]:
+    ev, n, user_id, score, reasons, tier = job
+    with stage("ai"):
+        ev = await enrich_tiered(ev, n, score, reasons, tier)
+    res = {"user": user_id, "risk": score, "lane": lane, "ai": bool(ev.get("ai.enriched")), "ok": True}
+    res.update(await _write(ev, lane))
+    if lane == "p1" and ALERT_WEBHOOK_URL:
+        await _alert(ev)
+    return res
+
+_lanes = lanes.Lanes(_process)
+
+@app.on_event("startup")
+async def _start_lanes():
+    _lanes.start()
+
+@app.on_event("shutdown")
+async def _stop_lanes():
+    await _lanes.stop()
+
+@app.on_event("startup")
+def _start_login_state():
+    _risk.logins.start()
+
+@app.on_event("shutdown")
+def _stop_login_state():
+    _risk.logins.stop()
+
+@app.get("/login_state")
+def login_state_status():
+    return _risk.logins.status()
+
+# async so it runs on the loop, between compute_risk calls that mutate the graph
+@app.get("/graph")
+async def graph_query(user: str = "", ip: str = "", device: str = ""):
+    g = _risk.graph
+    if user:
+        return {"user": user, "ips": g.neighbors("user", user, "ip"),
+                "devices": g.neighbors("user", user, "device"), "co_users": g.co_users(user, "device")}
+    if ip:
+        return {"ip": ip, "users": g.neighbors("ip", ip)}
+    if device:
+        return {"device": device, "users": g.neighbors("device", device)}
+    return g.status()
+
+@app.get("/lanes")
+def lanes_status():
+    return _lanes.status()
+
+# --------------------
+# Live feed (SSE) for dashboards
+# --------------------
+_live = LiveFeed()
+metrics.gauge("ith_live_subscribers", "Open /stream connections").set_function(lambda: _live.subscribers)
+
+def _publish_live(n: Event, user_id: str, score: float, reasons: str, tier: str, honey: bool) -> None:
+    _live.publish(score, user_id, reasons, {
+        "@timestamp": n.timestamp, "user": user_id, "risk": score, "reasons": reasons, "tier": tier,
+        "action": n.event_action, "outcome": n.event_outcome, "source_ip": n.source_ip,
+        "honey": honey,
+    })
+
+@app.get("/stream")
+async def stream(request: Request, min_risk: float = 0.0, rule: str = "", user: str = "", last_id: str = ""):
+    if _live.full():
+        return JSONResponse({"error": "too many live subscribers"}, status_code=503)
+    cursor = _live.start_cursor(request.headers.get("last-event-id") or last_id)
+    return StreamingResponse(_live.subscribe(cursor, min_risk, rule, user), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/stream/status")
+def stream_status():
+    return _live.status()
+
+async def _submit(lane: str, job, user_id: str) -> Dict[str, Any]:
+    try:
+        res = await _lanes.submit(lane, job)
+        _EVENTS.labels("ok").inc()
+        return res
+    except Exception as ex:
+        log.error("Elasticsearch index error: %s", ex)
+        _EVENTS.labels("error").inc()
+        return {"user": user_id, "lane": lane, "error": str(ex), "ok": False}
+
 # --------------------
 # API
 # --------------------
 @app.post("/ingest")
 async def ingest(request: Request):
     try:
-        payload = await request.json()
+        with stage("parse"):
+            payload = await codec.read_json(request)
     except Exception:
         return JSONResponse({"error": "invalid JSON"}, status_code=400)
 
     events = payload if isinstance(payload, list) else [payload]
-    results = []
+    pending = []
 
     for ev in events:
-        user_id = (ev.get("user") or {}).get("id") or (ev.get("user") or {}).get("name") or "unknown"
+        # Local geo/ASN for raw IdP logs that only carry an IP, then
+        # IP / ASN reputation (tor exits, bad ASNs); both are mmap'd tables
+        try:
+            with stage("local_enrich"):
+                enrich_geo(ev)
+                enrich_reputation(ev)
+        except Exception as ex:
+            log.warning("geo/reputation lookup failed: %s", ex)
+
+        # one pass over dotted / nested / legacy src layouts
+        with stage("normalize"):
+            n = normalize(ev)
+        user_id = n.user_key
 
         # compute simple risk & reasons (kept from prior behavior)
-        score, reasons = compute_risk(user_id, ev)
+        with stage("risk"):
+            ts = epoch(_ts(n.timestamp))
+            score, reasons = compute_risk(user_id, n, ts)
+        if _rollups.running:
+            with stage("rollup"):
+                _rollups.add(ts, user_id, reasons, score, n.source_ip, n.event_outcome == "failure")
         ev.setdefault("event", {})
         ev["event"]["risk_score"] = score
         ev["event"]["explanation"] = reasons
 
-        # --- AI enrichment right before indexing ---
-        ev = enrich_with_ai(ev)
-
-        # index to Elastic
-        try:
-            res = es.index(index=INDEX, document=ev)
-            results.append({"user": user_id, "risk": score, "ai": bool(ev.get("ai.enriched")), "ok": True, "es": res})
-        except Exception as ex:
-            log.error("Elasticsearch index error: %s", ex)
-            results.append({"user": user_id, "error": str(ex), "ok": False})
-
+        # AI enrichment + indexing (Elastic or the durable spool) on the lane
+        # for this event's risk tier
+        with stage("honey"):
+            honey = ai_policy.is_honey(ev)
+        tier = ai_policy.tier_of(score, reasons, honey)
+        lane = _LANE_BY_TIER[tier]
+        with stage("live"):
+            _publish_live(n, user_id, score, reasons, tier, honey)
+        pending.append(_submit(lane, (ev, n, user_id, score, reasons, tier), user_id))
+
+    results = await asyncio.gather(*pending)
     return {"status": "ok", "results": results}
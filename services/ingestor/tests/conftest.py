@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the service imports itself as ``app.utils...`` from its own directory (see Dockerfile)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
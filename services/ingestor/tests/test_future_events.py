@@ -0,0 +1,51 @@
+from app.utils.graph import EntityGraph
+from app.utils.rollup import Rollups
+
+NOW = 1_760_000_000.0
+YEAR_2100 = 4_102_444_800.0
+
+
+def test_rollup_skips_events_past_the_wall_clock():
+    r = Rollups(flush_s=0, lateness_s=120, instance="t", max_skew_s=300, clock=lambda: NOW)
+    r.add(NOW - 10, "alice", "none", 0.0)
+    r.add(YEAR_2100, "mallory", "none", 0.0)
+    r.add(NOW + 60, "bob", "none", 0.0)  # ahead, but within the skew
+    r.add(NOW - 5, "carol", "none", 0.0)
+    st = r.status()
+    assert st["future"] == 1 and st["late"] == 0
+    assert r.watermark == NOW + 60
+    assert {k[3] for k in r._buckets} == {"alice", "bob", "carol"}
+
+
+def test_graph_keeps_expiring_after_a_future_event():
+    clock = [NOW]
+    g = EntityGraph(window_s=3600, max_skew_s=300, clock=lambda: clock[0])
+    g.observe(NOW, "alice", ip="10.0.0.1")
+    g.observe(YEAR_2100, "mallory", ip="10.0.0.2")
+    assert g.status()["future"] == 1 and g.now == int(NOW)
+    assert g.neighbors("ip", "10.0.0.2") == []
+    clock[0] = NOW + 7200
+    g.observe(NOW + 7200, "bob", ip="10.0.0.3")
+    assert g.neighbors("ip", "10.0.0.1") == []
+    assert g.degree("ip", "10.0.0.1") == 0
+    assert g.neighbors("ip", "10.0.0.3") == ["bob"]
+
+
+def test_graph_without_skew_never_reads_the_clock():
+    def clock():
+        raise AssertionError("read the wall clock")
+
+    g = EntityGraph(window_s=3600, clock=clock)
+    g.observe(YEAR_2100, "alice", ip="10.0.0.1")
+    assert g.neighbors("ip", "10.0.0.1") == ["alice"]
+
+
+def test_graph_ignores_times_outside_its_columns():
+    g = EntityGraph(window_s=3600)
+    g.observe(-100, "alice", ip="10.0.0.1")  # 1969
+    g.observe(2 ** 32 + 5, "bob", ip="10.0.0.2")  # 2106
+    g.observe(NOW, "carol", ip="10.0.0.3")
+    assert g.status()["out_of_range"] == 2
+    assert g.now == int(NOW)
+    assert g.neighbors("ip", "10.0.0.1") == [] and g.neighbors("ip", "10.0.0.2") == []
+    assert g.neighbors("ip", "10.0.0.3") == ["carol"]
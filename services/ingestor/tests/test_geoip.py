@@ -0,0 +1,37 @@
+import pytest
+
+from app.utils import geoip
+
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    path = str(tmp_path / "geo.idx")
+    geoip.build_table(path, [{"network": "1.1.1.0/24", "country": "AU", "latitude": "-33.5",
+                              "longitude": "151.25", "asn": "AS13335"}])
+    monkeypatch.setattr(geoip, "_geoip", geoip.GeoIP(path))
+
+
+def test_nested_and_legacy_events(table):
+    nested = {"source": {"ip": "1.1.1.1"}}
+    legacy = {"src": {"ip": "1.1.1.1", "geo": None}, "asn": 64500}
+    assert geoip.enrich_event(nested)
+    assert nested["source"] == {"ip": "1.1.1.1", "geo": {"lat": -33.5, "lon": 151.25, "country": "AU"},
+                                "asn": 13335}
+    assert geoip.enrich_event(legacy)
+    assert legacy["src"]["geo"] == {"lat": -33.5, "lon": 151.25, "country": "AU"}
+    assert "asn" not in legacy["src"]  # the top-level asn counts
+
+
+def test_dotted_events_get_dotted_keys(table):
+    ev = {"source.ip": "1.1.1.1", "source.geo.country": "NZ"}
+    assert geoip.enrich_event(ev)
+    assert ev == {"source.ip": "1.1.1.1", "source.geo.country": "NZ", "source.geo.lat": -33.5,
+                  "source.geo.lon": 151.25, "source.asn": 13335}
+
+
+def test_nothing_to_add(table):
+    done = {"source.ip": "1.1.1.1", "source.geo.lat": 1.0, "source.geo.lon": 2.0, "source.asn": 1}
+    unknown = {"source": {"ip": "9.9.9.9"}}
+    assert not geoip.enrich_event(done) and len(done) == 4
+    assert not geoip.enrich_event(unknown) and unknown == {"source": {"ip": "9.9.9.9"}}
+    assert not geoip.enrich_event({"user": "alice"})
@@ -0,0 +1,39 @@
+import os
+
+from app.utils import iprep
+
+
+def test_reload_does_not_reuse_feed_names_from_the_old_index(tmp_path):
+    path = str(tmp_path / "rep.idx")
+    iprep.build_index(path, {"tor_exit": ["1.1.1.1"], "bad_asn": ["AS64500"]})
+    rep = iprep.IPReputation(path, check_interval=0)
+    assert rep.lookup(ip="1.1.1.1") == {"ip": ["tor_exit"], "asn": []}
+
+    # same mask (bit 0) now means a different feed
+    iprep.build_index(path + ".new", {"blocklist": ["1.1.1.1"]})
+    os.replace(path + ".new", path)
+    assert rep.lookup(ip="1.1.1.1") == {"ip": ["blocklist"], "asn": []}
+
+
+def test_enrich_event_reads_every_layout(tmp_path, monkeypatch):
+    path = str(tmp_path / "rep.idx")
+    iprep.build_index(path, {"tor_exit": ["1.1.1.1"], "bad_asn": ["AS64500"]})
+    monkeypatch.setattr(iprep, "_reputation", iprep.IPReputation(path))
+
+    nested = {"source": {"ip": "1.1.1.1"}}
+    legacy = {"src": {"ip": "9.9.9.9"}, "asn": 64500}
+    dotted = {"source.ip": "1.1.1.1", "source.asn": "AS64500"}
+    ecs_as = {"source": {"ip": "9.9.9.9", "as": {"number": 64500}}}
+    clean = {"source.ip": "9.9.9.9"}
+
+    assert iprep.enrich_event(nested) and nested["source"]["reputation"]["ip"] == ["tor_exit"]
+    assert iprep.enrich_event(legacy) and legacy["src"]["reputation"]["asn"] == ["bad_asn"]
+    assert iprep.enrich_event(dotted) == {"ip": ["tor_exit"], "asn": ["bad_asn"]}
+    assert dotted["source.reputation"] == {"ip": ["tor_exit"], "asn": ["bad_asn"]}
+    assert iprep.enrich_event(ecs_as)["asn"] == ["bad_asn"]
+    assert iprep.enrich_event(clean) is None and "source.reputation" not in clean
+
+
+def test_bundled_feed_is_the_default():
+    feeds = iprep.parse_feed_spec(iprep.IPREP_FEEDS)
+    assert os.path.isfile(feeds["tor_exit"])
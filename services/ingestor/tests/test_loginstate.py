@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from app.utils.loginstate import Login, LoginState
+
+
+def test_save_load_round_trip(tmp_path):
+    now = time.time()
+    s = LoginState(ttl_s=3600)
+    s.put("alice", now - 10, 52.5, 13.4, "AS3320", True)
+    s.put("bob", now - 20, None, None, None, False)
+    s.put("carol", now - 30, 40.7, -74.0, "ORG-Acme", False)
+    path = str(tmp_path / "state" / "logins.bin")
+    assert s.save(path) == 3
+
+    r = LoginState(ttl_s=3600)
+    assert r.load(path) == 3
+    a = r.get("alice")
+    assert a.ts == now - 10 and a.asn == 3320 and a.mfa
+    assert a.lat == pytest.approx(52.5) and a.lon == pytest.approx(13.4)
+    assert r.get("bob") == Login(now - 20, None, None, 0, False)
+    # the label id survives, so the same label keeps comparing equal
+    assert r.get("carol").asn == s.asn_key("ORG-Acme") == r.asn_key("ORG-Acme")
+
+    r.put("dave", now, None, None, 15169, False)  # still writable after load
+    assert len(r) == 4 and r.get("dave").asn == 15169
+
+
+def test_load_drops_expired_users(tmp_path):
+    now = time.time()
+    s = LoginState(ttl_s=3600)
+    s.put("fresh", now - 60, None, None, 1, False)
+    s.put("stale", now - 7200, None, None, 2, False)
+    path = str(tmp_path / "logins.bin")
+    s.save(path)
+
+    r = LoginState(ttl_s=3600)
+    assert r.load(path) == 1
+    assert r.get("stale") is None and r.get("fresh").asn == 1
+
+
+def test_start_ignores_unreadable_snapshot_and_stop_saves(tmp_path):
+    path = str(tmp_path / "logins.bin")
+    with open(path, "wb") as f:
+        f.write(b"not a snapshot")
+    s = LoginState(ttl_s=3600)
+    s.start(path, interval=60)
+    assert len(s) == 0
+    s.put("alice", time.time(), None, None, 3320, True)
+    s.stop()
+
+    r = LoginState(ttl_s=3600)
+    assert r.load(path) == 1 and r.get("alice").mfa
@@ -0,0 +1,44 @@
+from app.utils.normalize import Event, normalize
+
+DOTTED = {"@timestamp": "2025-01-01T12:00:00Z", "user.id": "u1", "user.name": "alice", "event.action": "login",
+          "event.outcome": "failure", "source.ip": "203.0.113.9", "source.asn": 64500, "source.geo.lat": 40.7}
+NESTED = {"@timestamp": "2025-01-01T12:00:00Z", "user": {"id": "u1", "name": "alice"},
+          "event": {"action": "login", "outcome": "failure"},
+          "source": {"ip": "203.0.113.9", "asn": 64500, "geo": {"lat": 40.7}}}
+LEGACY = {"@timestamp": "2025-01-01T12:00:00Z", "user": {"id": "u1", "name": "alice"}, "action": "login",
+          "event": {"outcome": "failure"}, "src": {"ip": "203.0.113.9", "geo": {"lat": 40.7}}, "asn": 64500}
+
+
+def test_layouts_resolve_to_the_same_event():
+    got = [normalize(ev) for ev in (DOTTED, NESTED, LEGACY)]
+    for e in got:
+        assert (e.timestamp, e.user_id, e.user_name, e.event_action, e.event_outcome, e.source_ip, e.source_asn,
+                e.source_lat) == ("2025-01-01T12:00:00Z", "u1", "alice", "login", "failure", "203.0.113.9", 64500,
+                                  40.7)
+    assert got[0].to_ecs() == got[1].to_ecs() == got[2].to_ecs()
+
+
+def test_earlier_alias_wins_and_only_none_is_missing():
+    e = normalize({"source": {"ip": ""}, "src": {"ip": "10.0.0.1"}, "source.asn": None, "src.asn": 7})
+    assert e.source_ip == "" and e.get("source_ip", "-") == "-"
+    assert e.source_asn == 7
+    # a dotted key beats the nested value of the same alias
+    assert normalize({"source.ip": "1.1.1.1", "source": {"ip": "2.2.2.2"}}).source_ip == "1.1.1.1"
+
+
+def test_user_object_is_not_a_user_name():
+    assert normalize({"user": {"id": "u1"}}).user_name is None
+    assert normalize({"user": "bob"}).user_name == "bob"
+    assert normalize({"user.name": {"first": "a"}, "user": {"name": "alice"}}).user_name == "alice"
+
+
+def test_scalars_in_place_of_objects_are_missing():
+    e = normalize({"source": "203.0.113.9", "src": {"geo": 5, "ip": "10.0.0.1"}, "event": ["login"]})
+    assert e.source_ip == "10.0.0.1" and e.source_lat is None and e.event_action is None
+
+
+def test_non_dict_input_and_idempotence():
+    assert normalize(None).raw == {} and normalize([1]).user_key == "unknown"
+    e = normalize(NESTED)
+    assert isinstance(e, Event) and normalize(e) is e and e.raw is NESTED
+    assert normalize({"event": {"mfa": "TRUE"}}).mfa and not normalize({"event.mfa": "no"}).mfa
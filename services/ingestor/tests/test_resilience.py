@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.utils import resilience
+from app.utils.resilience import CLOSED, HALF_OPEN, OPEN, BreakerOpen, CircuitBreaker, FakeModel, ModelGuard
+
+
+def _tripped(**kw):
+    b = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, cooldown=30, **kw)
+    for ok in (True, False, True, False):
+        b.record(ok)
+    return b
+
+
+def test_opens_at_error_rate_once_min_calls_recorded():
+    b = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, cooldown=30)
+    for _ in range(3):
+        b.record(False)
+    assert b.state == CLOSED and b.allow()  # below min_calls
+    b.record(True)
+    assert b.state == OPEN
+    assert not b.allow()
+
+
+def test_half_open_lets_one_probe_through(monkeypatch):
+    b = _tripped()
+    now = b.opened_at
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now + 29)
+    assert not b.allow()
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now + 30)
+    assert b.allow()
+    assert b.state == HALF_OPEN
+    assert not b.allow()  # the probe is still out
+
+
+def test_probe_success_closes_and_failure_reopens(monkeypatch):
+    b = _tripped()
+    now = b.opened_at + 30
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now)
+    assert b.allow()
+    b.record(False)
+    assert b.state == OPEN and b.opened_at == now
+    assert not b.allow()  # a fresh cooldown
+
+    now += 30
+    assert b.allow()
+    b.record(True)
+    assert b.state == CLOSED and b.allow()
+    for _ in range(3):
+        b.record(False)
+    assert b.state == CLOSED  # the window restarted on close
+
+
+def test_guard_times_out_then_short_circuits():
+    guard = ModelGuard(timeout=0.05, slow_ms=1000, workers=2,
+                       breaker=CircuitBreaker(window=4, min_calls=2, error_rate=0.5, cooldown=60))
+    model = FakeModel(latency_ms=300, jitter_ms=0, seed=1)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(resilience.ModelTimeout):
+                await guard.call(model.generate_content, "p")
+        with pytest.raises(BreakerOpen):
+            await guard.call(model.generate_content, "p")
+
+    asyncio.run(run())
+    assert model.calls == 2
+    assert guard.status()["breaker"] == OPEN
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+import time
+
+from app.utils import spool
+from app.utils.es_bulk import RetryableError
+
+
+def _wait(cond, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def _dead_letters(directory):
+    with open(os.path.join(directory, "dead-letter.ndjson")) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_recovery_truncates_torn_tail_and_resumes_at_offset(tmp_path):
+    s = spool.Spool(str(tmp_path))
+    assert s.wait_durable(s.append_many([b"a", b"b", b"c"]), 5)
+    s.close()
+    seg = os.path.join(str(tmp_path), "000000000000.seg")
+    good = os.path.getsize(seg)
+    with open(seg, "ab") as f:
+        f.write(b"\x00\x00\x00\x09torn")  # crash mid-append
+
+    s = spool.Spool(str(tmp_path))
+    assert os.path.getsize(seg) == good
+    assert s.backlog_records == 3
+    records, end = s.read_batch(2)
+    assert records == [b"a", b"b"]
+    s.commit(end, len(records))
+    s.close()
+
+    s = spool.Spool(str(tmp_path))
+    assert s.read_batch(10)[0] == [b"c"]
+    s.close()
+
+
+def test_drainer_dead_letters_what_retrying_cannot_fix(tmp_path):
+    def ship(items):
+        if any(doc.get("unbuildable") for _, doc in items):
+            raise TypeError("cannot serialise")
+        return [400 if doc.get("mapping") else 201 for _, doc in items]
+
+    s = spool.Spool(str(tmp_path))
+    s.append_many([spool.encode_item("ith-events", {"n": 1}), b"{not json",
+                   spool.encode_item("ith-events", {"n": 2, "unbuildable": True}),
+                   spool.encode_item("ith-events", {"n": 3, "mapping": True}),
+                   spool.encode_item("ith-events", {"n": 4})])
+    d = spool.SpoolDrainer(s, ship, decode=spool.decode_item).start()
+    try:
+        _wait(lambda: s.backlog_records == 0)
+    finally:
+        d.stop()
+        s.close()
+    dead = _dead_letters(str(tmp_path))
+    assert [x["status"] for x in dead] == [422, 422, 400]
+    assert dead[0]["record"] == "{not json" and dead[0]["error"].startswith("decode")
+    assert dead[1]["error"].startswith("ship")
+    assert d.shipped == 2 and d.dead == 3
+
+
+def test_drainer_retries_transport_errors(tmp_path):
+    calls = []
+
+    def ship(records):
+        calls.append(len(records))
+        if len(calls) == 1:
+            raise RetryableError("connection reset")
+        return [201] * len(records)
+
+    s = spool.Spool(str(tmp_path))
+    s.append_many([b"x", b"y"])
+    d = spool.SpoolDrainer(s, ship).start()
+    try:
+        _wait(lambda: s.backlog_records == 0)
+    finally:
+        d.stop()
+        s.close()
+    assert calls == [2, 2] and d.shipped == 2 and d.dead == 0
+    assert not os.path.exists(os.path.join(str(tmp_path), "dead-letter.ndjson"))
+
+
+def test_append_durable_reports_a_missed_fsync(tmp_path):
+    s = spool.Spool(str(tmp_path), fsync_interval=1.0)
+    try:
+        assert asyncio.run(s.append_durable(b"slow", timeout=0.05)) is False
+        assert s.appended == 1
+        assert asyncio.run(s.append_durable(b"fast", timeout=5)) is True
+    finally:
+        s.close()
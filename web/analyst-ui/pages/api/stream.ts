@@ -0,0 +1,40 @@
+// Same-origin pass-through to the ingestor's live feed (server-sent events).
+// Filters (min_risk, rule, user) and Last-Event-ID are forwarded as-is.
+import type { NextApiRequest, NextApiResponse } from "next";
+
+export const config = { api: { responseLimit: false } };
+
+export default async function handler(req: NextApiRequest, res: NextApiResponse) {
+  const base = process.env.INGESTOR_URL || "http://localhost:8080";
+  const qs = new URLSearchParams(req.query as Record<string, string>).toString();
+  const ctrl = new AbortController();
+  req.on("close", () => ctrl.abort());
+
+  const headers: Record<string, string> = {};
+  const lastId = req.headers["last-event-id"];
+  if (typeof lastId === "string") headers["Last-Event-ID"] = lastId;
+
+  let upstream: Response;
+  try {
+    upstream = await fetch(`${base}/stream?${qs}`, { headers, signal: ctrl.signal });
+  } catch {
+    res.status(502).json({ error: "ingestor unreachable" });
+    return;
+  }
+  if (!upstream.ok || !upstream.body) {
+    res.status(upstream.status).send(await upstream.text());
+    return;
+  }
+  res.writeHead(200, { "Content-Type": "text/event-stream", "Cache-Control": "no-cache", "X-Accel-Buffering": "no" });
+  const reader = upstream.body.getReader();
+  try {
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      res.write(value);
+    }
+  } catch {
+    // client went away (abort) or the ingestor restarted; EventSource reconnects
+  }
+  res.end();
+}
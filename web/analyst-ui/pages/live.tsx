@@ -0,0 +1,53 @@
+import { useEffect, useState } from "react";
+
+type LiveEvent = {
+  "@timestamp": string;
+  user: string;
+  risk: number;
+  reasons: string;
+  tier: string;
+  action?: string;
+  source_ip?: string;
+  honey?: boolean;
+};
+
+const KEEP = 200;
+
+export default function LivePage() {
+  const [events, setEvents] = useState<LiveEvent[]>([]);
+  const [skipped, setSkipped] = useState(0);
+
+  useEffect(() => {
+    // ?min_risk=0.5&rule=impossible_travel&user=alice; EventSource resends Last-Event-ID on reconnect
+    const qs = window.location.search || "?min_risk=0.5";
+    const es = new EventSource(`/api/stream${qs}`);
+    es.addEventListener("event", (m) => {
+      const ev = JSON.parse((m as MessageEvent).data) as LiveEvent;
+      setEvents(prev => [ev, ...prev].slice(0, KEEP));
+    });
+    es.addEventListener("gap", (m) => {
+      setSkipped(n => n + JSON.parse((m as MessageEvent).data).skipped);
+    });
+    return () => es.close();
+  }, []);
+
+  return (
+    <div className="p-6 space-y-4">
+      <h1 className="text-xl font-semibold">Live Risk Events</h1>
+      {skipped > 0 && <div className="text-sm opacity-70">{skipped} events skipped while this tab was behind</div>}
+      <table className="text-sm w-full">
+        <thead>
+          <tr><th>Time</th><th>User</th><th>Risk</th><th>Reasons</th><th>Tier</th><th>Source IP</th></tr>
+        </thead>
+        <tbody>
+          {events.map((e, i) => (
+            <tr key={i} className={e.honey ? "font-semibold" : ""}>
+              <td>{e["@timestamp"]}</td><td>{e.user}</td><td>{e.risk.toFixed(2)}</td>
+              <td>{e.reasons}</td><td>{e.tier}</td><td>{e.source_ip ?? ""}</td>
+            </tr>
+          ))}
+        </tbody>
+      </table>
+    </div>
+  );
+}